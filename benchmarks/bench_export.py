@@ -0,0 +1,79 @@
+"""Compare the columnar export against a CSV dump of the same join.
+
+Seeds a throwaway database (benchmarks.datagen), writes the
+Feedback x Product x Category x Customers join once as CSV and once with
+feedback_export, then changes --touch rows and times an incremental run.
+
+    python -m benchmarks.bench_export --feedback 1000000
+"""
+import argparse
+import csv
+import os
+import tempfile
+import time
+
+from tabulate import tabulate
+
+import feedback_db
+import feedback_export
+from benchmarks import datagen
+
+
+def dir_size(path):
+    return sum(os.path.getsize(os.path.join(d, f)) for d, _, files in os.walk(path) for f in files)
+
+
+def csv_dump(conn, path):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        cursor = conn.execute(feedback_export.FULL_SQL)
+        writer.writerow(d[0] for d in cursor.description)
+        while True:
+            rows = cursor.fetchmany(feedback_export.FETCH_ROWS)
+            if not rows:
+                break
+            writer.writerows(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    datagen.add_arguments(parser)
+    parser.add_argument("--touch", type=int, default=10000, help="rows updated before the incremental run")
+    parser.add_argument("--format", choices=sorted(feedback_export.FORMATS),
+                        default=feedback_export.DEFAULT_FORMAT)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = os.path.join(tmp, "bench.db")
+        out = os.path.join(tmp, "export")
+        feedback_db.configure(db)
+        feedback_db.init_schema()
+        with feedback_db.get_conn() as conn:
+            datagen.seed(conn, datagen.volumes_from(args))
+
+        rows = []
+        with feedback_db.get_conn() as conn:
+            start = time.perf_counter()
+            csv_dump(conn, os.path.join(tmp, "dump.csv"))
+            seconds = time.perf_counter() - start
+        rows.append(("CSV", args.feedback, f"{seconds:.1f}", os.path.getsize(os.path.join(tmp, "dump.csv"))))
+
+        entry = feedback_export.export(out, fmt=args.format)
+        rows.append((f"{args.format}, full", entry["rows"], f"{entry['seconds']:.1f}", dir_size(out)))
+
+        with feedback_db.get_conn() as conn:
+            conn.execute("UPDATE Feedback SET rating = 6 - rating WHERE feedback_id % ? = 0",
+                         (max(1, args.feedback // args.touch),))
+            conn.commit()
+        before = dir_size(out)
+        entry = feedback_export.export(out, fmt=args.format)
+        rows.append((f"{args.format}, incremental", entry["rows"], f"{entry['seconds']:.1f}",
+                     dir_size(out) - before))
+        feedback_db.close_pool()
+
+    rows = [(label, count, seconds, f"{size / 2 ** 20:.1f}") for label, count, seconds, size in rows]
+    print(tabulate(rows, headers=["Output", "Rows", "Seconds", "MiB"], tablefmt="grid"))
+
+
+if __name__ == "__main__":
+    main()
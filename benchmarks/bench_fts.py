@@ -0,0 +1,109 @@
+"""Compare FTS5 comment search against LIKE '%word%' scans.
+
+Seeds a throwaway database with randomly worded comments, builds the
+full-text index (schema v4) and times the same searches both ways.
+
+    python -m benchmarks.bench_fts --rows 1000000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from itertools import accumulate
+
+from tabulate import tabulate
+
+import feedback_db
+from benchmarks.bench_indexes import seed
+
+
+COMMON_WORDS = (
+    "battery screen delivery price quality broken great terrible slow fast "
+    "support refund packaging size colour sound camera charger cable warranty "
+    "comfortable cheap expensive recommend return love hate works stopped "
+    "excellent average durable fragile scratched bright dim loud quiet heavy light"
+).split()
+
+# Real comment text has a long tail of rare words; pad with synthetic ones.
+VOCABULARY = COMMON_WORDS + [f"term{i}" for i in range(20000)]
+
+SEARCHES = ["battery", "camera broken", "\"works great\"", "term500", "term15000", "refund term42"]
+
+
+def comment_generator(rng):
+    # Zipf-ish word choice so some terms are common and others rare.
+    cum_weights = list(accumulate(1 / (i + 1) for i in range(len(VOCABULARY))))
+
+    def comment():
+        return " ".join(rng.choices(VOCABULARY, cum_weights=cum_weights, k=rng.randint(5, 20)))
+    return comment
+
+
+def like_search(conn, text, limit):
+    # A quoted phrase is one LIKE pattern; bare words are ANDed.
+    words = [text.strip('"')] if text.startswith('"') else text.split()
+    clauses = " AND ".join("comment LIKE ?" for _ in words)
+    return conn.execute(
+        f"SELECT feedback_id, comment FROM Feedback WHERE {clauses} LIMIT ?",
+        (*(f"%{w}%" for w in words), limit),
+    ).fetchall()
+
+
+def fts_search(conn, text, limit):
+    return conn.execute("""
+        SELECT rowid, snippet(FeedbackSearch, 0, '[', ']', '...', 16)
+        FROM FeedbackSearch
+        WHERE FeedbackSearch MATCH ?
+        ORDER BY bm25(FeedbackSearch)
+        LIMIT ?
+    """, (text, limit)).fetchall()
+
+
+def best_of(repeat, func, *args):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--products", type=int, default=10_000)
+    parser.add_argument("--limit", type=int, default=50, help="results per search")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = sqlite3.connect(os.path.join(tmp, "bench.db"))
+        feedback_db.migrate(conn, target=3)
+
+        start = time.perf_counter()
+        seed(conn, args.rows, args.products, 50, comment_generator(random.Random(7)))
+        print(f"Seeded {args.rows} comments in {time.perf_counter() - start:.1f}s")
+
+        start = time.perf_counter()
+        feedback_db.migrate(conn, target=4)
+        print(f"Built full-text index in {time.perf_counter() - start:.1f}s")
+
+        rows = []
+        for text in SEARCHES:
+            # LIKE with a LIMIT stops early on common words, so also time the
+            # full count, which is what ranking needs.
+            like = best_of(args.repeat, like_search, conn, text, args.limit)
+            like_all = best_of(args.repeat, like_search, conn, text, -1)
+            fts = best_of(args.repeat, fts_search, conn, text, args.limit)
+            rows.append((text, f"{like:.2f}", f"{like_all:.2f}", f"{fts:.2f}", f"{like_all / fts:.0f}x"))
+        conn.close()
+
+    headers = ["Search", "LIKE first N ms", "LIKE all ms", "FTS5 ranked ms", "Speedup vs all"]
+    print(tabulate(rows, headers=headers, tablefmt="grid"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""Measure the effect of the schema-v2 indexes and connection pragmas.
+
+Seeds a throwaway database with the v1 schema (no secondary indexes), times
+the lookups the menus run, migrates to the latest schema and times them again.
+
+    python -m benchmarks.bench_indexes --rows 10000000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from tabulate import tabulate
+
+import feedback_db
+
+
+RATINGS_PER_CUSTOMER = 50
+
+QUERIES = [
+    ("feedback by product", """
+        SELECT rating, comment FROM Feedback WHERE product_id = ?
+    """, "product"),
+    ("feedback by product (admin)", """
+        SELECT C.fullname, F.rating, F.comment
+        FROM Feedback F
+        JOIN Customers C ON F.customer_id = C.customer_id
+        WHERE F.product_id = ?
+    """, "product"),
+    ("own feedback (viewFeedback)", """
+        SELECT feedback_id, product_id, rating, comment
+        FROM Feedback
+        WHERE customer_id = (
+            SELECT customer_id FROM Customers WHERE user_id = ?
+        )
+    """, "user"),
+    ("customer by user_id", """
+        SELECT customer_id FROM Customers WHERE user_id = ?
+    """, "user"),
+    ("products by category", """
+        SELECT product_id, product_name, price, description
+        FROM Product WHERE category_id = ?
+    """, "category"),
+]
+
+
+def seed(conn, rows, products, categories, comment=None):
+    customers = max(1, rows // RATINGS_PER_CUSTOMER)
+    step = 104729 % products or 1
+
+    conn.execute("PRAGMA synchronous = OFF")
+    conn.executemany(
+        "INSERT INTO Category(category_id, category_name) VALUES (?, ?)",
+        ((i, f"category {i}") for i in range(1, categories + 1)),
+    )
+    conn.executemany(
+        "INSERT INTO Product(product_id, product_name, category_id, price, description)"
+        " VALUES (?, ?, ?, ?, ?)",
+        ((i, f"product {i}", i % categories + 1, 100, "bench") for i in range(1, products + 1)),
+    )
+    conn.executemany(
+        "INSERT INTO Users(id, username, password, role) VALUES (?, ?, 'x', 'customer')",
+        ((i, f"user{i}") for i in range(1, customers + 1)),
+    )
+    # Inserted in shuffled user order so customer_id and user_id differ.
+    user_ids = list(range(1, customers + 1))
+    random.Random(1).shuffle(user_ids)
+    conn.executemany(
+        "INSERT INTO Customers(customer_id, user_id, fullname) VALUES (?, ?, ?)",
+        ((c, u, f"customer {c}") for c, u in enumerate(user_ids, 1)),
+    )
+
+    def feedback():
+        n = 0
+        for c in range(1, customers + 1):
+            for j in range(RATINGS_PER_CUSTOMER):
+                if n == rows:
+                    return
+                text = comment() if comment else "benchmark comment"
+                yield (c, (c * 7919 + j * step) % products + 1, j % 5 + 1, text)
+                n += 1
+
+    conn.executemany(
+        "INSERT INTO Feedback(customer_id, product_id, rating, comment) VALUES (?, ?, ?, ?)",
+        feedback(),
+    )
+    conn.commit()
+    return customers
+
+
+def time_queries(conn, repeat, customers, products, categories):
+    rng = random.Random(42)
+    args = {
+        "product": lambda: rng.randint(1, products),
+        "user": lambda: rng.randint(1, customers),
+        "category": lambda: rng.randint(1, categories),
+    }
+    results = {}
+    for name, sql, kind in QUERIES:
+        start = time.perf_counter()
+        for _ in range(repeat):
+            conn.execute(sql, (args[kind](),)).fetchall()
+        results[name] = (time.perf_counter() - start) / repeat * 1000
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10_000_000, help="Feedback rows to seed")
+    parser.add_argument("--products", type=int, default=100_000)
+    parser.add_argument("--categories", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=20, help="lookups per query")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = sqlite3.connect(os.path.join(tmp, "bench.db"))
+        feedback_db.migrate(conn, target=1)
+
+        start = time.perf_counter()
+        customers = seed(conn, args.rows, args.products, args.categories)
+        print(f"Seeded {args.rows} feedback rows in {time.perf_counter() - start:.1f}s")
+
+        before = time_queries(conn, args.repeat, customers, args.products, args.categories)
+
+        start = time.perf_counter()
+        feedback_db.migrate(conn)
+        print(f"Migrated to v{feedback_db.schema_version(conn)} in {time.perf_counter() - start:.1f}s")
+        conn.close()
+
+        # Reopen through the pool so the tuned pragmas apply as in production.
+        pool = feedback_db.ConnectionPool(os.path.join(tmp, "bench.db"), size=1)
+        with pool.connection() as conn:
+            after = time_queries(conn, args.repeat, customers, args.products, args.categories)
+        pool.close()
+
+    rows = [
+        (name, f"{before[name]:.3f}", f"{after[name]:.3f}", f"{before[name] / after[name]:.0f}x")
+        for name, _, _ in QUERIES
+    ]
+    headers = ["Query", "v1 ms/op", "v2 ms/op", "Speedup"]
+    print(tabulate(rows, headers=headers, tablefmt="grid"))
+
+
+if __name__ == "__main__":
+    main()
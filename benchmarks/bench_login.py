@@ -0,0 +1,114 @@
+"""Logins/sec at each scrypt cost setting.
+
+Registers users in a throwaway database at each cost, then times full
+service.login() calls (lookup + verify) serially and from a thread pool.
+Then times a credential-stuffing burst against one username, which the
+login throttle (feedback_ratelimit) rejects before any lookup or hashing,
+with the buckets in memory and in a shared SQLite file.
+
+    python -m benchmarks.bench_login --costs 12 13 14 15
+"""
+import argparse
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from tabulate import tabulate
+
+import feedback_db
+import feedback_passwords as passwords
+import feedback_ratelimit
+import feedback_service as service
+
+
+def time_logins(usernames, threads, one=None):
+    def login(name):
+        service.login(name, "secret-" + name, "customer")
+
+    one = one or login
+
+    start = time.perf_counter()
+    if threads == 1:
+        for name in usernames:
+            one(name)
+    else:
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            list(pool.map(one, usernames))
+    return len(usernames) / (time.perf_counter() - start)
+
+
+def time_stuffing(attempts):
+    def guess(i):
+        try:
+            service.login("victim", f"guess-{i}", "customer", client="203.0.113.7")
+        except service.ServiceError:
+            pass
+
+    limiter = feedback_ratelimit.current()
+    start = time.perf_counter()
+    for i in range(attempts):
+        guess(i)
+    rate = attempts / (time.perf_counter() - start)
+    return rate, limiter.stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--costs", type=int, nargs="+", default=[12, 13, 14, 15],
+                        help="scrypt log2(N) values to compare")
+    parser.add_argument("--logins", type=int, default=50, help="logins per measurement")
+    parser.add_argument("--threads", type=int, default=passwords.HASH_WORKERS)
+    parser.add_argument("--attempts", type=int, default=10000, help="guesses in the stuffing burst")
+    args = parser.parse_args()
+
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        feedback_db.configure(os.path.join(tmp, "bench.db"), size=args.threads)
+        feedback_db.init_schema()
+
+        # Legacy plaintext rows: timed once for the bare user lookup, then
+        # for the first real login, which verifies and rehashes each one.
+        with feedback_db.get_conn() as conn:
+            conn.executemany(
+                "INSERT INTO Users(username, password, role) VALUES (?, ?, 'customer')",
+                ((f"plain{i}", f"secret-plain{i}") for i in range(args.logins)),
+            )
+            conn.commit()
+        plain = [f"plain{i}" for i in range(args.logins)]
+        lookup = time_logins(plain, 1, lambda name: service.findLogin(name, "customer"))
+        rows.append(("lookup only, no hashing", f"{lookup:.0f}", "-"))
+        rehash = time_logins(plain, 1)
+        rows.append((f"plaintext + rehash to N=2^{passwords.SCRYPT_LOG_N}", f"{rehash:.0f}", "-"))
+
+        for cost in args.costs:
+            passwords.configure(cost)
+            names = [f"user{cost}_{i}" for i in range(args.logins)]
+            for name in names:
+                service.register(name, "secret-" + name, "customer", fullname=name)
+
+            serial = time_logins(names, 1)
+            parallel = time_logins(names, args.threads)
+            per_hash = 1000 / serial
+            rows.append((f"scrypt N=2^{cost} (~{per_hash:.0f} ms)", f"{serial:.0f}", f"{parallel:.0f}"))
+
+        service.register("victim", "secret-victim", "customer", fullname="victim")
+        stuffing = []
+        for store, path in (("memory", None), ("SQLite", os.path.join(tmp, "throttle.db"))):
+            feedback_ratelimit.configure(path)
+            rate, stats = time_stuffing(args.attempts)
+            rejected = stats["rejected_user"] + stats["rejected_client"]
+            stuffing.append((store, f"{rate:.0f}", stats["allowed"], rejected))
+        feedback_ratelimit.configure(None)
+
+        feedback_db.close_pool()
+
+    headers = ["Password storage", "logins/sec serial", f"logins/sec x{args.threads} threads"]
+    print(tabulate(rows, headers=headers, tablefmt="grid"))
+    print()
+    print(tabulate(stuffing, headers=["Throttle store", "guesses/sec", "allowed", "rejected"],
+                   tablefmt="grid"))
+
+
+if __name__ == "__main__":
+    main()
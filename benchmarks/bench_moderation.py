@@ -0,0 +1,123 @@
+"""Time comment screening for the moderation queue against a linear scan.
+
+Seeds a throwaway database (benchmarks.datagen) and fingerprints every
+comment (feedback_moderation.rescreen). Then inserts --new feedback rows,
+half of them another customer's comment with one word changed, screening
+each as addFeedback does, and compares that with checking each against
+every stored comment. Near-copies count as caught out of those still at
+least moderation.SIMILARITY alike (one word matters more in a short
+comment). Finally approves and rejects the queue in bulk.
+
+    python -m benchmarks.bench_moderation --feedback 1000000 --new 1000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from tabulate import tabulate
+
+import feedback_db
+import feedback_moderation as moderation
+import feedback_service as service
+from benchmarks import datagen
+
+SCAN_SAMPLE = 20
+
+
+def near_copy(comment, rng):
+    words = comment.split()
+    words[rng.randrange(len(words))] = rng.choice(datagen.WORDS)
+    return " ".join(words)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    datagen.add_arguments(parser)
+    parser.add_argument("--new", type=int, default=1000, help="feedback rows screened one at a time")
+    args = parser.parse_args()
+    volumes = datagen.volumes_from(args)
+    rng = random.Random(args.random_seed + 1)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        feedback_db.configure(os.path.join(tmp, "bench.db"))
+        feedback_db.init_schema()
+        with feedback_db.get_conn() as conn:
+            datagen.seed(conn, volumes)
+
+            start = time.perf_counter()
+            screened, _ = moderation.rescreen(conn)
+            rescreen_seconds = time.perf_counter() - start
+            fingerprints = conn.execute("SELECT COUNT(*) FROM CommentFingerprints").fetchone()[0]
+
+            long_comments = conn.execute(
+                "SELECT customer_id, comment FROM Feedback WHERE feedback_id IN"
+                " (SELECT feedback_id FROM CommentFingerprints ORDER BY random() LIMIT ?)",
+                (args.new,),
+            ).fetchall()
+            # Customers past the seeded ones, so every (customer, product) is new.
+            rows = []
+            alike = set()
+            for i in range(args.new):
+                customer_id = volumes.customers + 1 + i
+                if i % 2 == 0 and long_comments:
+                    original = long_comments[i % len(long_comments)][1]
+                    comment = near_copy(original, rng)
+                    if moderation.similarity(moderation.shingles(original),
+                                             moderation.shingles(comment)) >= moderation.SIMILARITY:
+                        alike.add(i)
+                else:
+                    comment = " ".join(rng.choices(datagen.WORDS, k=rng.randint(8, 15)))
+                rows.append((customer_id, rng.randint(1, volumes.products), rng.randint(1, 5), comment))
+
+            caught = 0
+            start = time.perf_counter()
+            for i, (customer_id, product_id, rating, comment) in enumerate(rows):
+                fid = conn.execute(
+                    "INSERT INTO Feedback(customer_id, product_id, rating, comment) VALUES (?, ?, ?, ?)",
+                    (customer_id, product_id, rating, comment),
+                ).lastrowid
+                reason = moderation.screen(conn, fid, customer_id, comment)
+                caught += i in alike and reason is not None
+            conn.commit()
+            screen_ms = (time.perf_counter() - start) * 1000 / max(1, len(rows))
+
+            # What screening would cost without the band indexes.
+            start = time.perf_counter()
+            for _, _, _, comment in rows[:SCAN_SAMPLE]:
+                new = moderation.shingles(comment)
+                for (other,) in conn.execute("SELECT comment FROM Feedback"):
+                    old = moderation.shingles(other)
+                    if new and old:
+                        moderation.similarity(new, old)
+            scan_ms = (time.perf_counter() - start) * 1000 / SCAN_SAMPLE
+
+            pending = [r[0] for r in conn.execute(
+                "SELECT feedback_id FROM ModerationQueue WHERE status = 'pending' ORDER BY feedback_id LIMIT 2000"
+            )]
+            half = len(pending) // 2
+            approve_ids, reject_ids = pending[:half], pending[half:]
+            timings = []
+            for sql, ids in ((service.APPROVE_SQL, approve_ids), (service.REJECT_SQL, reject_ids)):
+                start = time.perf_counter()
+                conn.execute(sql.format(ids=",".join("?" * len(ids))), ids)
+                conn.commit()
+                timings.append((time.perf_counter() - start) * 1000)
+            approve_ms, reject_ms = timings
+        feedback_db.close_pool()
+
+    print(tabulate([
+        ("Feedback rows", screened),
+        ("Comments fingerprinted", fingerprints),
+        ("Rescreen seconds", f"{rescreen_seconds:.1f}"),
+        ("Screen per insert, band indexes (ms)", f"{screen_ms:.2f}"),
+        ("Check per insert, linear scan (ms)", f"{scan_ms:.0f}"),
+        ("Near-copies caught", f"{caught} / {len(alike)}"),
+        (f"Approve {len(approve_ids)} in one transaction (ms)", f"{approve_ms:.1f}"),
+        (f"Reject {len(reject_ids)} in one transaction (ms)", f"{reject_ms:.1f}"),
+    ], tablefmt="grid"))
+
+
+if __name__ == "__main__":
+    main()
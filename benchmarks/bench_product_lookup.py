@@ -0,0 +1,112 @@
+"""Compare product-name lookup against the old LIKE '%name%' scan.
+
+Seeds a throwaway catalog with generated product names, builds the name
+indexes (schema v8) and times the old LIKE query (first match of a full
+scan) against findProduct's lookup and the ranked candidate list
+(matchProducts).
+
+    python -m benchmarks.bench_product_lookup --products 1000000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from tabulate import tabulate
+
+import feedback_db
+import feedback_service as service
+from benchmarks.bench_fts import best_of
+
+
+BRANDS = ("Acme Globex Initech Umbrella Stark Wayne Wonka Hooli Vandelay Soylent "
+          "Cyberdyne Tyrell Oscorp Aperture Massive Dynamic Gringotts Monarch Nakatomi Zorg").split()
+LINES = "Pro Max Ultra Lite Mini Plus Air Neo Prime Edge".split()
+NOUNS = ("Phone Laptop Tablet Headphones Speaker Camera Monitor Keyboard Mouse Router "
+         "Charger Watch Blender Kettle Toaster Vacuum Heater Fan Lamp Drill").split()
+
+
+def product_names(count, rng):
+    for i in range(1, count + 1):
+        yield f"{rng.choice(BRANDS)} {rng.choice(LINES)} {rng.choice(NOUNS)} X{i}"
+
+
+def like_lookup(conn, text):
+    return conn.execute(
+        "SELECT product_id FROM Product WHERE product_name LIKE ?", (f"%{text}%",)
+    ).fetchone()
+
+
+def typo(text, rng):
+    # Swap two neighbouring characters that differ.
+    while True:
+        i = rng.randrange(len(text) - 1)
+        if text[i] != text[i + 1]:
+            return text[:i] + text[i + 1] + text[i] + text[i + 2:]
+
+
+def lookup(text):
+    try:
+        return service._load_product_id(text)
+    except service.ServiceError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(3)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        conn = sqlite3.connect(path)
+        feedback_db.migrate(conn, target=7)
+        conn.execute("PRAGMA synchronous = OFF")
+        conn.execute("INSERT INTO Category(category_id, category_name) VALUES (1, 'bench')")
+        start = time.perf_counter()
+        conn.executemany(
+            "INSERT INTO Product(product_name, category_id, price, description) VALUES (?, 1, 100, '')",
+            ((name,) for name in product_names(args.products, rng)),
+        )
+        conn.commit()
+        print(f"Seeded {args.products} products in {time.perf_counter() - start:.1f}s")
+
+        start = time.perf_counter()
+        feedback_db.migrate(conn, target=8)
+        print(f"Built name indexes in {time.perf_counter() - start:.1f}s")
+        feedback_db.configure(path)
+
+        last = conn.execute("SELECT product_name FROM Product ORDER BY product_id DESC").fetchone()[0]
+        middle = conn.execute("SELECT product_name FROM Product WHERE product_id = ?",
+                              (args.products // 2,)).fetchone()[0]
+        lookups = [
+            ("exact, late in table", last),
+            ("exact, other case", middle.upper()),
+            ("prefix (ambiguous)", " ".join(middle.split()[:2])),
+            ("unique substring", middle.split()[-1]),
+            ("typo", typo(last, rng)),
+            ("typo", typo(middle, rng)),
+            ("no match", "Nonexistent Gadget"),
+        ]
+
+        rows = []
+        for label, text in lookups:
+            like = best_of(args.repeat, like_lookup, conn, text)
+            found = best_of(args.repeat, lookup, text)
+            ranked = best_of(args.repeat, service._match_products, conn, text, service.MATCH_LIMIT)
+            matches = service._match_products(conn, text, service.MATCH_LIMIT)
+            best = f"{matches[0][1]} ({matches[0][2]}, {len(matches)} shown)" if matches else "-"
+            rows.append((label, text, f"{like:.3f}", f"{found:.3f}", f"{ranked:.3f}", best))
+        conn.close()
+        feedback_db.close_pool()
+
+    headers = ["Lookup", "Text", "LIKE ms", "findProduct ms", "Candidates ms", "Best candidate"]
+    print(tabulate(rows, headers=headers, tablefmt="grid"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Time building product similarities and refreshing them incrementally.
+
+Seeds a throwaway database (benchmarks.datagen), builds the rating matrix
+and item-item similarities, then adds --new feedback rows and compares an
+incremental refresh against a full rebuild: time, and how many products
+end up with the same list.
+
+    python -m benchmarks.bench_recommend --feedback 1000000 --new 10000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+import numpy as np
+from tabulate import tabulate
+
+import feedback_db
+import feedback_recommend as recommend
+from benchmarks import datagen
+
+
+def add_feedback(conn, count, volumes, rng):
+    rows = [(rng.randint(1, volumes.customers), rng.randint(1, volumes.products), rng.randint(1, 5), "bench")
+            for _ in range(count)]
+    conn.executemany(
+        "INSERT INTO Feedback(customer_id, product_id, rating, comment) VALUES (?, ?, ?, ?)"
+        " ON CONFLICT(customer_id, product_id) DO UPDATE SET rating = excluded.rating",
+        rows,
+    )
+    conn.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    datagen.add_arguments(parser)
+    parser.add_argument("--new", type=int, default=10000, help="feedback rows added before the refresh")
+    args = parser.parse_args()
+    volumes = datagen.volumes_from(args)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        feedback_db.configure(os.path.join(tmp, "bench.db"))
+        feedback_db.init_schema()
+        with feedback_db.get_conn() as conn:
+            datagen.seed(conn, volumes)
+            recommender = recommend.Recommender()
+            recommender.build(conn)
+            stats = recommender.stats()
+
+            add_feedback(conn, args.new, volumes, random.Random(args.random_seed + 1))
+            start = time.perf_counter()
+            applied = recommender.refresh(conn)
+            refresh_seconds = time.perf_counter() - start
+
+            rebuilt = recommend.Recommender()
+            rebuilt.build(conn)
+        feedback_db.close_pool()
+
+    matrix, neighbors, scores = recommender._state
+    full_matrix, full_neighbors, full_scores = rebuilt._state
+    at = np.searchsorted(matrix.products, full_matrix.products)
+    same = np.all(np.isclose(scores[at], full_scores, atol=1e-5), axis=1).sum()
+
+    print(tabulate([
+        ("Ratings", stats["ratings"]),
+        ("Products", stats["products"]),
+        ("Matrix MiB", f"{stats['matrix_bytes'] / 2 ** 20:.1f}"),
+        ("Build seconds", f"{stats['build_seconds']:.2f}"),
+        (f"Refresh seconds ({applied} changes)", f"{refresh_seconds:.2f}"),
+        ("Rebuild seconds", f"{rebuilt.build_seconds:.2f}"),
+        ("Lists same as rebuild", f"{same} / {len(full_matrix.products)}"),
+    ], tablefmt="grid"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Compare tabulate's grid against the streaming renderers.
+
+Renders the same synthetic feedback rows with tabulate and with each
+feedback_render format into a discarding sink, reporting time, rows/sec
+and (with --memory) peak memory. The streaming times include generating
+the rows; tabulate gets a prebuilt list.
+
+    python -m benchmarks.bench_render --rows 500000
+"""
+import argparse
+import io
+import random
+import time
+import tracemalloc
+
+from tabulate import tabulate
+
+import feedback_render
+from benchmarks.datagen import WORDS
+
+
+HEADERS = ["ID", "Product", "Customer", "Rating", "Comment"]
+
+
+class NullSink(io.TextIOBase):
+    def write(self, text):
+        return len(text)
+
+
+def make_rows(count, rng):
+    for i in range(1, count + 1):
+        yield (i, f"product {rng.randint(1, 5000)}", f"Customer {rng.randint(1, 10000)}",
+               rng.randint(1, 5), " ".join(rng.choices(WORDS, k=rng.randint(3, 15))))
+
+
+def timed(render, rows, memory):
+    # tracemalloc slows allocation-heavy code a lot, so it is opt-in.
+    if memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    render(rows)
+    elapsed = time.perf_counter() - start
+    if not memory:
+        return elapsed, None
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=500_000)
+    parser.add_argument("--skip-tabulate", action="store_true", help="tabulate is slow at large sizes")
+    parser.add_argument("--memory", action="store_true", help="also report peak memory (slower)")
+    args = parser.parse_args()
+
+    sink = NullSink()
+    results = []
+    if not args.skip_tabulate:
+        # tabulate needs the whole list, as the menus used to pass it.
+        rows = list(make_rows(args.rows, random.Random(1)))
+        results.append(("tabulate grid", *timed(
+            lambda r: sink.write(tabulate(r, headers=HEADERS, tablefmt="grid")), rows, args.memory)))
+        del rows
+
+    for fmt in feedback_render.FORMATS:
+        results.append((fmt, *timed(
+            lambda r: feedback_render.render(r, HEADERS, fmt, sink),
+            make_rows(args.rows, random.Random(1)), args.memory)))
+
+    table = [(name, f"{elapsed:.2f}", f"{args.rows / elapsed:,.0f}",
+              f"{peak / 2**20:.1f}" if peak is not None else "-")
+             for name, elapsed, peak in results]
+    print(tabulate(table, headers=["Renderer", "Seconds", "Rows/sec", "Peak MiB"], tablefmt="grid"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""Seed a feedback database with synthetic data.
+
+Product popularity follows a Zipf distribution, so a few products collect
+most of the feedback as in a real catalog. All seeded customers share one
+password ("password"), hashed once at the current cost. Feedback is dated
+uniformly over the last --days days.
+
+    python -m benchmarks.datagen --db bench.db --customers 100000 --feedback 1000000
+"""
+import argparse
+import random
+import time
+from itertools import accumulate
+
+import feedback_db
+import feedback_passwords as passwords
+
+
+PASSWORD = "password"
+ADMIN = "bench_admin"
+BATCH = 20000
+MAX_EMPTY_BATCHES = 1000
+
+WORDS = (
+    "great good ok bad terrible love hate fast slow cheap expensive broken works "
+    "battery screen delivery refund support quality size colour sound camera "
+    "recommend return again never always value price packaging durable fragile"
+).split()
+
+
+class Volumes:
+    def __init__(self, customers=10_000, categories=50, products=5_000,
+                 feedback=100_000, skew=1.1, seed=1, days=90):
+        self.customers = customers
+        self.categories = categories
+        self.products = products
+        self.feedback = feedback
+        self.skew = skew
+        self.seed = seed
+        self.days = days
+
+    def as_dict(self):
+        return dict(vars(self))
+
+
+def category_name(i):
+    return f"category {i}"
+
+
+def product_name(i):
+    return f"product {i}"
+
+
+def username(i):
+    return f"customer{i}"
+
+
+def _batches(rows, size=BATCH):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def seed(conn, volumes, log=print):
+    if volumes.feedback > volumes.customers * volumes.products:
+        raise SystemExit("feedback target exceeds available customer/product pairs")
+    rng = random.Random(volumes.seed)
+    password_hash = passwords.hash_password(PASSWORD)
+    start = time.perf_counter()
+
+    conn.execute(
+        "INSERT INTO Users(username, password, role) VALUES (?, ?, 'admin')",
+        (ADMIN, password_hash)
+    )
+    conn.executemany(
+        "INSERT INTO Category(category_id, category_name) VALUES (?, ?)",
+        ((i, category_name(i)) for i in range(1, volumes.categories + 1)),
+    )
+    conn.executemany(
+        "INSERT INTO Product(product_id, product_name, category_id, price, description)"
+        " VALUES (?, ?, ?, ?, ?)",
+        ((i, product_name(i), i % volumes.categories + 1, rng.randint(1, 2000),
+          " ".join(rng.choices(WORDS, k=8))) for i in range(1, volumes.products + 1)),
+    )
+    conn.commit()
+
+    for batch in _batches(range(1, volumes.customers + 1)):
+        cursor = conn.cursor()
+        for i in batch:
+            cursor.execute(
+                "INSERT INTO Users(username, password, role) VALUES (?, ?, 'customer')",
+                (username(i), password_hash)
+            )
+            cursor.execute(
+                "INSERT INTO Customers(customer_id, user_id, fullname, phone) VALUES (?, ?, ?, ?)",
+                (i, cursor.lastrowid, f"Customer {i}", f"555-{i:07d}")
+            )
+        conn.commit()
+    log(f"seeded {volumes.customers} customers, {volumes.products} products "
+        f"in {time.perf_counter() - start:.1f}s")
+
+    # Product i is picked with weight 1 / i^skew. Draws that repeat a
+    # (customer, product) pair are dropped by the UNIQUE constraint, so keep
+    # drawing until the target is reached. Near the number of pairs, or with
+    # a steep skew, whole batches can repeat pairs already drawn; give up
+    # after MAX_EMPTY_BATCHES of those in a row.
+    cum_weights = list(accumulate(1 / i ** volumes.skew for i in range(1, volumes.products + 1)))
+    product_ids = range(1, volumes.products + 1)
+    now = time.time()
+    inserted = empty = 0
+    while inserted < volumes.feedback:
+        want = min(BATCH, volumes.feedback - inserted)
+        products = rng.choices(product_ids, cum_weights=cum_weights, k=want)
+        rows = [
+            (rng.randint(1, volumes.customers), p, rng.randint(1, 5),
+             " ".join(rng.choices(WORDS, k=rng.randint(3, 15))),
+             time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(now - rng.random() * volumes.days * 86400)))
+            for p in products
+        ]
+        cursor = conn.executemany("""
+            INSERT INTO Feedback(customer_id, product_id, rating, comment, created_at)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(customer_id, product_id) DO NOTHING
+        """, rows)
+        conn.commit()
+        empty = 0 if cursor.rowcount else empty + 1
+        if empty >= MAX_EMPTY_BATCHES:
+            raise SystemExit(f"stopped at {inserted} feedback rows: {empty} batches in a row "
+                             "only repeated existing customer/product pairs")
+        inserted += cursor.rowcount
+    log(f"seeded {inserted} feedback rows in {time.perf_counter() - start:.1f}s")
+
+
+def add_arguments(parser):
+    defaults = Volumes()
+    parser.add_argument("--customers", type=int, default=defaults.customers)
+    parser.add_argument("--categories", type=int, default=defaults.categories)
+    parser.add_argument("--products", type=int, default=defaults.products)
+    parser.add_argument("--feedback", type=int, default=defaults.feedback)
+    parser.add_argument("--skew", type=float, default=defaults.skew,
+                        help="Zipf exponent for product popularity")
+    parser.add_argument("--random-seed", type=int, default=defaults.seed)
+    parser.add_argument("--days", type=int, default=defaults.days,
+                        help="spread feedback dates over this many past days")
+
+
+def volumes_from(args):
+    return Volumes(args.customers, args.categories, args.products,
+                   args.feedback, args.skew, args.random_seed, args.days)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", required=True, help="database file to create")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    feedback_db.configure(args.db)
+    feedback_db.init_schema()
+    with feedback_db.get_conn() as conn:
+        if conn.execute("SELECT 1 FROM Users LIMIT 1").fetchone():
+            raise SystemExit(f"{args.db} already has data; seed an empty file")
+        seed(conn, volumes_from(args))
+    feedback_db.close_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Drive a running feedback_server with many concurrent keep-alive clients.
+
+Registers and logs in a throwaway customer, then has every client loop over
+the given paths until the request budget is spent, and reports requests/sec
+and latency percentiles.
+
+    python feedback_server.py --port 8080 &
+    python -m benchmarks.load_test --port 8080 --clients 1000 --requests 50000
+"""
+import argparse
+import asyncio
+import json
+import secrets
+import time
+
+
+async def send(reader, writer, method, path, token=None, payload=None):
+    body = json.dumps(payload).encode() if payload is not None else b""
+    head = f"{method} {path} HTTP/1.1\r\nHost: bench\r\nContent-Length: {len(body)}\r\n"
+    if token:
+        head += f"Authorization: Bearer {token}\r\n"
+    writer.write(head.encode() + b"\r\n" + body)
+    await writer.drain()
+
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode().partition(":")
+        if name.lower() == "content-length":
+            length = int(value)
+    data = await reader.readexactly(length)
+    return status, json.loads(data) if data else None
+
+
+async def login(host, port):
+    reader, writer = await asyncio.open_connection(host, port)
+    name = "load_" + secrets.token_hex(4)
+    creds = {"username": name, "password": "pw", "role": "customer"}
+    await send(reader, writer, "POST", "/register", payload=dict(creds, fullname=name))
+    status, data = await send(reader, writer, "POST", "/login", payload=creds)
+    writer.close()
+    if status != 200:
+        raise SystemExit(f"login failed: {data}")
+    return data["token"]
+
+
+async def client(host, port, token, paths, budget, latencies, errors):
+    reader, writer = await asyncio.open_connection(host, port)
+    i = 0
+    try:
+        while budget[0] > 0:
+            budget[0] -= 1
+            path = paths[i % len(paths)]
+            i += 1
+            start = time.perf_counter()
+            status, _ = await send(reader, writer, "GET", path, token)
+            latencies.append(time.perf_counter() - start)
+            if status >= 400:
+                errors[status] = errors.get(status, 0) + 1
+    finally:
+        writer.close()
+
+
+def percentile(values, pct):
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+async def run(args):
+    token = await login(args.host, args.port)
+    latencies, errors, budget = [], {}, [args.requests]
+
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        client(args.host, args.port, token, args.paths, budget, latencies, errors)
+        for _ in range(args.clients)
+    ))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    print(f"{len(latencies)} requests, {args.clients} clients, {elapsed:.2f}s")
+    print(f"throughput: {len(latencies) / elapsed:.0f} req/s")
+    for pct in (50, 95, 99):
+        print(f"p{pct}: {percentile(latencies, pct) * 1000:.2f} ms")
+    if errors:
+        print("errors:", errors)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("paths", nargs="*", default=["/categories", "/me/feedback"])
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
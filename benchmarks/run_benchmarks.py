@@ -0,0 +1,181 @@
+"""Time the feedback operations non-interactively and save the results.
+
+Each operation is the service function the menus call, driven with random
+arguments against a seeded database. Results (throughput, p50/p95/p99) are
+written as JSON so runs on different commits can be compared.
+
+    python -m benchmarks.run_benchmarks --db bench.db --seed --output before.json
+    python -m benchmarks.run_benchmarks --db bench.db --output after.json --compare before.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import time
+
+from tabulate import tabulate
+
+import feedback_cache
+import feedback_db
+import feedback_service as service
+from benchmarks import datagen
+
+
+def percentile(sorted_values, pct):
+    index = min(len(sorted_values) - 1, round(len(sorted_values) * pct / 100))
+    return sorted_values[index]
+
+
+def measure(func, iterations, make_args):
+    latencies = []
+    errors = 0
+    for _ in range(iterations):
+        args = make_args()
+        start = time.perf_counter()
+        try:
+            func(*args)
+        except service.ServiceError:
+            errors += 1
+        latencies.append(time.perf_counter() - start)
+
+    latencies.sort()
+    total = sum(latencies)
+    return {
+        "calls": len(latencies),
+        "errors": errors,
+        "ops_per_sec": round(len(latencies) / total, 1) if total else None,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+    }
+
+
+def operations(volumes, rng, no_cache, added):
+    def session_for(i):
+        # customer i has user_id i + 1 (the admin is user 1).
+        return service.Session(i + 1, datagen.username(i), "customer", i)
+
+    admin = service.sessionForUser(1)
+    max_feedback = volumes.feedback
+
+    def customer():
+        return session_for(rng.randint(1, volumes.customers))
+
+    def product():
+        return rng.randint(1, volumes.products)
+
+    def add_feedback(*args):
+        added.append(service.addFeedback(*args))
+
+    def uncached(func):
+        if not no_cache:
+            return func
+
+        def wrapper(*args):
+            feedback_cache.clear_all()
+            return func(*args)
+        return wrapper
+
+    return [
+        ("login", service.login,
+         lambda: (datagen.username(rng.randint(1, volumes.customers)), datagen.PASSWORD, "customer")),
+        ("addFeedback", add_feedback,
+         lambda: (customer(), product(), rng.randint(1, 5), "benchmark run")),
+        ("viewFeedback", service.viewFeedback, lambda: (customer(),)),
+        ("adminViewFeedback first page", service.adminViewFeedback, lambda: (admin,)),
+        ("adminViewFeedback deep page", service.adminViewFeedback,
+         lambda: (admin, rng.randint(1, max_feedback))),
+        ("adminViewFeedbackByProduct", uncached(service.adminViewFeedbackByProduct),
+         lambda: (admin, datagen.product_name(product()))),
+        ("viewAllFeedback first page", service.viewAllFeedback, lambda: ()),
+        ("viewAllProducts", uncached(service.viewAllProducts),
+         lambda: (datagen.category_name(rng.randint(1, volumes.categories)),)),
+    ]
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_path):
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)["results"]
+
+    rows = []
+    for name, now in results.items():
+        before = baseline.get(name)
+        if not before:
+            continue
+        change = (now["p50_ms"] - before["p50_ms"]) / before["p50_ms"] * 100 if before["p50_ms"] else 0
+        rows.append((name, before["p50_ms"], now["p50_ms"], f"{change:+.1f}%",
+                     before["ops_per_sec"], now["ops_per_sec"]))
+    headers = ["Operation", "p50 before", "p50 now", "Change", "ops/s before", "ops/s now"]
+    print(tabulate(rows, headers=headers, tablefmt="grid"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", required=True)
+    parser.add_argument("--seed", action="store_true", help="seed --db first (must not exist)")
+    datagen.add_arguments(parser)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--no-cache", action="store_true", help="clear caches before cached operations")
+    parser.add_argument("--output", help="write JSON results here")
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare against")
+    args = parser.parse_args()
+
+    volumes = datagen.volumes_from(args)
+    if args.seed and os.path.exists(args.db):
+        raise SystemExit(f"{args.db} exists; drop --seed to reuse it")
+
+    feedback_db.configure(args.db)
+    feedback_db.init_schema()
+    if args.seed:
+        with feedback_db.get_conn() as conn:
+            datagen.seed(conn, volumes)
+
+    rng = random.Random(volumes.seed)
+    results = {}
+    added = []
+    for name, func, make_args in operations(volumes, rng, args.no_cache, added):
+        results[name] = measure(func, args.iterations, make_args)
+
+    # Remove what addFeedback inserted so the next run sees the same data.
+    with feedback_db.get_conn() as conn:
+        conn.executemany("DELETE FROM Feedback WHERE feedback_id = ?", ((i,) for i in added))
+        conn.commit()
+    feedback_db.close_pool()
+
+    rows = [(name, r["calls"], r["errors"], r["ops_per_sec"], r["p50_ms"], r["p95_ms"], r["p99_ms"])
+            for name, r in results.items()]
+    headers = ["Operation", "Calls", "Errors", "ops/s", "p50 ms", "p95 ms", "p99 ms"]
+    print(tabulate(rows, headers=headers, tablefmt="grid"))
+
+    if args.output:
+        report = {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "iterations": args.iterations,
+            "no_cache": args.no_cache,
+            "volumes": volumes.as_dict(),
+            "results": results,
+        }
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Saved results to {args.output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,20 @@
 import sqlite3
-from tabulate import tabulate
+import sys
+from functools import partial
+
+import feedback_cache
+import feedback_metrics
+import feedback_render
+import feedback_service as service
+import feedback_shards
+from feedback_db import init_schema
+
+
+# Importing tabulate costs more than the rest of startup, and the batch
+# commands (feedback_cli) never need it, so load it on first use.
+def tabulate(rows, **kwargs):
+    from tabulate import tabulate as _tabulate
+    return _tabulate(rows, **kwargs)
 
 
 def safe_int_input(msg):
@@ -9,54 +24,80 @@ def safe_int_input(msg):
         print("Enter numbers only")
         return None
 
-conn = sqlite3.connect("feedback.db")
-cursor = conn.cursor()
-
-cursor.execute('''
-CREATE TABLE IF NOT EXISTS Users(
-               id INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL,
-               username VARCHAR(20) NOT NULL UNIQUE,
-               password TEXT NOT NULL,
-               role VARCHAR(20) CHECK (role IN ('admin','customer'))
-               )
-               ''')
-cursor.execute('''
-CREATE TABLE IF NOT EXISTS Customers(
-               customer_id INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL,
-               user_id INTEGER NOT NULL,
-               fullname VARCHAR(20) NOT NULL,
-               phone VARCHAR(20),
-               FOREIGN KEY(user_id) REFERENCES Users(id)
-               )
-               ''')
-cursor.execute('''
-CREATE TABLE IF NOT EXISTS Category(
-               category_id INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL,
-               category_name TEXT UNIQUE NOT NULL
-               )
-               ''')
-cursor.execute('''
-CREATE TABLE IF NOT EXISTS Product(
-               product_id INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL,
-               product_name TEXT UNIQUE NOT NULL,
-               category_id INTEGER,
-               price INTEGER NOT NULL,
-               description TEXT NOT NULL,
-               FOREIGN KEY(category_id) REFERENCES Category(category_id)
-               )
-               ''')
-cursor.execute('''
-CREATE TABLE IF NOT EXISTS Feedback(
-               feedback_id INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL,
-               customer_id INTEGER NOT NULL,
-               product_id INTEGER NOT NULL,
-               rating CHECK (rating BETWEEN 1 AND 5),
-               comment TEXT,
-               FOREIGN KEY(customer_id) REFERENCES Customers(customer_id),
-               FOREIGN KEY(product_id) REFERENCES Product(product_id),
-               UNIQUE(customer_id, product_id)
-               )
-               ''')
+
+#PRODUCT NAMES
+def input_product():
+    # Asks for a product name; when it matches several products, lets the
+    # user pick one. Returns None when there is nothing to look up.
+    pname = input("Enter product name: ")
+    try:
+        service.findProduct(pname)
+        return pname
+    except service.AmbiguousProduct as e:
+        candidates = e.candidates
+    except service.ServiceError as e:
+        print(e)
+        return None
+
+    print("\nSeveral products match:")
+    for i, (_, name, _) in enumerate(candidates, 1):
+        print(f"{i}. {name}")
+    choice = safe_int_input("Choose a product (0 to cancel): ")
+    if not choice or not 1 <= choice <= len(candidates):
+        return None
+    return candidates[choice - 1][1]
+
+
+#PAGED FEEDBACK LISTING
+def page_feedback(title, empty_msg, headers, fetch_page, stream, display, page_size):
+    fmt = input("Format (grid/csv/tsv/jsonl, Enter=grid): ").strip().lower() or "grid"
+    if fmt not in feedback_render.FORMATS:
+        print("Unknown format")
+        return
+    if fmt != "grid":
+        export_feedback(headers, stream, display, fmt)
+        return
+
+    rows = fetch_page(0, page_size)
+    if not rows:
+        print(empty_msg)
+        return
+
+    print(title)
+    # One grid for the whole listing: widths come from the first page, so
+    # later pages line up and nothing is buffered to measure them.
+    grid = feedback_render.writer("grid", headers)
+    while True:
+        grid.write_rows(display(r) for r in rows)
+        if len(rows) < page_size:
+            return
+        after_id = rows[-1][0]
+
+        ch = input("Enter=next page, a=show all remaining, q=quit: ").strip().lower()
+        if ch == "q":
+            return
+        if ch == "a":
+            grid.write_rows(map(display, stream(after_id)))
+            return
+
+        rows = fetch_page(after_id, page_size)
+        if not rows:
+            return
+
+
+#EXPORT FEEDBACK (CSV/TSV/JSONL)
+def export_feedback(headers, stream, display, fmt):
+    path = input("Save to file (Enter=print here): ").strip()
+    if not path:
+        feedback_render.render(map(display, stream(0)), headers, fmt, sys.stdout)
+        return
+
+    try:
+        with open(path, "w", encoding="utf-8", newline="") as out:
+            feedback_render.render(map(display, stream(0)), headers, fmt, out)
+        print("Feedback exported to", path)
+    except OSError as e:
+        print("Could not write file:", e)
 
 #REGISTER
 def register():
@@ -69,139 +110,79 @@ def register():
         print("Invalid role")
         return
 
-    try:
-        conn = sqlite3.connect("feedback.db")
-        cursor = conn.cursor()
-
-        cursor.execute("""
-            INSERT INTO Users(username, password, role)
-            VALUES (?, ?, ?)
-        """, (username, password, role))
-
-        user_id = cursor.lastrowid  
+    fullname = phone = None
+    # Insert into Customers ONLY if role is customer
+    if role == "customer":
+        fullname = input("Enter full name: ")
+        phone = input("Enter phone number: ")
 
-        # Insert into Customers ONLY if role is customer
-        if role == "customer":
-            fullname = input("Enter full name: ")
-            phone = input("Enter phone number: ")
-
-            cursor.execute("""
-                INSERT INTO Customers(user_id, fullname, phone)
-                VALUES (?, ?, ?)
-            """, (user_id, fullname, phone))
-
-        conn.commit()
+    try:
+        service.register(username, password, role, fullname, phone)
         print("User registered successfully")
 
-    except sqlite3.IntegrityError:
-        print("Username already exists")
+    except service.ServiceError as e:
+        print(e)
 
     except sqlite3.Error as e:
         print(" Database error:", e)
 
-    finally:
-        conn.close()
-
 
 
 #LOGIN
 def login():
     try:
-        conn = sqlite3.connect("feedback.db")
-        cursor = conn.cursor()
-
         username = input("Enter username: ")
         password = input("Enter password: ")
         role = input("Role(admin/customer): ")
 
+        return service.login(username, password, role, hold_connection=True)
 
-        cursor.execute("""
-            SELECT id, role
-            FROM Users
-            WHERE username = ? AND password = ? AND role = ?
-        """, (username, password, role))
-
-        user = cursor.fetchone()
-
-        if not user:
-            print("Invalid login credentials")
-            return None
-
-        return user[0]
+    except service.AuthError as e:
+        print(e)
+        return None
 
     except sqlite3.Error as e:
         print("Login error:", e)
         return None
 
-    finally:
-        conn.close()
-
 
 ################################################ ADMIN #####################################################
 
 #ADD CATEGORY(ADMIN)
-def addCategory():
+def addCategory(session):
     name = input("Enter category name: ")
 
     try:
-        conn = sqlite3.connect("feedback.db")
-        cursor = conn.cursor()
-
-        cursor.execute(
-            "INSERT INTO Category(category_name) VALUES (?)", (name,)
-        )
-        conn.commit()
+        service.addCategory(session, name)
         print("Category added")
-        cursor.execute('''
-                        SELECT * FROM Category
-                       ''')
-        rows = cursor.fetchall()
+        rows = service.viewCategory()
         headers = ["ID","Category Name"]
         print(tabulate(rows, headers=headers, tablefmt="grid"))
 
-    except sqlite3.IntegrityError:
-        print("Category already exists")
-
-    finally:
-        conn.close()
+    except service.ServiceError as e:
+        print(e)
 
 
 #ADD PRODUCT(ADMIN)
-def addProduct():
+def addProduct(session):
     try:
         name = input("Enter product name: ")
         category_id = int(input("Enter category id: "))
         price = int(input("Enter price: "))
         desc = input("Enter description: ")
 
-        conn = sqlite3.connect("feedback.db")
-        cursor = conn.cursor()
-
-        cursor.execute("""
-            INSERT INTO Product(product_name, category_id, price, description)
-            VALUES (?, ?, ?, ?)
-        """, (name, category_id, price, desc))
-
-        conn.commit()
+        service.addProduct(session, name, category_id, price, desc)
         print("Product added")
     except ValueError:
         print("Category ID & price must be numbers")
 
-    except sqlite3.IntegrityError:
-        print("Product already exists OR invalid category ID")
-
-    finally:
-        conn.close()
+    except service.ServiceError as e:
+        print(e)
 
 #VIEW ALL CATEGORY(ADMIN)
 def viewCategory():
 
-    conn = sqlite3.connect("feedback.db")
-    cursor = conn.cursor()
-    cursor.execute('''
-                    SELECT * FROM Category 
-                   ''')
-    rows = cursor.fetchall()
+    rows = service.viewCategory()
     if not rows:
         print("No Category found")
     else:
@@ -209,17 +190,10 @@ def viewCategory():
         headers = ["Category ID","Category Name"]
         print(tabulate(rows,headers=headers,tablefmt="grid"))
 
-    conn.close()
-
 #VIEW ALL PRODUCTS(ADMIN)
 def viewProducts():
 
-    conn = sqlite3.connect("feedback.db")
-    cursor = conn.cursor()
-    cursor.execute('''
-                    SELECT * FROM Product 
-                   ''')
-    rows = cursor.fetchall()
+    rows = service.viewProducts()
     if not rows:
         print("No Category found")
     else:
@@ -227,223 +201,319 @@ def viewProducts():
         headers = ["ProductID","Product Name","CategoryID","Price","Description"]
         print(tabulate(rows, headers=headers, tablefmt="grid"))
 
-    conn.close()
-
 #VIEW ALL FEEDBACK(ADMIN)
-def adminViewFeedback():
-    conn = sqlite3.connect("feedback.db")
-
-    cursor = conn.cursor()
+def adminViewFeedback(session, page_size=service.PAGE_SIZE):
+    page_feedback(
+        "\n--- ALL FEEDBACK ---", "No feedback found",
+        ["ID","Product","Customer","Rating","Comment"],
+        partial(service.adminViewFeedback, session),
+        partial(service.streamAdminFeedback, session),
+        lambda row: row, page_size,
+    )
 
-    cursor.execute("""
-    SELECT F.feedback_id, P.product_name, C.fullname, F.rating, F.comment
-    FROM Feedback F
-    JOIN Product P ON F.product_id = P.product_id
-    JOIN Customers C ON F.customer_id = C.customer_id
-    """)
+#VIEW ALL FEEDBACK BY PRODUCT(ADMIN)
+def adminViewFeedbackByProduct(session):
+    pname = input_product()
+    if pname is None:
+        return
 
-    rows = cursor.fetchall()
+    try:
+        rows = service.adminViewFeedbackByProduct(session, pname)
+    except service.NotFound as e:
+        print(e)
+        return
 
     if not rows:
-        print("No feedback found")
+        print("No feedback for this product")
     else:
-        print("\n--- ALL FEEDBACK ---")        
-        headers = ["ID","Product","Customer","Rating","Comment"]
+        print("\n--- FEEDBACK FOR PRODUCT ---")
+        headers = ["Customer","Rating","Comment"]
         print(tabulate(rows, headers=headers, tablefmt="grid"))
 
 
-    conn.close()
+#DELETE FEEDBACK(ADMIN)
+def adminDeleteFeedback(session):
 
-#VIEW ALL FEEDBACK BY PRODUCT(ADMIN)
-def adminViewFeedbackByProduct():
-    pname = input("Enter product name: ")
+    fid = safe_int_input("Enter feedback ID to delete: ")
+    if fid is None:
+        return
 
-    conn = sqlite3.connect("feedback.db")
+    try:
+        service.adminDeleteFeedback(session, fid)
+        print("Feedback deleted successfully")
+    except service.NotFound as e:
+        print(e)
 
-    cursor = conn.cursor()
 
+#MODERATION QUEUE(ADMIN)
+def input_feedback_ids(msg):
+    try:
+        return [int(part) for part in input(msg).replace(",", " ").split()]
+    except ValueError:
+        print("Enter numbers only")
+        return []
 
-    cursor.execute(
-        "SELECT product_id FROM Product WHERE product_name LIKE ?",
-        (f"%{pname}%",)
-    )
-    product = cursor.fetchone()
 
-    if not product:
-        print("Product not found")
-        conn.close()
-        return
+def moderationQueue(session, page_size=service.PAGE_SIZE):
+    after_id = 0
+    while True:
+        rows = service.moderationQueue(session, after_id, page_size)
+        print("\n--- MODERATION QUEUE ---")
+        if rows:
+            headers = ["ID","Product","Customer","Rating","Comment","Reason","Duplicate Of","Flagged At"]
+            print(tabulate(rows, headers=headers, tablefmt="grid"))
+        else:
+            print("No feedback waiting for review")
+        print("1.Approve Feedback")
+        print("2.Reject Feedback")
+        print("3.Approve All Shown")
+        print("4.Reject All Shown")
+        print("5.Next Page")
+        print("6.Screen All Feedback Again")
+        print("7.Back")
 
-    product_id = product[0]
+        ch = safe_int_input("Enter your choice:-")
+        if ch is None:
+            continue
 
-    cursor.execute("""
-    SELECT C.fullname, F.rating, F.comment
-    FROM Feedback F
-    JOIN Customers C ON F.customer_id = C.customer_id
-    WHERE F.product_id = ?
-    """, (product_id,))
+        if ch in (1, 2, 3, 4):
+            if ch in (1, 2):
+                fids = input_feedback_ids("Feedback IDs (separated by spaces or commas): ")
+            else:
+                fids = [r[0] for r in rows]
+            if not fids:
+                continue
+            try:
+                if ch in (1, 3):
+                    print(f"{service.approveFeedback(session, fids)} feedback approved")
+                else:
+                    print(f"{service.rejectFeedback(session, fids)} feedback rejected and deleted")
+            except service.ServiceError as e:
+                print(e)
+        elif ch == 5:
+            if len(rows) < page_size:
+                print("No more pages; starting over")
+                after_id = 0
+            else:
+                after_id = rows[-1][0]
+        elif ch == 6:
+            print("Screening feedback...")
+            screened, queued = service.rescreenFeedback(session)
+            print(f"Screened {screened} comments; {queued} queued for review")
+            after_id = 0
+        elif ch == 7:
+            break
+        else:
+            print("Invalid choice")
 
-    rows = cursor.fetchall()
 
-    if not rows:
-        print("No feedback for this product")
-    else:
-        print("\n--- FEEDBACK FOR PRODUCT ---")
-        headers = ["Customer","Rating","Comment"]
-        print(tabulate(rows, headers=headers, tablefmt="grid"))
-    conn.close()
+#CACHE STATISTICS(ADMIN)
+def cacheStats():
+    headers = ["Cache","Entries","Hits","Misses","Hit %"]
+    print(tabulate(feedback_cache.stats(), headers=headers, tablefmt="grid"))
 
 
-#DELETE FEEDBACK(ADMIN)
-def adminDeleteFeedback():
-    
-    fid = safe_int_input("Enter feedback ID to delete: ")
-    if fid is None:
+#QUERY STATISTICS(ADMIN)
+def queryStats():
+    rows = [
+        (r["sql"][:60], r["calls"], r["rows"], r["total_ms"], r["avg_ms"], r["max_ms"], r["slow"])
+        for r in feedback_metrics.metrics.summary(limit=15)
+    ]
+    if not rows:
+        print("No queries recorded yet")
         return
 
-    conn = sqlite3.connect("feedback.db")
+    print("\n--- SLOWEST STATEMENTS (by total time) ---")
+    headers = ["Statement","Calls","Rows","Total ms","Avg ms","Max ms","Slow"]
+    print(tabulate(rows, headers=headers, tablefmt="grid"))
 
-    cursor = conn.cursor()
+    recent = list(feedback_metrics.metrics.recent_slow)[-5:]
+    if recent:
+        print(f"\n--- RECENT SLOW QUERIES (>= {feedback_metrics.SLOW_QUERY_MS} ms) ---")
+        for entry in recent:
+            print(f"{entry['at']}  {entry['ms']} ms  {entry['sql'][:80]}")
+            for step in entry["plan"]:
+                print("    " + step)
 
-    cursor.execute(
-        "DELETE FROM Feedback WHERE feedback_id = ?",
-        (fid,)
-    )
+    path = input("Save full metrics as JSON to (Enter to skip): ").strip()
+    if path:
+        try:
+            feedback_metrics.metrics.dump(path)
+            print("Metrics saved to", path)
+        except OSError as e:
+            print("Could not save metrics:", e)
 
-    if cursor.rowcount == 0:
-        print("Feedback ID not found")
-    else:
-        conn.commit()
-        print("Feedback deleted successfully")
 
-    conn.close()
+#COMMENT ANALYTICS(ADMIN)
+def commentAnalytics(session):
+    while True:
+        try:
+            run = service.lastAnalyticsRun(session)
+        except service.NotSupported as e:
+            print(e)
+            return
+        print("\n--- COMMENT ANALYTICS ---")
+        if run:
+            print(f"Last analyzed {run[1]} comments at {run[0]} UTC ({run[2]}s)")
+        else:
+            print("Not analyzed yet: choose 1 first")
+        print("1.Analyze Comments Now")
+        print("2.Most Negative Products")
+        print("3.Most Positive Products")
+        print("4.Sentiment by Category")
+        print("5.Keywords for Product")
+        print("6.Keywords for Category")
+        print("7.Back")
+
+        ch = safe_int_input("Enter your choice:-")
+        if ch is None:
+            continue
 
+        headers = ["ProductID","Product Name","Comments","Positive","Neutral","Negative","Avg Score"]
+        if ch == 1:
+            print("Analyzing comments...")
+            count = service.refreshAnalytics(session)
+            print(f"Analyzed {count} comments")
+        elif ch in (2, 3):
+            min_comments = safe_int_input("Minimum comments per product: ")
+            if min_comments is None:
+                continue
+            rows = service.productSentiment(session, ch == 2, 20, min_comments)
+            print(tabulate(rows, headers=headers, tablefmt="grid"))
+        elif ch == 4:
+            headers = ["CategoryID","Category Name","Comments","Positive","Neutral","Negative","Avg Score"]
+            print(tabulate(service.categorySentiment(session), headers=headers, tablefmt="grid"))
+        elif ch in (5, 6):
+            name = input_product() if ch == 5 else input("Enter category name: ")
+            if name is None:
+                continue
+            try:
+                if ch == 5:
+                    rows = service.productKeywords(session, name)
+                else:
+                    rows = service.categoryKeywords(session, name)
+            except service.NotFound as e:
+                print(e)
+                continue
+            if not rows:
+                print("No keywords yet")
+            else:
+                print(tabulate(rows, headers=["Keyword","Count"], tablefmt="grid"))
+        elif ch == 7:
+            break
+        else:
+            print("Invalid choice")
 
-########################################## END ADMIN ###########################################
 
-#ADD FEEDBACK(CUSTOMER)
-def addFeedback(user_id):
-    conn = sqlite3.connect("feedback.db")
+#DATE RANGE REPORTS(ADMIN)
+def dateRangeReports(session):
+    while True:
+        print("\n--- DATE RANGE REPORTS ---")
+        print("1.Ratings by Category")
+        print("2.Ratings by Product")
+        print("3.Daily Ratings")
+        print("4.Back")
 
-    cursor = conn.cursor()
+        ch = safe_int_input("Enter your choice:-")
+        if ch is None:
+            continue
+        if ch == 4:
+            break
+        if ch not in (1, 2, 3):
+            print("Invalid choice")
+            continue
 
-    cursor.execute(
-        "SELECT customer_id FROM Customers WHERE user_id = ?",
-        (user_id,)
-    )
-    if not cursor.fetchone():
-        print("Customer profile not found")
-        conn.close()
-        return
+        start = input("From date YYYY-MM-DD (Enter=7 days ago): ").strip()
+        end = input("To date YYYY-MM-DD (Enter=today): ").strip()
+        totals = ["Ratings","Average","1","2","3","4","5"]
+        try:
+            if ch == 1:
+                rows = service.categoryReport(session, start, end)
+                headers = ["CategoryID","Category Name"] + totals
+            elif ch == 2:
+                cname = input("Category name (Enter=all): ").strip()
+                rows = service.productReport(session, start, end, cname)
+                headers = ["ProductID","Product Name"] + totals
+            else:
+                cname = input("Category name (Enter=all): ").strip()
+                rows = service.dailyReport(session, start, end, cname)
+                headers = ["Day"] + totals
+        except service.ServiceError as e:
+            print(e)
+            continue
+
+        if not rows:
+            print("No feedback in this period")
+        else:
+            print(tabulate(rows, headers=headers, tablefmt="grid"))
 
-    product_id = safe_int_input("Enter product id: ")
-    if product_id is None:
-        return
 
+########################################## END ADMIN ###########################################
 
+def rating_input(msg):
     while True:
         try:
-            rating = int(input("Rating (1-5): "))
+            rating = int(input(msg))
             if 1 <= rating <= 5:
-                break
+                return rating
             else:
                 print("Rating must be between 1 and 5")
         except ValueError:
             print("Enter numbers only")
 
-    comment = input("Comment: ")
-
-    cursor.execute("""
-        SELECT feedback_id
-        FROM Feedback
-        WHERE customer_id = (
-            SELECT customer_id FROM Customers WHERE user_id = ?
-        )
-        AND product_id = ?
-    """, (user_id, product_id))
-
-    if cursor.fetchone():
-        print("You have already given feedback for this product")
-        conn.close()
-        return
 
-    cursor.execute("""
-        INSERT INTO Feedback(customer_id, product_id, rating, comment)
-        VALUES (
-            (SELECT customer_id FROM Customers WHERE user_id=?),
-            ?, ?, ?
-        )
-    """, (user_id, product_id, rating, comment))
+def has_profile(session):
+    if session.customer_id is None:
+        print("Customer profile not found")
+        return False
+    return True
 
-    conn.commit()
-    print("Feedback added successfully")
 
+#ADD FEEDBACK(CUSTOMER)
+def addFeedback(session):
+    if not has_profile(session):
+        return
 
-#VIEW OWN FEEDBACK(CUSTOMER)
-def viewFeedback(user_id):
-    conn = sqlite3.connect("feedback.db")
+    product_id = safe_int_input("Enter product id: ")
+    if product_id is None:
+        return
 
-    cursor = conn.cursor()
+    rating = rating_input("Rating (1-5): ")
+    comment = input("Comment: ")
 
-    cursor.execute(
-        "SELECT customer_id FROM Customers WHERE user_id = ?",
-        (user_id,)
-    )
-    if not cursor.fetchone():
-        print("Customer profile not found")
-        conn.close()
-        return
+    try:
+        service.addFeedback(session, product_id, rating, comment)
+        print("Feedback added successfully")
+    except service.ServiceError as e:
+        print(e)
 
-    cursor.execute("""
-        SELECT feedback_id, product_id, rating, comment
-        FROM Feedback
-        WHERE customer_id = (
-            SELECT customer_id FROM Customers WHERE user_id = ?
-        )
-    """, (user_id,))
 
-    rows = cursor.fetchall()
+#VIEW OWN FEEDBACK(CUSTOMER)
+def viewFeedback(session):
+    try:
+        rows = service.viewFeedback(session)
+    except service.NotFound as e:
+        print(e)
+        return
 
     if not rows:
         print("No feedback yet")
     else:
         headers = ["FeedbackID","ProductID","Rating","Comment"]
         print(tabulate(rows, headers=headers, tablefmt="grid"))
-            
-    conn.close()
-    
-
 
-#SEARCH FEEDBACK(BY PRODUCT ID)
-def searchFeedback(user_id):
-    conn = sqlite3.connect("feedback.db")
 
-    cursor = conn.cursor()
 
-    cursor.execute(
-        "SELECT customer_id FROM Customers WHERE user_id = ?",
-        (user_id,)
-    )
-    if not cursor.fetchone():
-        print("Customer profile not found")
-        conn.close()
+#SEARCH FEEDBACK(BY PRODUCT ID)
+def searchFeedback(session):
+    if not has_profile(session):
         return
 
     product_id = safe_int_input("Enter product id to search: ")
     if product_id is None:
         return
 
-
-    cursor.execute("""
-        SELECT feedback_id, rating, comment
-        FROM Feedback
-        WHERE product_id = ?
-        AND customer_id = (
-            SELECT customer_id FROM Customers WHERE user_id = ?
-        )
-    """, (product_id, user_id))
-
-    rows = cursor.fetchall()
+    rows = service.searchFeedback(session, product_id)
 
     if not rows:
         print("No feedback found for this product")
@@ -451,154 +521,65 @@ def searchFeedback(user_id):
         headers = ["FeedbackID","Rating","Comment"]
         print(tabulate(rows, headers=headers, tablefmt="grid"))
 
-    
-
 
 
 #UPDATE FEEDBACK(ONLY OWN)
-def updateFeedback(user_id):
-    conn = sqlite3.connect("feedback.db")
-
-    cursor = conn.cursor()
-
-
-    cursor.execute(
-        "SELECT customer_id FROM Customers WHERE user_id = ?",
-        (user_id,)
-    )
-    if not cursor.fetchone():
-        print("Customer profile not found")
-        conn.close()
+def updateFeedback(session):
+    if not has_profile(session):
         return
 
-
     fid = safe_int_input("Enter feedback id: ")
     if fid is None:
         return
 
-    while True:
-        try:
-            rating = int(input("New rating (1-5): "))
-            if 1 <= rating <= 5:
-                break
-            else:
-                print("Rating must be between 1 and 5")
-        except ValueError:
-            print("Enter numbers only")
-
+    rating = rating_input("New rating (1-5): ")
     comment = input("New comment: ")
 
-    cursor.execute("""
-        UPDATE Feedback
-        SET rating = ?, comment = ?
-        WHERE feedback_id = ?
-        AND customer_id = (
-            SELECT customer_id FROM Customers WHERE user_id = ?
-        )
-    """, (rating, comment, fid, user_id))
-
-    if cursor.rowcount == 0:
-        print("Feedback not found or not yours")
-    else:
-        conn.commit()
+    try:
+        service.updateFeedback(session, fid, rating, comment)
         print("Feedback updated successfully")
-
-    
-
-
+    except service.NotFound as e:
+        print(e)
 
 
 
 #DELETE FEEDBACK(LOGGED IN CUSTOMER ONLY)
-def deleteFeedback(user_id):
-    conn = sqlite3.connect("feedback.db")
-
-    cursor = conn.cursor()
-
-
-    cursor.execute(
-        "SELECT customer_id FROM Customers WHERE user_id = ?",
-        (user_id,)
-    )
-    if not cursor.fetchone():
-        print("Customer profile not found")
-        conn.close()
+def deleteFeedback(session):
+    if not has_profile(session):
         return
 
-  
     fid = safe_int_input("Feedback ID: ")
     if fid is None:
         return
 
-
-    cursor.execute("""
-        DELETE FROM Feedback
-        WHERE feedback_id = ?
-        AND customer_id = (
-            SELECT customer_id FROM Customers WHERE user_id = ?
-        )
-    """, (fid, user_id))
-
-    if cursor.rowcount == 0:
-        print("Feedback not found or not yours")
-    else:
-        conn.commit()
+    try:
+        service.deleteFeedback(session, fid)
         print("Feedback deleted")
+    except service.NotFound as e:
+        print(e)
 
-    
 
 
 #VIEW ALL FEEDBACK
-def viewAllFeedback():
-    conn = sqlite3.connect("feedback.db")
-
-    cursor = conn.cursor()
-
-    cursor.execute("""
-        SELECT P.product_name, F.rating, F.comment
-        FROM Feedback F
-        JOIN Product P ON F.product_id = P.product_id
-        """)
-
-    rows = cursor.fetchall()
-
-    if not rows:
-        print("No feedback available")
-    else:
-        print("\n--- ALL CUSTOMER FEEDBACK ---")
-        headers = ["Product","Rating","Comment"]
-        print(tabulate(rows, headers=headers, tablefmt="grid"))
-
-    conn.close()
+def viewAllFeedback(page_size=service.PAGE_SIZE):
+    page_feedback(
+        "\n--- ALL CUSTOMER FEEDBACK ---", "No feedback available",
+        ["Product","Rating","Comment"],
+        service.viewAllFeedback, service.streamAllFeedback,
+        lambda row: row[1:], page_size,
+    )
 
 #VIEW FEEDBACK BY PRODUCT(ALL CUSTOMERS)
 def viewFeedbackByProduct():
-    pname = input("Enter product name: ")
-
-    conn = sqlite3.connect("feedback.db")
-
-    cursor = conn.cursor()
-
-    cursor.execute(
-        "SELECT product_id FROM Product WHERE product_name LIKE ?",
-        (f"%{pname}%",)
-    )
-    product = cursor.fetchone()
-
-    if not product:
-        print("Product not found")
-        conn.close()
+    pname = input_product()
+    if pname is None:
         return
 
-    product_id = product[0]
-
-    cursor.execute("""
-    SELECT rating, comment
-    FROM Feedback
-    WHERE product_id = ?
-    """, (product_id,))
-
-    rows = cursor.fetchall()
+    try:
+        rows = service.viewFeedbackByProduct(pname)
+    except service.NotFound as e:
+        print(e)
+        return
 
     if not rows:
         print("No feedback for this product")
@@ -610,12 +591,7 @@ def viewFeedbackByProduct():
 #VIEW ALL CATEGORY(CUSTOMER)
 def viewAllCategory():
 
-    conn = sqlite3.connect("feedback.db")
-    cursor = conn.cursor()
-    cursor.execute('''
-                    SELECT category_name FROM Category 
-                   ''')
-    rows = cursor.fetchall()
+    rows = service.viewAllCategory()
     if not rows:
         print("No Category found")
     else:
@@ -623,38 +599,106 @@ def viewAllCategory():
         headers = ["Category Name"]
         print(tabulate(rows,headers=headers,tablefmt="grid"))
 
-    conn.close()
-
 #VIEW ALL PRODUCTS BY CATEGORY(CUSTOMER)
 def viewAllProducts():
     cname = input("Enter the category name:")
-    conn = sqlite3.connect("feedback.db")
-    cursor = conn.cursor()
-    cursor.execute('''
-                    SELECT category_id FROM Category WHERE category_name = ? 
-                   ''',(cname,))
-    if not cursor.fetchone():
-        print("Category not found")
-        conn.close()
-        return
-
-    cursor.execute("""
-        SELECT product_id, product_name, price,description
-        FROM Product
-        WHERE category_id = (
-            SELECT category_id FROM Category WHERE category_name = ? 
-        )
-    """, (cname,))
 
-    rows = cursor.fetchall()
+    try:
+        rows = service.viewAllProducts(cname)
+    except service.NotFound as e:
+        print(e)
+        return
 
     if not rows:
         print("No product found for this category")
     else:
         headers = ["ProductID","RaProduct Name","Price","Description"]
         print(tabulate(rows, headers=headers, tablefmt="grid"))
+        if input("See what customers who rated a product also liked? (y/n): ").strip().lower() == "y":
+            alsoLiked()
+
+#CUSTOMERS ALSO LIKED
+def alsoLiked():
+    pname = input_product()
+    if pname is None:
+        return
+
+    try:
+        rows = service.alsoLiked(pname)
+    except service.ServiceError as e:
+        print(e)
+        return
+
+    if not rows:
+        print("Not enough ratings to recommend anything yet")
+    else:
+        print(f"\n--- CUSTOMERS WHO RATED {pname.upper()} ALSO LIKED ---")
+        headers = ["ProductID","Product Name","Price","Similarity"]
+        print(tabulate(rows, headers=headers, tablefmt="grid"))
+
+
+
+
+
+
+
+#RATING SUMMARIES
+RATING_HEADERS = ["ProductID","Product Name","Ratings","Average","1*","2*","3*","4*","5*"]
+
+def topRatedProducts():
+    rows = service.topRatedProducts()
+    if not rows:
+        print("No rated products yet")
+    else:
+        print("\n--- TOP RATED PRODUCTS ---")
+        print(tabulate(rows, headers=RATING_HEADERS, tablefmt="grid"))
+
+def productRatingSummary():
+    pname = input_product()
+    if pname is None:
+        return
+
+    try:
+        row = service.productRatingSummary(pname)
+    except service.NotFound as e:
+        print(e)
+        return
+
+    print("\n--- PRODUCT RATING SUMMARY ---")
+    print(tabulate([row], headers=RATING_HEADERS, tablefmt="grid"))
+
+#FULL-TEXT SEARCH
+def searchComments(session):
+    text = input("Search comments (words or \"a phrase\"): ")
+
+    try:
+        rows = service.searchComments(session, text)
+    except service.InvalidInput as e:
+        print(e)
+        return
+
+    if not rows:
+        print("No matching feedback")
+    else:
+        print("\n--- MATCHING FEEDBACK ---")
+        headers = ["ID","Product","Customer","Rating","Comment"]
+        print(tabulate(rows, headers=headers, tablefmt="grid"))
 
-    conn.close()   
+def searchProducts():
+    text = input("Search products: ")
+
+    try:
+        rows = service.searchProducts(text)
+    except service.InvalidInput as e:
+        print(e)
+        return
+
+    if not rows:
+        print("No matching products")
+    else:
+        print("\n--- MATCHING PRODUCTS ---")
+        headers = ["ProductID","Product Name","Price","Description"]
+        print(tabulate(rows, headers=headers, tablefmt="grid"))
 
 
 
@@ -676,30 +720,21 @@ def welcome():
     if ch == 1:
         register()
     elif ch == 2:
-        user_id = login()
-        if user_id:
-            conn = sqlite3.connect("feedback.db")
-
-            cursor = conn.cursor()
-            cursor.execute("SELECT role FROM Users WHERE id = ?", (user_id,))
-            row = cursor.fetchone()
-            if not row:
-                print("User not found")
-                conn.close()
-                return
-            role = row[0]
-
-
-            if role == "admin":
-                admin_menu()
-            else:
-                main(user_id)
+        session = login()
+        if session:
+            try:
+                if session.role == "admin":
+                    admin_menu(session)
+                else:
+                    main(session)
+            finally:
+                session.close()
     elif ch == 3:
         exit()
     else:
         print("Invalid choice")
 
-def main(user_id):
+def main(session):
     print("***CUSTOMER FEEDBACK MANAGEMENT SYSTEM***")
     while True:
         print("Choose any:")
@@ -713,7 +748,11 @@ def main(user_id):
             7.View Feedback by Product
             8.View All Category
             9.View All Products by Category
-            10.Exit
+            10.Top Rated Products
+            11.Product Rating Summary
+            12.Search Products
+            13.Customers Also Liked
+            14.Exit
             """)
 
         ch = safe_int_input("Enter your choice:-")
@@ -721,15 +760,15 @@ def main(user_id):
             continue
 
         if ch == 1:
-            addFeedback(user_id)
+            addFeedback(session)
         elif ch == 2:
-            viewFeedback(user_id)
+            viewFeedback(session)
         elif ch == 3:
-            searchFeedback(user_id)
+            searchFeedback(session)
         elif ch == 4:
-            updateFeedback(user_id)
+            updateFeedback(session)
         elif ch == 5:
-            deleteFeedback(user_id)
+            deleteFeedback(session)
         elif ch == 6:
             viewAllFeedback()
         elif ch == 7:
@@ -739,6 +778,14 @@ def main(user_id):
         elif ch == 9:
             viewAllProducts()
         elif ch == 10:
+            topRatedProducts()
+        elif ch == 11:
+            productRatingSummary()
+        elif ch == 12:
+            searchProducts()
+        elif ch == 13:
+            alsoLiked()
+        elif ch == 14:
             break
         else:
             print("Invalid option")
@@ -746,7 +793,7 @@ def main(user_id):
 
 
 #ADMIN MAIN MENU
-def admin_menu():
+def admin_menu(session):
     while True:
         print("\n*** ADMIN MENU ***")
         print("1.Add Category")
@@ -756,7 +803,16 @@ def admin_menu():
         print("5.View Feedback")
         print("6.View Feedback By Product")
         print("7.Delete Feedback")
-        print("8.Logout")
+        print("8.Top Rated Products")
+        print("9.Product Rating Summary")
+        print("10.Search Feedback Comments")
+        print("11.Search Products")
+        print("12.Cache Statistics")
+        print("13.Query Statistics")
+        print("14.Comment Analytics")
+        print("15.Date Range Reports")
+        print("16.Moderation Queue")
+        print("17.Logout")
 
         ch = safe_int_input("Enter your choice:-")
         if ch is None:
@@ -764,21 +820,47 @@ def admin_menu():
 
 
         if ch == 1:
-            addCategory()
+            addCategory(session)
         elif ch == 2:
-            addProduct()
+            addProduct(session)
         elif ch == 3:
             viewCategory()
         elif ch == 4:
             viewProducts()
         elif ch == 5:
-            adminViewFeedback()
+            adminViewFeedback(session)
         elif ch == 6:
-            adminViewFeedbackByProduct()
+            adminViewFeedbackByProduct(session)
         elif ch == 7:
-            adminDeleteFeedback()
+            adminDeleteFeedback(session)
         elif ch == 8:
+            topRatedProducts()
+        elif ch == 9:
+            productRatingSummary()
+        elif ch == 10:
+            searchComments(session)
+        elif ch == 11:
+            searchProducts()
+        elif ch == 12:
+            cacheStats()
+        elif ch == 13:
+            queryStats()
+        elif ch == 14:
+            commentAnalytics(session)
+        elif ch == 15:
+            dateRangeReports(session)
+        elif ch == 16:
+            moderationQueue(session)
+        elif ch == 17:
             break
         else:
             print("Invalid choice")
-welcome()
\ No newline at end of file
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        import feedback_cli
+        sys.exit(feedback_cli.main())
+    init_schema()
+    feedback_shards.configure(feedback_shards.SHARD_PATHS)
+    welcome()
@@ -0,0 +1,275 @@
+import argparse
+import os
+import re
+import sqlite3
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from urllib.parse import quote
+
+try:
+    import numpy as np
+except ImportError:  # optional: scores are aggregated in plain Python without it
+    np = None
+
+import feedback_db
+
+
+# Batch sentiment and keyword analytics over Feedback.comment.
+#
+# The Feedback id range is split into chunks of CHUNK_ROWS ids. Worker
+# processes each open their own read-only connection, read one chunk,
+# tokenize it, score every comment against a small sentiment lexicon and
+# count unigrams and bigrams per product. The parent merges the partial
+# results and replaces the summary tables (ProductSentiment,
+# ProductKeywords, CategoryKeywords) in one transaction, so readers see
+# either the previous run or this one.
+#
+#   python feedback_analytics.py --workers 8
+#
+# A comment's score is the sum of its lexicon weights w, squashed into
+# (-1, 1) as w / sqrt(w^2 + ALPHA). A weight is flipped when one of the two
+# words before it is a negation ("not good"). Scores within NEUTRAL_BAND of
+# zero count as neutral.
+#
+# Keyword counts are approximate for very large products: each chunk
+# returns only its KEEP_PER_CHUNK most common n-grams per product, and the
+# merged counts keep the top ones.
+
+CHUNK_ROWS = 50_000
+WORKERS = os.cpu_count() or 1
+TOP_NGRAMS = 20
+KEEP_PER_CHUNK = 200
+ALPHA = 15
+NEUTRAL_BAND = 0.05
+
+LEXICON = {
+    "amazing": 3, "awesome": 3, "excellent": 3, "fantastic": 3, "love": 3, "loved": 3,
+    "perfect": 3, "outstanding": 3, "superb": 3, "wonderful": 3,
+    "great": 2, "good": 2, "happy": 2, "nice": 2, "recommend": 2, "recommended": 2,
+    "reliable": 2, "satisfied": 2, "durable": 2, "fast": 2, "easy": 2, "comfortable": 2,
+    "helpful": 2, "quality": 1, "works": 1, "worth": 1, "value": 1, "fine": 1, "ok": 1,
+    "okay": 1, "cheap": 1, "quick": 1, "solid": 1, "bright": 1, "clean": 1, "like": 1,
+    "slow": -1, "expensive": -1, "average": -1, "noisy": -1, "loud": -1, "dim": -1,
+    "heavy": -1, "late": -1, "delay": -1, "delayed": -1, "scratched": -1, "fragile": -1,
+    "bad": -2, "poor": -2, "problem": -2, "problems": -2, "issue": -2, "issues": -2,
+    "disappointed": -2, "disappointing": -2, "return": -2, "returned": -2, "refund": -2,
+    "cracked": -2, "stopped": -2, "flimsy": -2, "unhappy": -2, "annoying": -2, "hate": -3,
+    "broken": -3, "terrible": -3, "awful": -3, "horrible": -3, "worst": -3, "useless": -3,
+    "waste": -3, "defective": -3, "scam": -3, "never": -1,
+}
+
+NEGATIONS = frozenset(
+    "not no never nothing hardly barely dont don't doesn't didn't isn't wasn't "
+    "aren't won't can't cannot couldn't wouldn't shouldn't".split()
+)
+
+STOPWORDS = frozenset(
+    "a an and are as at be been but by for from had has have he her his i if in "
+    "into is it its it's me my of on or our she so than that the their them then "
+    "there these they this to too us very was we were what when which who will "
+    "with would you your just also really all any can get got one out up".split()
+) | NEGATIONS
+
+TOKEN = re.compile(r"[a-z][a-z']*")
+
+
+def tokenize(text):
+    return TOKEN.findall(text.lower()) if text else []
+
+
+def comment_weight(tokens):
+    weight = 0
+    for i, token in enumerate(tokens):
+        value = LEXICON.get(token)
+        if value is None:
+            continue
+        if (i > 0 and tokens[i - 1] in NEGATIONS) or (i > 1 and tokens[i - 2] in NEGATIONS):
+            value = -value
+        weight += value
+    return weight
+
+
+def ngrams(tokens):
+    # Unigrams and adjacent bigrams of content words only.
+    content = [t if t not in STOPWORDS and len(t) > 2 else None for t in tokens]
+    grams = [t for t in content if t]
+    grams.extend(f"{a} {b}" for a, b in zip(content, content[1:]) if a and b)
+    return grams
+
+
+#SCORING
+def _aggregate(products, weights):
+    """Per product: [comments, positive, neutral, negative, score_sum]."""
+    if np is not None:
+        w = np.asarray(weights, dtype=np.float64)
+        scores = w / np.sqrt(w * w + ALPHA)
+        ids, inverse = np.unique(np.asarray(products, dtype=np.int64), return_inverse=True)
+        n = len(ids)
+        comments = np.bincount(inverse, minlength=n)
+        positive = np.bincount(inverse, weights=scores > NEUTRAL_BAND, minlength=n)
+        negative = np.bincount(inverse, weights=scores < -NEUTRAL_BAND, minlength=n)
+        totals = np.bincount(inverse, weights=scores, minlength=n)
+        return {
+            int(pid): [int(c), int(p), int(c - p - q), int(q), float(t)]
+            for pid, c, p, q, t in zip(ids, comments, positive, negative, totals)
+        }
+
+    result = {}
+    for pid, w in zip(products, weights):
+        score = w / (w * w + ALPHA) ** 0.5
+        entry = result.get(pid)
+        if entry is None:
+            entry = result[pid] = [0, 0, 0, 0, 0.0]
+        entry[0] += 1
+        if score > NEUTRAL_BAND:
+            entry[1] += 1
+        elif score < -NEUTRAL_BAND:
+            entry[3] += 1
+        else:
+            entry[2] += 1
+        entry[4] += score
+    return result
+
+
+def analyze_range(path, lo, hi):
+    """Worker: analyze Feedback rows with lo < feedback_id <= hi."""
+    conn = sqlite3.connect(f"file:{quote(path)}?mode=ro", uri=True)
+    try:
+        rows = conn.execute(
+            "SELECT product_id, comment FROM Feedback WHERE feedback_id > ? AND feedback_id <= ?",
+            (lo, hi)
+        ).fetchall()
+    finally:
+        conn.close()
+
+    products = []
+    weights = []
+    counters = defaultdict(Counter)
+    for product_id, comment in rows:
+        tokens = tokenize(comment)
+        products.append(product_id)
+        weights.append(comment_weight(tokens))
+        counters[product_id].update(ngrams(tokens))
+
+    keywords = {pid: c.most_common(KEEP_PER_CHUNK) for pid, c in counters.items()}
+    return len(rows), _aggregate(products, weights), keywords
+
+
+#RUN
+def _merge_keywords(target, key, counts):
+    counter = target[key]
+    counter.update(dict(counts))
+    if len(counter) > 4 * KEEP_PER_CHUNK:
+        target[key] = Counter(dict(counter.most_common(KEEP_PER_CHUNK)))
+
+
+def _top(counters):
+    for key, counter in counters.items():
+        for ngram, count in counter.most_common(TOP_NGRAMS):
+            yield key, ngram, count
+
+
+def _save(conn, sentiment, product_keywords, category_keywords, comments, seconds):
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute("DELETE FROM ProductSentiment")
+        conn.execute("DELETE FROM ProductKeywords")
+        conn.execute("DELETE FROM CategoryKeywords")
+        conn.executemany(
+            "INSERT INTO ProductSentiment(product_id, comments, positive, neutral, negative, avg_score)"
+            " VALUES (?, ?, ?, ?, ?, ?)",
+            ((pid, c, p, n, q, round(total / c, 4)) for pid, (c, p, n, q, total) in sentiment.items()),
+        )
+        conn.executemany(
+            "INSERT INTO ProductKeywords(product_id, ngram, count) VALUES (?, ?, ?)",
+            _top(product_keywords),
+        )
+        conn.executemany(
+            "INSERT INTO CategoryKeywords(category_id, ngram, count) VALUES (?, ?, ?)",
+            _top(category_keywords),
+        )
+        conn.execute(
+            "INSERT INTO AnalyticsRun(finished_at, comments, seconds)"
+            " VALUES (datetime('now'), ?, ?)",
+            (comments, round(seconds, 2))
+        )
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+
+
+def run(workers=WORKERS, chunk_rows=CHUNK_ROWS, log=None):
+    """Rebuild the analytics tables from every comment; returns rows analyzed."""
+    start = time.perf_counter()
+    path = feedback_db.get_pool().path
+    with feedback_db.get_conn() as conn:
+        lo, hi = conn.execute(
+            "SELECT COALESCE(MIN(feedback_id) - 1, 0), COALESCE(MAX(feedback_id), 0) FROM Feedback"
+        ).fetchone()
+        category_of = dict(conn.execute("SELECT product_id, category_id FROM Product"))
+
+    bounds = [(a, min(a + chunk_rows, hi)) for a in range(lo, hi, chunk_rows)]
+    sentiment = {}
+    product_keywords = defaultdict(Counter)
+    category_keywords = defaultdict(Counter)
+    comments = 0
+
+    def merge(result):
+        nonlocal comments
+        count, chunk_sentiment, chunk_keywords = result
+        comments += count
+        for pid, values in chunk_sentiment.items():
+            entry = sentiment.get(pid)
+            if entry is None:
+                sentiment[pid] = values
+            else:
+                for i, value in enumerate(values):
+                    entry[i] += value
+        for pid, counts in chunk_keywords.items():
+            _merge_keywords(product_keywords, pid, counts)
+            category = category_of.get(pid)
+            if category is not None:
+                _merge_keywords(category_keywords, category, counts)
+        if log:
+            rate = comments / (time.perf_counter() - start)
+            log(f"... {comments} comments, {rate:.0f}/sec")
+
+    los = [b[0] for b in bounds]
+    his = [b[1] for b in bounds]
+    if workers > 1 and len(bounds) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for result in pool.map(analyze_range, repeat(path), los, his):
+                merge(result)
+    else:
+        for result in map(analyze_range, repeat(path), los, his):
+            merge(result)
+
+    with feedback_db.get_conn() as conn:
+        _save(conn, sentiment, product_keywords, category_keywords,
+              comments, time.perf_counter() - start)
+    return comments
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rebuild comment sentiment and keyword summaries")
+    parser.add_argument("--db", default=feedback_db.DB_PATH)
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--chunk", type=int, default=CHUNK_ROWS, help="feedback ids per work unit")
+    args = parser.parse_args(argv)
+
+    feedback_db.configure(args.db)
+    feedback_db.init_schema()
+    start = time.perf_counter()
+    try:
+        comments = run(args.workers, args.chunk, log=print)
+    finally:
+        feedback_db.close_pool()
+    print(f"Analyzed {comments} comments in {time.perf_counter() - start:.1f}s"
+          f" ({'numpy' if np is not None else 'pure Python'} scoring)")
+
+
+if __name__ == "__main__":
+    main()
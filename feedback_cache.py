@@ -0,0 +1,81 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+# In-process read-through caches for data that changes rarely compared to
+# how often it is read. Writers in this process invalidate explicitly; the
+# TTL bounds how stale an entry can get when another process does the write.
+
+CATALOG_SIZE = 1024
+CATALOG_TTL = 60
+CUSTOMER_SIZE = 100_000
+CUSTOMER_TTL = 3600
+
+
+class LRUCache:
+    def __init__(self, name, maxsize, ttl):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+
+    def get_or_load(self, key, loader):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] > now:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            generation = self._generation
+
+        # Load outside the lock so one slow query does not stall every
+        # other lookup; concurrent misses on one key just load it twice.
+        # A value loaded across an invalidation may be stale, so it is
+        # returned but not stored.
+        value = loader()
+        with self._lock:
+            if generation != self._generation:
+                return value
+            self._data[key] = (now + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        return value
+
+    def invalidate(self, key):
+        with self._lock:
+            self._generation += 1
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            rate = self.hits / total * 100 if total else 0.0
+            return (self.name, len(self._data), self.hits, self.misses, round(rate, 1))
+
+
+catalog = LRUCache("catalog", CATALOG_SIZE, CATALOG_TTL)
+customers = LRUCache("customers", CUSTOMER_SIZE, CUSTOMER_TTL)
+
+CACHES = [catalog, customers]
+
+
+def stats():
+    return [cache.stats() for cache in CACHES]
+
+
+def clear_all():
+    for cache in CACHES:
+        cache.clear()
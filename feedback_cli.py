@@ -0,0 +1,464 @@
+import argparse
+import getpass
+import os
+import sqlite3
+import sys
+
+import feedback_db
+import feedback_render
+import feedback_service as service
+import feedback_shards
+
+
+# Non-interactive entry point for scripts and cron jobs. Every menu
+# operation is a subcommand; results go to stdout in --format and errors to
+# stderr with a non-zero exit status.
+#
+#   python customer_feedback_mgmt.py feedback list --all --format csv > all.csv
+#   python customer_feedback_mgmt.py --user admin admin list-feedback --product X --format jsonl
+#   python customer_feedback_mgmt.py import reviews.csv --rejects rejected.jsonl
+#
+# Commands that need a login take --user; the password comes from
+# $FEEDBACK_PASSWORD, or a prompt when stdin is a terminal.
+
+PASSWORD_ENV = "FEEDBACK_PASSWORD"
+
+CATEGORY_HEADERS = ["ID", "Category Name"]
+PRODUCT_HEADERS = ["ProductID", "Product Name", "CategoryID", "Price", "Description"]
+CATEGORY_PRODUCT_HEADERS = ["ProductID", "Product Name", "Price", "Description"]
+ADMIN_FEEDBACK_HEADERS = ["ID", "Product", "Customer", "Rating", "Comment"]
+ADMIN_PRODUCT_FEEDBACK_HEADERS = ["Customer", "Rating", "Comment"]
+FEEDBACK_HEADERS = ["ID", "Product", "Rating", "Comment"]
+PRODUCT_FEEDBACK_HEADERS = ["Rating", "Comment"]
+OWN_FEEDBACK_HEADERS = ["Feedback ID", "Product ID", "Rating", "Comment"]
+RATING_HEADERS = ["ProductID", "Product Name", "Ratings", "Average", "1", "2", "3", "4", "5"]
+COMMENT_MATCH_HEADERS = ["ID", "Product", "Customer", "Rating", "Match"]
+PRODUCT_MATCH_HEADERS = ["ProductID", "Product Name", "Price", "Match"]
+PRODUCT_NAME_HEADERS = ["ProductID", "Product Name", "Match"]
+ALSO_LIKED_HEADERS = ["ProductID", "Product Name", "Price", "Similarity"]
+SENTIMENT_HEADERS = ["Comments", "Positive", "Neutral", "Negative", "Avg Score"]
+KEYWORD_HEADERS = ["Keyword", "Count"]
+REPORT_HEADERS = ["Ratings", "Average", "1", "2", "3", "4", "5"]
+MODERATION_HEADERS = ["ID", "Product", "Customer", "Rating", "Comment", "Reason", "Duplicate Of", "Flagged At"]
+CHANGE_HEADERS = ["seq", "op", "feedback_id", "customer_id", "product_id", "rating", "comment", "changed_at"]
+
+
+class CLIError(Exception):
+    pass
+
+
+def output(args, headers, rows):
+    feedback_render.render(rows, headers, args.format, sys.stdout)
+
+
+def login(args, role):
+    if not args.user:
+        raise CLIError(f"--user is required for {role} commands")
+    password = os.environ.get(PASSWORD_ENV)
+    if password is None:
+        if not sys.stdin.isatty():
+            raise CLIError(f"Set {PASSWORD_ENV} or run from a terminal")
+        password = getpass.getpass()
+    return service.login(args.user, password, role)
+
+
+def feedback_rows(args, fetch_page, stream):
+    # --all streams every row after --after; otherwise one page.
+    if args.all:
+        return stream(args.after)
+    return fetch_page(args.after, args.limit)
+
+
+#CATALOG
+def catalog_categories(args):
+    output(args, CATEGORY_HEADERS, service.viewCategory())
+
+
+def catalog_products(args):
+    if args.category is None:
+        output(args, PRODUCT_HEADERS, service.viewProducts())
+    else:
+        output(args, CATEGORY_PRODUCT_HEADERS, service.viewAllProducts(args.category))
+
+
+def catalog_search(args):
+    output(args, PRODUCT_MATCH_HEADERS, service.searchProducts(args.text, args.limit))
+
+
+def catalog_match(args):
+    output(args, PRODUCT_NAME_HEADERS, service.matchProducts(args.name, args.limit))
+
+
+def catalog_also_liked(args):
+    output(args, ALSO_LIKED_HEADERS, service.alsoLiked(args.name, args.limit))
+
+
+#FEEDBACK
+def feedback_list(args):
+    if args.product is not None:
+        output(args, PRODUCT_FEEDBACK_HEADERS, service.viewFeedbackByProduct(args.product))
+        return
+    rows = feedback_rows(args, service.viewAllFeedback, service.streamAllFeedback)
+    output(args, FEEDBACK_HEADERS, rows)
+
+
+def feedback_top(args):
+    output(args, RATING_HEADERS, service.topRatedProducts(args.limit, args.min_ratings))
+
+
+def feedback_rating(args):
+    output(args, RATING_HEADERS, [service.productRatingSummary(args.product)])
+
+
+#MY FEEDBACK (CUSTOMER)
+def me_list(args):
+    session = login(args, "customer")
+    output(args, OWN_FEEDBACK_HEADERS, service.viewFeedback(session))
+
+
+def me_add(args):
+    session = login(args, "customer")
+    fid = service.addFeedback(session, args.product_id, args.rating, args.comment)
+    print(fid)
+
+
+def me_update(args):
+    session = login(args, "customer")
+    service.updateFeedback(session, args.feedback_id, args.rating, args.comment)
+
+
+def me_delete(args):
+    session = login(args, "customer")
+    service.deleteFeedback(session, args.feedback_id)
+
+
+#ADMIN
+def admin_list_feedback(args):
+    session = login(args, "admin")
+    if args.product is not None:
+        rows = service.adminViewFeedbackByProduct(session, args.product)
+        output(args, ADMIN_PRODUCT_FEEDBACK_HEADERS, rows)
+        return
+    rows = feedback_rows(
+        args,
+        lambda after, limit: service.adminViewFeedback(session, after, limit),
+        lambda after: service.streamAdminFeedback(session, after),
+    )
+    output(args, ADMIN_FEEDBACK_HEADERS, rows)
+
+
+def admin_delete_feedback(args):
+    session = login(args, "admin")
+    service.adminDeleteFeedback(session, args.feedback_id)
+
+
+def admin_queue(args):
+    session = login(args, "admin")
+    rows = feedback_rows(
+        args,
+        lambda after, limit: service.moderationQueue(session, after, limit),
+        lambda after: service.streamModerationQueue(session, after),
+    )
+    output(args, MODERATION_HEADERS, rows)
+
+
+def admin_approve(args):
+    session = login(args, "admin")
+    print(service.approveFeedback(session, args.feedback_ids))
+
+
+def admin_reject(args):
+    session = login(args, "admin")
+    print(service.rejectFeedback(session, args.feedback_ids))
+
+
+def admin_rescreen(args):
+    session = login(args, "admin")
+    screened, queued = service.rescreenFeedback(session)
+    print(f"Screened {screened} comments; {queued} queued for review")
+
+
+def admin_add_category(args):
+    session = login(args, "admin")
+    print(service.addCategory(session, args.name))
+
+
+def admin_add_product(args):
+    session = login(args, "admin")
+    print(service.addProduct(session, args.name, args.category_id, args.price, args.description))
+
+
+def admin_search(args):
+    session = login(args, "admin")
+    output(args, COMMENT_MATCH_HEADERS, service.searchComments(session, args.text, args.limit))
+
+
+def admin_analyze(args):
+    session = login(args, "admin")
+    print(service.refreshAnalytics(session, args.workers))
+
+
+def admin_export(args):
+    session = login(args, "admin")
+    entry = service.exportFeedback(session, args.out, args.full, args.export_format)
+    print(f"Run {entry['run']} ({entry['kind']}): {entry['rows']} rows, "
+          f"{entry['deleted']} deletes, {len(entry['files'])} files")
+
+
+def admin_sentiment(args):
+    session = login(args, "admin")
+    if args.by == "category":
+        rows = service.categorySentiment(session)
+        output(args, ["CategoryID", "Category Name"] + SENTIMENT_HEADERS, rows)
+        return
+    rows = service.productSentiment(session, not args.positive, args.limit, args.min_comments)
+    output(args, ["ProductID", "Product Name"] + SENTIMENT_HEADERS, rows)
+
+
+def admin_keywords(args):
+    session = login(args, "admin")
+    if args.product is not None:
+        rows = service.productKeywords(session, args.product, args.limit)
+    else:
+        rows = service.categoryKeywords(session, args.category, args.limit)
+    output(args, KEYWORD_HEADERS, rows)
+
+
+def admin_report(args):
+    session = login(args, "admin")
+    if args.by == "category":
+        rows = service.categoryReport(session, args.start, args.end)
+        output(args, ["CategoryID", "Category Name"] + REPORT_HEADERS, rows)
+    elif args.by == "product":
+        rows = service.productReport(session, args.start, args.end, args.category, args.limit)
+        output(args, ["ProductID", "Product Name"] + REPORT_HEADERS, rows)
+    else:
+        rows = service.dailyReport(session, args.start, args.end, args.category)
+        output(args, ["Day"] + REPORT_HEADERS, rows)
+
+
+def admin_changes(args):
+    session = login(args, "admin")
+    if args.all:
+        rows = service.streamChanges(session, args.after)
+    else:
+        rows = service.changesSince(session, args.after, args.limit)
+    output(args, CHANGE_HEADERS, rows)
+
+
+def admin_prune_changes(args):
+    session = login(args, "admin")
+    print(service.pruneChanges(session, args.through))
+
+
+def register(args):
+    password = os.environ.get(PASSWORD_ENV)
+    if password is None:
+        if not sys.stdin.isatty():
+            raise CLIError(f"Set {PASSWORD_ENV} or run from a terminal")
+        password = getpass.getpass("New password: ")
+    print(service.register(args.username, password, args.role, args.fullname, args.phone))
+
+
+def import_feedback(args):
+    import feedback_import
+    feedback_import.main(args.import_args)
+
+
+#PARSER
+def add_page_arguments(parser):
+    parser.add_argument("--after", type=int, default=0, help="start after this feedback ID")
+    parser.add_argument("--limit", type=int, default=service.PAGE_SIZE)
+    parser.add_argument("--all", action="store_true", help="stream every row instead of one page")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="customer_feedback_mgmt.py",
+        description="Customer feedback management (run with no arguments for the menus)",
+    )
+    parser.add_argument("--db", default=feedback_db.DB_PATH)
+    parser.add_argument("--format", choices=feedback_render.FORMATS, default="grid")
+    parser.add_argument("--user", help="username for customer and admin commands")
+    parser.add_argument("--replica", action="append",
+                        help="read public views from this snapshot (see feedback_replica.py)")
+    parser.add_argument("--max-staleness", type=float, help="seconds; older replicas are skipped")
+    parser.add_argument("--shard", action="append",
+                        help="feedback shard file, in order (default: $FEEDBACK_SHARDS)")
+
+    # The same options are accepted after the command too; SUPPRESS keeps
+    # the subcommand from overwriting a value given before it.
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--db", default=argparse.SUPPRESS)
+    common.add_argument("--format", choices=feedback_render.FORMATS, default=argparse.SUPPRESS)
+    common.add_argument("--user", default=argparse.SUPPRESS)
+
+    groups = parser.add_subparsers(dest="group", required=True, metavar="command")
+
+    catalog = groups.add_parser("catalog", help="categories and products")
+    commands = catalog.add_subparsers(dest="command", required=True)
+    commands.add_parser("categories", parents=[common]).set_defaults(func=catalog_categories)
+    p = commands.add_parser("products", parents=[common])
+    p.add_argument("--category", help="only products in this category")
+    p.set_defaults(func=catalog_products)
+    p = commands.add_parser("search", parents=[common])
+    p.add_argument("text")
+    p.add_argument("--limit", type=int, default=service.PAGE_SIZE)
+    p.set_defaults(func=catalog_search)
+    p = commands.add_parser("match", parents=[common], help="products whose names match, best first")
+    p.add_argument("name")
+    p.add_argument("--limit", type=int, default=service.MATCH_LIMIT)
+    p.set_defaults(func=catalog_match)
+    p = commands.add_parser("also-liked", parents=[common],
+                            help="products that customers who rated this one also liked")
+    p.add_argument("name")
+    p.add_argument("--limit", type=int, default=service.RECOMMEND_LIMIT)
+    p.set_defaults(func=catalog_also_liked)
+
+    feedback = groups.add_parser("feedback", help="everyone's feedback and ratings")
+    commands = feedback.add_subparsers(dest="command", required=True)
+    p = commands.add_parser("list", parents=[common])
+    p.add_argument("--product", help="only feedback for this product name")
+    add_page_arguments(p)
+    p.set_defaults(func=feedback_list)
+    p = commands.add_parser("top", parents=[common])
+    p.add_argument("--limit", type=int, default=10)
+    p.add_argument("--min-ratings", type=int, default=1)
+    p.set_defaults(func=feedback_top)
+    p = commands.add_parser("rating", parents=[common])
+    p.add_argument("product")
+    p.set_defaults(func=feedback_rating)
+
+    me = groups.add_parser("me", help="your own feedback (customer login)")
+    commands = me.add_subparsers(dest="command", required=True)
+    commands.add_parser("list", parents=[common]).set_defaults(func=me_list)
+    p = commands.add_parser("add", parents=[common])
+    p.add_argument("product_id", type=int)
+    p.add_argument("rating", type=int)
+    p.add_argument("comment", nargs="?", default="")
+    p.set_defaults(func=me_add)
+    p = commands.add_parser("update", parents=[common])
+    p.add_argument("feedback_id", type=int)
+    p.add_argument("rating", type=int)
+    p.add_argument("comment", nargs="?", default="")
+    p.set_defaults(func=me_update)
+    p = commands.add_parser("delete", parents=[common])
+    p.add_argument("feedback_id", type=int)
+    p.set_defaults(func=me_delete)
+
+    admin = groups.add_parser("admin", help="admin operations (admin login)")
+    commands = admin.add_subparsers(dest="command", required=True)
+    p = commands.add_parser("list-feedback", parents=[common])
+    p.add_argument("--product", help="only feedback for this product name")
+    add_page_arguments(p)
+    p.set_defaults(func=admin_list_feedback)
+    p = commands.add_parser("delete-feedback", parents=[common])
+    p.add_argument("feedback_id", type=int)
+    p.set_defaults(func=admin_delete_feedback)
+    p = commands.add_parser("queue", parents=[common], help="feedback waiting for moderation")
+    add_page_arguments(p)
+    p.set_defaults(func=admin_queue)
+    p = commands.add_parser("approve", parents=[common], help="approve queued feedback (one transaction)")
+    p.add_argument("feedback_ids", type=int, nargs="+")
+    p.set_defaults(func=admin_approve)
+    p = commands.add_parser("reject", parents=[common], help="delete queued feedback (one transaction)")
+    p.add_argument("feedback_ids", type=int, nargs="+")
+    p.set_defaults(func=admin_reject)
+    p = commands.add_parser("rescreen", parents=[common], help="screen all feedback for the moderation queue again")
+    p.set_defaults(func=admin_rescreen)
+    p = commands.add_parser("add-category", parents=[common])
+    p.add_argument("name")
+    p.set_defaults(func=admin_add_category)
+    p = commands.add_parser("add-product", parents=[common])
+    p.add_argument("name")
+    p.add_argument("category_id", type=int)
+    p.add_argument("price", type=int)
+    p.add_argument("description")
+    p.set_defaults(func=admin_add_product)
+    p = commands.add_parser("search", parents=[common], help="full-text search over comments")
+    p.add_argument("text")
+    p.add_argument("--limit", type=int, default=service.PAGE_SIZE)
+    p.set_defaults(func=admin_search)
+    p = commands.add_parser("analyze", parents=[common], help="rebuild comment sentiment and keyword summaries")
+    p.add_argument("--workers", type=int, help="worker processes (default: one per CPU)")
+    p.set_defaults(func=admin_analyze)
+    p = commands.add_parser("export", parents=[common], help="columnar export, partitioned by category")
+    p.add_argument("out", help="export directory")
+    p.add_argument("--full", action="store_true", help="export every row, not just changes")
+    p.add_argument("--export-format", choices=["parquet", "npz"],
+                   help="default: parquet if pyarrow is installed, else npz")
+    p.set_defaults(func=admin_export)
+    p = commands.add_parser("sentiment", parents=[common], help="comment sentiment from the last analyze")
+    p.add_argument("--by", choices=["product", "category"], default="product")
+    p.add_argument("--positive", action="store_true", help="most positive first")
+    p.add_argument("--min-comments", type=int, default=1)
+    p.add_argument("--limit", type=int, default=service.PAGE_SIZE)
+    p.set_defaults(func=admin_sentiment)
+    p = commands.add_parser("keywords", parents=[common], help="top words and phrases from the last analyze")
+    which = p.add_mutually_exclusive_group(required=True)
+    which.add_argument("--product")
+    which.add_argument("--category")
+    p.add_argument("--limit", type=int, default=20)
+    p.set_defaults(func=admin_keywords)
+    p = commands.add_parser("report", parents=[common], help="ratings over a date range")
+    p.add_argument("--by", choices=["category", "product", "day"], default="category")
+    p.add_argument("--from", dest="start", help="first day, YYYY-MM-DD (default: 7 days ago)")
+    p.add_argument("--to", dest="end", help="last day, YYYY-MM-DD (default: today, UTC)")
+    p.add_argument("--category", help="only this category (product and day reports)")
+    p.add_argument("--limit", type=int, default=service.PAGE_SIZE)
+    p.set_defaults(func=admin_report)
+    p = commands.add_parser("changes", parents=[common], help="feedback inserts, updates and deletes after --after")
+    p.add_argument("--after", type=int, default=0, help="last change seq already applied")
+    p.add_argument("--limit", type=int, default=service.STREAM_BATCH)
+    p.add_argument("--all", action="store_true", help="stream every change instead of one batch")
+    p.set_defaults(func=admin_changes)
+    p = commands.add_parser("prune-changes", parents=[common], help="delete changes up to a seq")
+    p.add_argument("through", type=int)
+    p.set_defaults(func=admin_prune_changes)
+
+    p = groups.add_parser("register", parents=[common], help="create a user")
+    p.add_argument("username")
+    p.add_argument("--role", choices=["admin", "customer"], default="customer")
+    p.add_argument("--fullname")
+    p.add_argument("--phone")
+    p.set_defaults(func=register)
+
+    p = groups.add_parser("import", help="bulk import feedback (see feedback_import.py)")
+    p.add_argument("import_args", nargs=argparse.REMAINDER)
+    p.set_defaults(func=import_feedback)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    feedback_db.configure(args.db)
+    if args.replica:
+        import feedback_replica
+        feedback_replica.configure(
+            args.replica, args.max_staleness or feedback_replica.MAX_STALENESS
+        )
+    try:
+        feedback_db.init_schema()
+        try:
+            feedback_shards.configure(args.shard or feedback_shards.SHARD_PATHS)
+        except ValueError as e:
+            raise CLIError(e) from None
+        args.func(args)
+    except (CLIError, service.ServiceError) as e:
+        print(e, file=sys.stderr)
+        return 1
+    except sqlite3.Error as e:
+        print("Database error:", e, file=sys.stderr)
+        return 1
+    except BrokenPipeError:
+        # Output piped into head and friends; not an error. Point stdout at
+        # devnull so the flush at exit does not raise again.
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+    finally:
+        feedback_shards.configure(None)
+        feedback_db.close_pool()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
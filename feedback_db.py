@@ -0,0 +1,783 @@
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from urllib.parse import quote
+
+from feedback_metrics import InstrumentedConnection
+
+
+DB_PATH = os.environ.get("FEEDBACK_DB", "feedback.db")
+POOL_SIZE = 5
+POOL_TIMEOUT = 30
+
+# sqlite3 keeps compiled statements per connection, keyed by SQL text.
+# Reusing pooled connections means every query below is prepared once
+# and then reused for the lifetime of the pool.
+STATEMENT_CACHE_SIZE = 256
+
+# Pooled connections record per-statement timings (see feedback_metrics).
+INSTRUMENT = True
+
+# Applied to every pooled connection. WAL lets readers run alongside the
+# single writer; with WAL, synchronous=NORMAL only fsyncs at checkpoints.
+JOURNAL_MODE = "WAL"
+PRAGMAS = [
+    ("synchronous", "NORMAL"),
+    ("cache_size", -64000),        # KiB, i.e. 64 MB of page cache
+    ("mmap_size", 268435456),      # 256 MB memory-mapped I/O
+    ("temp_store", "MEMORY"),
+]
+
+
+# Versioned schema. PRAGMA user_version records the last migration applied
+# to a database file; init_schema() applies everything newer, each step in
+# its own transaction. Append new steps, never edit shipped ones.
+SCHEMA = [
+    '''
+    CREATE TABLE IF NOT EXISTS Users(
+               id INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL,
+               username VARCHAR(20) NOT NULL UNIQUE,
+               password TEXT NOT NULL,
+               role VARCHAR(20) CHECK (role IN ('admin','customer'))
+               )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS Customers(
+               customer_id INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL,
+               user_id INTEGER NOT NULL,
+               fullname VARCHAR(20) NOT NULL,
+               phone VARCHAR(20),
+               FOREIGN KEY(user_id) REFERENCES Users(id)
+               )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS Category(
+               category_id INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL,
+               category_name TEXT UNIQUE NOT NULL
+               )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS Product(
+               product_id INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL,
+               product_name TEXT UNIQUE NOT NULL,
+               category_id INTEGER,
+               price INTEGER NOT NULL,
+               description TEXT NOT NULL,
+               FOREIGN KEY(category_id) REFERENCES Category(category_id)
+               )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS Feedback(
+               feedback_id INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL,
+               customer_id INTEGER NOT NULL,
+               product_id INTEGER NOT NULL,
+               rating CHECK (rating BETWEEN 1 AND 5),
+               comment TEXT,
+               FOREIGN KEY(customer_id) REFERENCES Customers(customer_id),
+               FOREIGN KEY(product_id) REFERENCES Product(product_id),
+               UNIQUE(customer_id, product_id)
+               )
+    ''',
+]
+
+INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_feedback_product ON Feedback(product_id)",
+    "CREATE INDEX IF NOT EXISTS idx_customers_user ON Customers(user_id)",
+    "CREATE INDEX IF NOT EXISTS idx_product_category ON Product(category_id)",
+    "CREATE INDEX IF NOT EXISTS idx_users_username_role ON Users(username, role)",
+]
+
+# Per-product rating aggregates, kept current by triggers so every write
+# path (menus, API, bulk import, raw SQL) updates them in the same
+# transaction as the Feedback row. Reads are a primary-key lookup.
+RATING_STATS = [
+    '''
+    CREATE TABLE IF NOT EXISTS ProductRatingStats(
+               product_id INTEGER PRIMARY KEY NOT NULL,
+               rating_count INTEGER NOT NULL DEFAULT 0,
+               rating_sum INTEGER NOT NULL DEFAULT 0,
+               r1 INTEGER NOT NULL DEFAULT 0,
+               r2 INTEGER NOT NULL DEFAULT 0,
+               r3 INTEGER NOT NULL DEFAULT 0,
+               r4 INTEGER NOT NULL DEFAULT 0,
+               r5 INTEGER NOT NULL DEFAULT 0,
+               FOREIGN KEY(product_id) REFERENCES Product(product_id)
+               )
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_rating_stats_insert
+    AFTER INSERT ON Feedback
+    BEGIN
+        INSERT INTO ProductRatingStats(product_id, rating_count, rating_sum, r1, r2, r3, r4, r5)
+        VALUES (NEW.product_id, NEW.rating IS NOT NULL, COALESCE(NEW.rating, 0),
+                NEW.rating IS 1, NEW.rating IS 2, NEW.rating IS 3, NEW.rating IS 4, NEW.rating IS 5)
+        ON CONFLICT(product_id) DO UPDATE SET
+            rating_count = rating_count + excluded.rating_count,
+            rating_sum = rating_sum + excluded.rating_sum,
+            r1 = r1 + excluded.r1, r2 = r2 + excluded.r2, r3 = r3 + excluded.r3,
+            r4 = r4 + excluded.r4, r5 = r5 + excluded.r5;
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_rating_stats_delete
+    AFTER DELETE ON Feedback
+    BEGIN
+        UPDATE ProductRatingStats SET
+            rating_count = rating_count - (OLD.rating IS NOT NULL),
+            rating_sum = rating_sum - COALESCE(OLD.rating, 0),
+            r1 = r1 - (OLD.rating IS 1), r2 = r2 - (OLD.rating IS 2), r3 = r3 - (OLD.rating IS 3),
+            r4 = r4 - (OLD.rating IS 4), r5 = r5 - (OLD.rating IS 5)
+        WHERE product_id = OLD.product_id;
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_rating_stats_update
+    AFTER UPDATE OF rating, product_id ON Feedback
+    BEGIN
+        UPDATE ProductRatingStats SET
+            rating_count = rating_count - (OLD.rating IS NOT NULL),
+            rating_sum = rating_sum - COALESCE(OLD.rating, 0),
+            r1 = r1 - (OLD.rating IS 1), r2 = r2 - (OLD.rating IS 2), r3 = r3 - (OLD.rating IS 3),
+            r4 = r4 - (OLD.rating IS 4), r5 = r5 - (OLD.rating IS 5)
+        WHERE product_id = OLD.product_id;
+
+        INSERT INTO ProductRatingStats(product_id, rating_count, rating_sum, r1, r2, r3, r4, r5)
+        VALUES (NEW.product_id, NEW.rating IS NOT NULL, COALESCE(NEW.rating, 0),
+                NEW.rating IS 1, NEW.rating IS 2, NEW.rating IS 3, NEW.rating IS 4, NEW.rating IS 5)
+        ON CONFLICT(product_id) DO UPDATE SET
+            rating_count = rating_count + excluded.rating_count,
+            rating_sum = rating_sum + excluded.rating_sum,
+            r1 = r1 + excluded.r1, r2 = r2 + excluded.r2, r3 = r3 + excluded.r3,
+            r4 = r4 + excluded.r4, r5 = r5 + excluded.r5;
+    END
+    ''',
+    # Backfill from whatever feedback already exists.
+    '''
+    INSERT OR REPLACE INTO ProductRatingStats(product_id, rating_count, rating_sum, r1, r2, r3, r4, r5)
+    SELECT product_id, COUNT(rating), COALESCE(SUM(rating), 0),
+           SUM(rating IS 1), SUM(rating IS 2), SUM(rating IS 3), SUM(rating IS 4), SUM(rating IS 5)
+    FROM Feedback
+    GROUP BY product_id
+    ''',
+]
+
+# Full-text indexes over feedback comments and the product catalog. Both are
+# external-content FTS5 tables, so the text is stored once (in Feedback /
+# Product) and the triggers only maintain the inverted index.
+FULL_TEXT = [
+    '''
+    CREATE VIRTUAL TABLE IF NOT EXISTS FeedbackSearch USING fts5(
+               comment,
+               content='Feedback', content_rowid='feedback_id'
+               )
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_feedback_search_insert
+    AFTER INSERT ON Feedback
+    BEGIN
+        INSERT INTO FeedbackSearch(rowid, comment) VALUES (NEW.feedback_id, NEW.comment);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_feedback_search_delete
+    AFTER DELETE ON Feedback
+    BEGIN
+        INSERT INTO FeedbackSearch(FeedbackSearch, rowid, comment)
+        VALUES ('delete', OLD.feedback_id, OLD.comment);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_feedback_search_update
+    AFTER UPDATE OF comment ON Feedback
+    BEGIN
+        INSERT INTO FeedbackSearch(FeedbackSearch, rowid, comment)
+        VALUES ('delete', OLD.feedback_id, OLD.comment);
+        INSERT INTO FeedbackSearch(rowid, comment) VALUES (NEW.feedback_id, NEW.comment);
+    END
+    ''',
+    '''
+    CREATE VIRTUAL TABLE IF NOT EXISTS ProductSearch USING fts5(
+               product_name, description,
+               content='Product', content_rowid='product_id'
+               )
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_product_search_insert
+    AFTER INSERT ON Product
+    BEGIN
+        INSERT INTO ProductSearch(rowid, product_name, description)
+        VALUES (NEW.product_id, NEW.product_name, NEW.description);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_product_search_delete
+    AFTER DELETE ON Product
+    BEGIN
+        INSERT INTO ProductSearch(ProductSearch, rowid, product_name, description)
+        VALUES ('delete', OLD.product_id, OLD.product_name, OLD.description);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_product_search_update
+    AFTER UPDATE OF product_name, description ON Product
+    BEGIN
+        INSERT INTO ProductSearch(ProductSearch, rowid, product_name, description)
+        VALUES ('delete', OLD.product_id, OLD.product_name, OLD.description);
+        INSERT INTO ProductSearch(rowid, product_name, description)
+        VALUES (NEW.product_id, NEW.product_name, NEW.description);
+    END
+    ''',
+    "INSERT INTO FeedbackSearch(FeedbackSearch) VALUES ('rebuild')",
+    "INSERT INTO ProductSearch(ProductSearch) VALUES ('rebuild')",
+]
+
+# Summary tables written by the comment analytics stage (feedback_analytics).
+# They are rebuilt in full by each run, not kept current by triggers;
+# AnalyticsRun records when that last happened.
+ANALYTICS = [
+    '''
+    CREATE TABLE IF NOT EXISTS ProductSentiment(
+               product_id INTEGER PRIMARY KEY NOT NULL,
+               comments INTEGER NOT NULL,
+               positive INTEGER NOT NULL,
+               neutral INTEGER NOT NULL,
+               negative INTEGER NOT NULL,
+               avg_score REAL NOT NULL,
+               FOREIGN KEY(product_id) REFERENCES Product(product_id)
+               )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS ProductKeywords(
+               product_id INTEGER NOT NULL,
+               ngram TEXT NOT NULL,
+               count INTEGER NOT NULL,
+               PRIMARY KEY(product_id, ngram)
+               ) WITHOUT ROWID
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS CategoryKeywords(
+               category_id INTEGER NOT NULL,
+               ngram TEXT NOT NULL,
+               count INTEGER NOT NULL,
+               PRIMARY KEY(category_id, ngram)
+               ) WITHOUT ROWID
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS AnalyticsRun(
+               run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+               finished_at TEXT NOT NULL,
+               comments INTEGER NOT NULL,
+               seconds REAL NOT NULL
+               )
+    ''',
+]
+
+# Append-only change feed (outbox) for Feedback. Triggers add one row per
+# insert, update and delete in the same transaction as the change, so
+# consumers can follow "changes after seq N" instead of rescanning the
+# table. AUTOINCREMENT keeps seq increasing even after old rows are pruned;
+# deletes carry the old values so consumers know what disappeared.
+CHANGE_FEED = [
+    '''
+    CREATE TABLE IF NOT EXISTS FeedbackChanges(
+               seq INTEGER PRIMARY KEY AUTOINCREMENT,
+               op TEXT NOT NULL CHECK(op IN ('insert', 'update', 'delete')),
+               feedback_id INTEGER NOT NULL,
+               customer_id INTEGER,
+               product_id INTEGER,
+               rating INTEGER,
+               comment TEXT,
+               changed_at TEXT NOT NULL DEFAULT (datetime('now'))
+               )
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_feedback_changes_insert
+    AFTER INSERT ON Feedback
+    BEGIN
+        INSERT INTO FeedbackChanges(op, feedback_id, customer_id, product_id, rating, comment)
+        VALUES ('insert', NEW.feedback_id, NEW.customer_id, NEW.product_id, NEW.rating, NEW.comment);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_feedback_changes_update
+    AFTER UPDATE ON Feedback
+    BEGIN
+        INSERT INTO FeedbackChanges(op, feedback_id, customer_id, product_id, rating, comment)
+        VALUES ('update', NEW.feedback_id, NEW.customer_id, NEW.product_id, NEW.rating, NEW.comment);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_feedback_changes_delete
+    AFTER DELETE ON Feedback
+    BEGIN
+        INSERT INTO FeedbackChanges(op, feedback_id, customer_id, product_id, rating, comment)
+        VALUES ('delete', OLD.feedback_id, OLD.customer_id, OLD.product_id, OLD.rating, OLD.comment);
+    END
+    ''',
+]
+
+# Feedback timestamps and daily rollups. SQLite cannot add a column with a
+# datetime('now') default, so created_at/updated_at are filled by triggers
+# (an insert that supplies created_at, like a historical import, keeps it).
+# Rows that predate this migration are dated the day it runs.
+#
+# FeedbackDailyProduct and FeedbackDailyCategory hold per-day rating counts
+# and distributions keyed by the day the feedback was created. Triggers keep
+# them current like ProductRatingStats, so a report over any date range
+# sums one row per day and product (or category) instead of scanning
+# Feedback. A product moved to another category keeps its earlier feedback
+# under the old category.
+ROLLUP_ADD = '''
+        ON CONFLICT DO UPDATE SET
+            rating_count = rating_count + excluded.rating_count,
+            rating_sum = rating_sum + excluded.rating_sum,
+            r1 = r1 + excluded.r1, r2 = r2 + excluded.r2, r3 = r3 + excluded.r3,
+            r4 = r4 + excluded.r4, r5 = r5 + excluded.r5;
+'''
+
+ROLLUP_SUBTRACT = '''
+            rating_count = rating_count - (OLD.rating IS NOT NULL),
+            rating_sum = rating_sum - COALESCE(OLD.rating, 0),
+            r1 = r1 - (OLD.rating IS 1), r2 = r2 - (OLD.rating IS 2), r3 = r3 - (OLD.rating IS 3),
+            r4 = r4 - (OLD.rating IS 4), r5 = r5 - (OLD.rating IS 5)
+'''
+
+
+ROLLUP_COLUMNS = "rating_count, rating_sum, r1, r2, r3, r4, r5"
+
+
+def _rollup_add(row, day):
+    values = (
+        f"{row}.rating IS NOT NULL, COALESCE({row}.rating, 0), {row}.rating IS 1, "
+        f"{row}.rating IS 2, {row}.rating IS 3, {row}.rating IS 4, {row}.rating IS 5"
+    )
+    return f'''
+        INSERT INTO FeedbackDailyProduct(day, product_id, {ROLLUP_COLUMNS})
+        VALUES ({day}, {row}.product_id, {values})
+        {ROLLUP_ADD}
+        INSERT INTO FeedbackDailyCategory(day, category_id, {ROLLUP_COLUMNS})
+        SELECT {day}, category_id, {values}
+        FROM Product WHERE product_id = {row}.product_id
+        {ROLLUP_ADD}'''
+
+
+def _rollup_subtract():
+    return f'''
+        UPDATE FeedbackDailyProduct SET {ROLLUP_SUBTRACT}
+        WHERE day = date(OLD.created_at) AND product_id = OLD.product_id;
+
+        UPDATE FeedbackDailyCategory SET {ROLLUP_SUBTRACT}
+        WHERE day = date(OLD.created_at)
+          AND category_id = (SELECT category_id FROM Product WHERE product_id = OLD.product_id);'''
+
+
+ROLLUPS = [
+    "ALTER TABLE Feedback ADD COLUMN created_at TEXT",
+    "ALTER TABLE Feedback ADD COLUMN updated_at TEXT",
+    # Timestamp-only updates are not changes worth publishing.
+    "DROP TRIGGER IF EXISTS trg_feedback_changes_update",
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_feedback_changes_update
+    AFTER UPDATE OF customer_id, product_id, rating, comment ON Feedback
+    BEGIN
+        INSERT INTO FeedbackChanges(op, feedback_id, customer_id, product_id, rating, comment)
+        VALUES ('update', NEW.feedback_id, NEW.customer_id, NEW.product_id, NEW.rating, NEW.comment);
+    END
+    ''',
+    "UPDATE Feedback SET created_at = datetime('now'), updated_at = datetime('now')",
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_feedback_created
+    AFTER INSERT ON Feedback
+    WHEN NEW.created_at IS NULL OR NEW.updated_at IS NULL
+    BEGIN
+        UPDATE Feedback SET
+            created_at = COALESCE(NEW.created_at, datetime('now')),
+            updated_at = COALESCE(NEW.updated_at, NEW.created_at, datetime('now'))
+        WHERE feedback_id = NEW.feedback_id;
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_feedback_updated
+    AFTER UPDATE OF customer_id, product_id, rating, comment ON Feedback
+    BEGIN
+        UPDATE Feedback SET updated_at = datetime('now') WHERE feedback_id = NEW.feedback_id;
+    END
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS FeedbackDailyProduct(
+               day TEXT NOT NULL,
+               product_id INTEGER NOT NULL,
+               rating_count INTEGER NOT NULL DEFAULT 0,
+               rating_sum INTEGER NOT NULL DEFAULT 0,
+               r1 INTEGER NOT NULL DEFAULT 0,
+               r2 INTEGER NOT NULL DEFAULT 0,
+               r3 INTEGER NOT NULL DEFAULT 0,
+               r4 INTEGER NOT NULL DEFAULT 0,
+               r5 INTEGER NOT NULL DEFAULT 0,
+               PRIMARY KEY(day, product_id)
+               ) WITHOUT ROWID
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS FeedbackDailyCategory(
+               day TEXT NOT NULL,
+               category_id INTEGER NOT NULL,
+               rating_count INTEGER NOT NULL DEFAULT 0,
+               rating_sum INTEGER NOT NULL DEFAULT 0,
+               r1 INTEGER NOT NULL DEFAULT 0,
+               r2 INTEGER NOT NULL DEFAULT 0,
+               r3 INTEGER NOT NULL DEFAULT 0,
+               r4 INTEGER NOT NULL DEFAULT 0,
+               r5 INTEGER NOT NULL DEFAULT 0,
+               PRIMARY KEY(day, category_id)
+               ) WITHOUT ROWID
+    ''',
+    '''
+    INSERT INTO FeedbackDailyProduct(day, product_id, rating_count, rating_sum, r1, r2, r3, r4, r5)
+    SELECT date(created_at), product_id, COUNT(rating), COALESCE(SUM(rating), 0),
+           SUM(rating IS 1), SUM(rating IS 2), SUM(rating IS 3), SUM(rating IS 4), SUM(rating IS 5)
+    FROM Feedback
+    GROUP BY date(created_at), product_id
+    ''',
+    '''
+    INSERT INTO FeedbackDailyCategory(day, category_id, rating_count, rating_sum, r1, r2, r3, r4, r5)
+    SELECT date(F.created_at), P.category_id, COUNT(F.rating), COALESCE(SUM(F.rating), 0),
+           SUM(F.rating IS 1), SUM(F.rating IS 2), SUM(F.rating IS 3), SUM(F.rating IS 4), SUM(F.rating IS 5)
+    FROM Feedback F
+    JOIN Product P ON P.product_id = F.product_id
+    GROUP BY date(F.created_at), P.category_id
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS trg_daily_rollup_insert
+    AFTER INSERT ON Feedback
+    BEGIN{_rollup_add("NEW", "date(COALESCE(NEW.created_at, 'now'))")}
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS trg_daily_rollup_delete
+    AFTER DELETE ON Feedback
+    BEGIN{_rollup_subtract()}
+    END
+    ''',
+    # created_at going from NULL to a value is the insert trigger above
+    # filling it in; the insert rollup already counted that row.
+    f'''
+    CREATE TRIGGER IF NOT EXISTS trg_daily_rollup_update
+    AFTER UPDATE OF rating, product_id, created_at ON Feedback
+    WHEN OLD.created_at IS NOT NULL
+    BEGIN{_rollup_subtract()}
+        {_rollup_add("NEW", "date(NEW.created_at)")}
+    END
+    ''',
+]
+
+# Product name lookup (findProduct). A NOCASE index answers exact and
+# prefix matches with a range scan; a trigram FTS5 index over the names
+# answers substring matches and ranks near misses by shared trigrams.
+PRODUCT_NAMES = [
+    "CREATE INDEX IF NOT EXISTS idx_product_name_nocase ON Product(product_name COLLATE NOCASE)",
+    '''
+    CREATE VIRTUAL TABLE IF NOT EXISTS ProductNames USING fts5(
+               product_name,
+               content='Product', content_rowid='product_id',
+               tokenize='trigram'
+               )
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_product_names_insert
+    AFTER INSERT ON Product
+    BEGIN
+        INSERT INTO ProductNames(rowid, product_name) VALUES (NEW.product_id, NEW.product_name);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_product_names_delete
+    AFTER DELETE ON Product
+    BEGIN
+        INSERT INTO ProductNames(ProductNames, rowid, product_name)
+        VALUES ('delete', OLD.product_id, OLD.product_name);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_product_names_update
+    AFTER UPDATE OF product_name ON Product
+    BEGIN
+        INSERT INTO ProductNames(ProductNames, rowid, product_name)
+        VALUES ('delete', OLD.product_id, OLD.product_name);
+        INSERT INTO ProductNames(rowid, product_name) VALUES (NEW.product_id, NEW.product_name);
+    END
+    ''',
+    "INSERT INTO ProductNames(ProductNames) VALUES ('rebuild')",
+]
+
+# Comment moderation (feedback_moderation). CommentFingerprints holds the
+# LSH bands of each screened comment's MinHash signature, one indexed
+# column per band, so the comments sharing any band with a new one are
+# FINGERPRINT_BANDS index lookups away. ModerationQueue holds flagged
+# feedback: 'pending' until an admin approves it ('approved'); rejected
+# feedback is deleted. Deleting feedback deletes both rows. Feedback that
+# predates this migration is screened by running feedback_moderation.py.
+FINGERPRINT_BANDS = 8
+
+MODERATION = [
+    f'''
+    CREATE TABLE IF NOT EXISTS CommentFingerprints(
+               feedback_id INTEGER PRIMARY KEY NOT NULL,
+               {", ".join(f"band{i} INTEGER NOT NULL" for i in range(FINGERPRINT_BANDS))},
+               FOREIGN KEY(feedback_id) REFERENCES Feedback(feedback_id)
+               )
+    ''',
+    *(f"CREATE INDEX IF NOT EXISTS idx_fingerprint_band{i} ON CommentFingerprints(band{i})"
+      for i in range(FINGERPRINT_BANDS)),
+    '''
+    CREATE TABLE IF NOT EXISTS ModerationQueue(
+               feedback_id INTEGER PRIMARY KEY NOT NULL,
+               status TEXT NOT NULL DEFAULT 'pending' CHECK(status IN ('pending', 'approved')),
+               reason TEXT NOT NULL,
+               duplicate_of INTEGER,
+               flagged_at TEXT NOT NULL DEFAULT (datetime('now')),
+               decided_at TEXT,
+               FOREIGN KEY(feedback_id) REFERENCES Feedback(feedback_id)
+               )
+    ''',
+    "CREATE INDEX IF NOT EXISTS idx_moderation_pending ON ModerationQueue(feedback_id) WHERE status = 'pending'",
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_moderation_delete
+    AFTER DELETE ON Feedback
+    BEGIN
+        DELETE FROM CommentFingerprints WHERE feedback_id = OLD.feedback_id;
+        DELETE FROM ModerationQueue WHERE feedback_id = OLD.feedback_id;
+    END
+    ''',
+]
+
+MIGRATIONS = [
+    (1, SCHEMA),
+    (2, INDEXES),
+    (3, RATING_STATS),
+    (4, FULL_TEXT),
+    (5, ANALYTICS),
+    (6, CHANGE_FEED),
+    (7, ROLLUPS),
+    (8, PRODUCT_NAMES),
+    (9, MODERATION),
+]
+
+
+class PoolTimeout(sqlite3.OperationalError):
+    pass
+
+
+#CONNECTION POOL
+class ConnectionPool:
+    """Bounded, thread-safe pool of sqlite3 connections to one database file.
+
+    At most ``size`` connections are ever open. Callers borrow one with
+    ``connection()``, which always hands it back (rolled back if the caller
+    left a transaction open) even on an early return or an exception.
+    """
+
+    def __init__(self, path=DB_PATH, size=POOL_SIZE, timeout=POOL_TIMEOUT, readonly=False):
+        self.path = path
+        self.size = size
+        self.timeout = timeout
+        self.readonly = readonly
+        self._idle = queue.LifoQueue(maxsize=size)
+        self._lock = threading.Lock()
+        self._created = 0
+        self._closed = False
+
+    def _connect(self):
+        # A read-only pool serves a replica snapshot, which is replaced
+        # rather than modified, so it is opened immutable: no locks, no WAL.
+        target = f"file:{quote(self.path)}?mode=ro&immutable=1" if self.readonly else self.path
+        conn = sqlite3.connect(
+            target,
+            timeout=self.timeout,
+            check_same_thread=False,
+            cached_statements=STATEMENT_CACHE_SIZE,
+            factory=InstrumentedConnection if INSTRUMENT else sqlite3.Connection,
+            uri=self.readonly,
+        )
+        if not self.readonly:
+            conn.execute(f"PRAGMA journal_mode = {JOURNAL_MODE}")
+        for name, value in PRAGMAS:
+            conn.execute(f"PRAGMA {name} = {value}")
+        return conn
+
+    def acquire(self):
+        if self._closed:
+            raise sqlite3.ProgrammingError("Connection pool is closed")
+
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                try:
+                    return self._connect()
+                except sqlite3.Error:
+                    self._created -= 1
+                    raise
+
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise PoolTimeout(
+                f"No database connection free after {self.timeout}s"
+            ) from None
+
+    def release(self, conn):
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            # A connection that cannot roll back must not be handed out again.
+            self.discard(conn)
+            return
+
+        if self._closed:
+            self.discard(conn)
+            return
+
+        self._idle.put_nowait(conn)
+
+    def discard(self, conn):
+        try:
+            conn.close()
+        finally:
+            with self._lock:
+                self._created -= 1
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close(self):
+        self._closed = True
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self.discard(conn)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool()
+    return _pool
+
+
+def configure(path=DB_PATH, size=POOL_SIZE, timeout=POOL_TIMEOUT):
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+        _pool = ConnectionPool(path, size, timeout)
+    return _pool
+
+
+def current():
+    """The configured pool, or None before configure() or first use."""
+    return _pool
+
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+
+@contextmanager
+def get_conn():
+    with get_pool().connection() as conn:
+        yield conn
+
+
+# Reads that can be a little stale go through get_read_conn(). With replicas
+# configured (feedback_replica.configure) it hands out a connection to a
+# fresh enough snapshot, and falls back to the primary when none is.
+_replicas = None
+
+
+def use_replicas(replicas):
+    global _replicas
+    old, _replicas = _replicas, replicas
+    if old is not None:
+        old.close()
+
+
+@contextmanager
+def get_read_conn():
+    pool = _replicas.pick() if _replicas is not None else None
+    conn = None
+    if pool is not None:
+        try:
+            conn = pool.acquire()
+        except sqlite3.ProgrammingError:
+            # Closed because a newer snapshot replaced it just now.
+            conn = None
+    if conn is None:
+        pool = get_pool()
+        conn = pool.acquire()
+    try:
+        yield conn
+    finally:
+        pool.release(conn)
+
+
+#SCHEMA
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn, target=None):
+    if target is None:
+        target = MIGRATIONS[-1][0]
+
+    if schema_version(conn) >= target:
+        return schema_version(conn)
+
+    for version, statements in MIGRATIONS:
+        if version > target:
+            break
+
+        # BEGIN IMMEDIATE takes the write lock before re-reading the version,
+        # so two processes starting together cannot both apply a step.
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if schema_version(conn) >= version:
+                conn.rollback()
+                continue
+            for stmt in statements:
+                conn.execute(stmt)
+            conn.execute(f"PRAGMA user_version = {version}")
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+    return schema_version(conn)
+
+
+def init_schema():
+    with get_conn() as conn:
+        return migrate(conn)
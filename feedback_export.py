@@ -0,0 +1,384 @@
+import argparse
+import json
+import os
+import struct
+import sys
+import time
+import zipfile
+from array import array
+from collections import defaultdict
+from datetime import datetime, timezone
+from itertools import accumulate
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional: without it parts are written as NumPy .npz files
+    pa = None
+
+import feedback_db
+
+
+# Columnar export of the feedback warehouse for analysts.
+#
+# The Feedback x Product x Category x Customers join is read in one pass, in
+# feedback_id order, and written column by column into part files under
+# OUT/category_id=<id>/ (hive-style partitions; category_id=null for
+# products without a category). Each part holds at most CHUNK_ROWS rows.
+# Rows are buffered per category until a part fills, but never more than
+# --max-buffered rows in all (MAX_BUFFERED; each row takes about 500 bytes
+# plus its comment): past that the category holding the most rows is
+# written out early. So memory is bounded by max_buffered, not by the table
+# size. With many categories that gives parts smaller than CHUNK_ROWS; raise
+# --max-buffered for fewer, larger parts at the cost of memory.
+#
+# With pyarrow installed, parts are Parquet files. Without it they are
+# NumPy .npz archives written with the standard library, one array per
+# column:
+#
+#   feedback_id              int64
+#   product_id, customer_id  int32
+#   product, category,       int32 codes into <name>.dictionary
+#     customer
+#   rating                   int8 (0: no rating)
+#   comment.offsets,         Arrow-style strings: comment i is
+#     comment.data             data[offsets[i]:offsets[i + 1]], UTF-8
+#   created_at, updated_at   datetime64[s] (NaT: unknown)
+#
+#   part = numpy.load("out/category_id=3/part-00001-00000.npz")
+#   names = part["product.dictionary"][part["product"]]
+#
+# OUT/_manifest.json lists the runs and their files. The first run (or
+# --full) exports every row. Later runs export only the rows the change feed
+# (FeedbackChanges) shows were inserted or updated since the last run's seq,
+# plus a _deletes/run-<n> file with the ids deleted since. To reassemble the
+# table, read the runs in order: a row replaces any earlier row with the same
+# feedback_id, and a run's deletes remove earlier rows. A full run replaces
+# the files of the runs before it. If the changes since the last run have
+# been pruned, the run falls back to a full export.
+#
+#   python feedback_export.py --out warehouse/
+#   python feedback_export.py --out warehouse/ --full
+
+CHUNK_ROWS = 1_000_000
+FETCH_ROWS = 10_000
+MAX_BUFFERED = 250_000
+MANIFEST = "_manifest.json"
+NAT = -(1 << 63)
+# Deflate level 1 is much faster than the default 6 and only slightly larger.
+NPZ_COMPRESSLEVEL = 1
+
+SELECT_COLUMNS = """
+    SELECT P.category_id, F.feedback_id, F.product_id, P.product_name, K.category_name,
+           F.customer_id, C.fullname, F.rating, F.comment,
+           CAST(strftime('%s', F.created_at) AS INTEGER),
+           CAST(strftime('%s', F.updated_at) AS INTEGER)
+"""
+
+# CROSS JOIN keeps Feedback (or the changed ids) as the outer loop, so rows
+# come out in feedback_id order from one sequential scan.
+FULL_SQL = SELECT_COLUMNS + """
+    FROM Feedback F
+    CROSS JOIN Product P ON P.product_id = F.product_id
+    LEFT JOIN Category K ON K.category_id = P.category_id
+    LEFT JOIN Customers C ON C.customer_id = F.customer_id
+"""
+
+CHANGED_SQL = SELECT_COLUMNS + """
+    FROM temp.ExportIds E
+    CROSS JOIN Feedback F ON F.feedback_id = E.feedback_id
+    CROSS JOIN Product P ON P.product_id = F.product_id
+    LEFT JOIN Category K ON K.category_id = P.category_id
+    LEFT JOIN Customers C ON C.customer_id = F.customer_id
+"""
+
+DELETED_SQL = """
+    SELECT E.feedback_id
+    FROM temp.ExportIds E
+    WHERE NOT EXISTS (SELECT 1 FROM Feedback F WHERE F.feedback_id = E.feedback_id)
+"""
+
+
+#NPZ
+def _npy(descr, count, data):
+    # .npy format 1.0: magic, header length, a dict literal padded so the
+    # data starts on a 64-byte boundary.
+    header = "{'descr': %r, 'fortran_order': False, 'shape': (%d,), }" % (descr, count)
+    header += " " * (-(10 + len(header) + 1) % 64) + "\n"
+    return b"\x93NUMPY\x01\x00" + struct.pack("<H", len(header)) + header.encode("latin1") + data
+
+
+def _numbers(typecode, descr, values):
+    values = array(typecode, values)
+    if sys.byteorder == "big":
+        values.byteswap()
+    return _npy(descr, len(values), values.tobytes())
+
+
+def _strings(values):
+    width = max(map(len, values), default=0) or 1
+    data = b"".join(v.encode("utf-32-le").ljust(4 * width, b"\0") for v in values)
+    return _npy(f"<U{width}", len(values), data)
+
+
+def _dictionary(values):
+    index = {}
+    codes = [index.setdefault(v or "", len(index)) for v in values]
+    return codes, list(index)
+
+
+def _write_npz(path, arrays):
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED, compresslevel=NPZ_COMPRESSLEVEL) as zf:
+        for name, data in arrays.items():
+            zf.writestr(name + ".npy", data)
+
+
+def _npz_part(path, columns):
+    (ids, product_ids, products, categories, customer_ids, customers,
+     ratings, comments, created, updated) = columns
+    arrays = {
+        "feedback_id": _numbers("q", "<i8", ids),
+        "product_id": _numbers("i", "<i4", product_ids),
+        "customer_id": _numbers("i", "<i4", customer_ids),
+        "rating": _numbers("b", "|i1", [r or 0 for r in ratings]),
+    }
+    for name, values in (("product", products), ("category", categories), ("customer", customers)):
+        codes, dictionary = _dictionary(values)
+        arrays[name] = _numbers("i", "<i4", codes)
+        arrays[name + ".dictionary"] = _strings(dictionary)
+    encoded = [(c or "").encode("utf-8", "surrogatepass") for c in comments]
+    arrays["comment.offsets"] = _numbers("q", "<i8", accumulate(map(len, encoded), initial=0))
+    arrays["comment.data"] = _npy("|u1", sum(map(len, encoded)), b"".join(encoded))
+    for name, values in (("created_at", created), ("updated_at", updated)):
+        arrays[name] = _numbers("q", "<M8[s]", [NAT if t is None else t for t in values])
+    _write_npz(path, arrays)
+
+
+def _npz_deletes(path, ids):
+    _write_npz(path, {"feedback_id": _numbers("q", "<i8", ids)})
+
+
+#PARQUET
+def _parquet_part(path, columns):
+    (ids, product_ids, products, categories, customer_ids, customers,
+     ratings, comments, created, updated) = columns
+    table = pa.table({
+        "feedback_id": pa.array(ids, pa.int64()),
+        "product_id": pa.array(product_ids, pa.int32()),
+        "product": pa.array(products, pa.string()).dictionary_encode(),
+        "category": pa.array(categories, pa.string()).dictionary_encode(),
+        "customer_id": pa.array(customer_ids, pa.int32()),
+        "customer": pa.array(customers, pa.string()).dictionary_encode(),
+        "rating": pa.array(ratings, pa.int8()),
+        "comment": pa.array(comments, pa.string()),
+        "created_at": pa.array(created, pa.timestamp("s")),
+        "updated_at": pa.array(updated, pa.timestamp("s")),
+    })
+    pq.write_table(table, path, compression="zstd")
+
+
+def _parquet_deletes(path, ids):
+    pq.write_table(pa.table({"feedback_id": pa.array(ids, pa.int64())}), path)
+
+
+FORMATS = {
+    "parquet": (".parquet", _parquet_part, _parquet_deletes),
+    "npz": (".npz", _npz_part, _npz_deletes),
+}
+DEFAULT_FORMAT = "parquet" if pa is not None else "npz"
+
+
+#RUN
+def _write_file(out, relpath, func, data):
+    # Written under a temporary name and renamed, so a part file is either
+    # complete or missing.
+    path = os.path.join(out, relpath)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    func(path + ".tmp", data)
+    os.replace(path + ".tmp", path)
+    return relpath
+
+
+class _Partitioner:
+    """Buffers rows per category and writes a part when one fills up."""
+
+    def __init__(self, out, run, fmt, chunk_rows, max_buffered):
+        self.out = out
+        self.run = run
+        self.suffix, self.write, _ = FORMATS[fmt]
+        self.chunk_rows = chunk_rows
+        self.max_buffered = max_buffered
+        self.buffers = defaultdict(list)
+        self.buffered = 0
+        self.parts = defaultdict(int)
+        self.files = []
+        self.rows = 0
+
+    def add(self, batch):
+        buffers = self.buffers
+        for row in batch:
+            buffers[row[0]].append(row[1:])
+        self.buffered += len(batch)
+        for category in [c for c, rows in buffers.items() if len(rows) >= self.chunk_rows]:
+            self.flush(category)
+        while self.buffered > self.max_buffered:
+            self.flush(max(buffers, key=lambda c: len(buffers[c])))
+
+    def flush(self, category):
+        rows = self.buffers.pop(category)
+        self.buffered -= len(rows)
+        self.rows += len(rows)
+        part = self.parts[category]
+        self.parts[category] += 1
+        relpath = os.path.join(f"category_id={'null' if category is None else category}",
+                               f"part-{self.run:05d}-{part:05d}{self.suffix}")
+        self.files.append(_write_file(self.out, relpath, self.write, list(zip(*rows))))
+
+    def finish(self):
+        for category in list(self.buffers):
+            self.flush(category)
+
+
+def load_manifest(out):
+    try:
+        with open(os.path.join(out, MANIFEST), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _save_manifest(out, manifest):
+    path = os.path.join(out, MANIFEST)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+def _full_reason(conn, manifest, fmt, last_seq):
+    if manifest is None:
+        return "no previous export"
+    if manifest["format"] != fmt:
+        return f"previous export is {manifest['format']}"
+    if last_seq > manifest["last_seq"]:
+        first = conn.execute("SELECT MIN(seq) FROM FeedbackChanges WHERE seq > ?",
+                             (manifest["last_seq"],)).fetchone()[0]
+        if first != manifest["last_seq"] + 1:
+            return "changes since the last export were pruned"
+    elif last_seq < manifest["last_seq"]:
+        return "change feed is behind the last export"
+    return None
+
+
+def export(out, full=False, fmt=DEFAULT_FORMAT, chunk_rows=CHUNK_ROWS, log=None,
+           max_buffered=MAX_BUFFERED):
+    """Export the rows changed since the last run (all rows if full); returns the run."""
+    if fmt == "parquet" and pa is None:
+        raise ValueError("Parquet export needs pyarrow (pip install pyarrow)")
+    start = time.perf_counter()
+    os.makedirs(out, exist_ok=True)
+    manifest = load_manifest(out)
+
+    with feedback_db.get_conn() as conn:
+        # One read transaction: the rows and the seq they are exported
+        # up to come from the same snapshot.
+        conn.execute("BEGIN")
+        try:
+            # sqlite_sequence still has the last seq after pruning.
+            last_seq = conn.execute(
+                "SELECT COALESCE(MAX(seq), 0) FROM sqlite_sequence WHERE name = 'FeedbackChanges'"
+            ).fetchone()[0]
+            if not full:
+                reason = _full_reason(conn, manifest, fmt, last_seq)
+                if reason:
+                    full = True
+                    if log:
+                        log(f"Full export: {reason}")
+            runs = [] if manifest is None else manifest["runs"]
+            run = runs[-1]["run"] + 1 if runs else 1
+            partitioner = _Partitioner(out, run, fmt, chunk_rows, max_buffered)
+            deleted = []
+
+            if full:
+                cursor = conn.execute(FULL_SQL)
+            else:
+                conn.execute("CREATE TEMP TABLE IF NOT EXISTS ExportIds(feedback_id INTEGER PRIMARY KEY)")
+                conn.execute("DELETE FROM temp.ExportIds")
+                conn.execute(
+                    "INSERT OR IGNORE INTO temp.ExportIds"
+                    " SELECT feedback_id FROM FeedbackChanges WHERE seq > ? AND seq <= ?",
+                    (manifest["last_seq"], last_seq)
+                )
+                deleted = [fid for fid, in conn.execute(DELETED_SQL)]
+                cursor = conn.execute(CHANGED_SQL)
+
+            read = 0
+            while True:
+                batch = cursor.fetchmany(FETCH_ROWS)
+                if not batch:
+                    break
+                partitioner.add(batch)
+                read += len(batch)
+                if log and read % chunk_rows < len(batch):
+                    log(f"... {read} rows, {time.perf_counter() - start:.1f}s")
+            partitioner.finish()
+        finally:
+            conn.rollback()
+
+    files = partitioner.files
+    if deleted:
+        suffix, _, write_deletes = FORMATS[fmt]
+        files.append(_write_file(out, os.path.join("_deletes", f"run-{run:05d}{suffix}"),
+                                 write_deletes, deleted))
+
+    entry = {
+        "run": run,
+        "kind": "full" if full else "incremental",
+        "seq": last_seq,
+        "rows": partitioner.rows,
+        "deleted": len(deleted),
+        "files": files,
+        "finished_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "seconds": round(time.perf_counter() - start, 2),
+    }
+    if full:
+        old, runs = runs, []
+    runs.append(entry)
+    _save_manifest(out, {"format": fmt, "last_seq": last_seq, "runs": runs})
+    if full:
+        # Only once the manifest points at the new run.
+        for previous in old:
+            for relpath in previous["files"]:
+                try:
+                    os.remove(os.path.join(out, relpath))
+                except FileNotFoundError:
+                    pass
+    return entry
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export feedback to columnar files, partitioned by category")
+    parser.add_argument("--db", default=feedback_db.DB_PATH)
+    parser.add_argument("--out", required=True, help="export directory")
+    parser.add_argument("--full", action="store_true", help="export every row, not just changes")
+    parser.add_argument("--format", choices=sorted(FORMATS), default=DEFAULT_FORMAT)
+    parser.add_argument("--chunk", type=int, default=CHUNK_ROWS, help="rows per part file")
+    parser.add_argument("--max-buffered", type=int, default=MAX_BUFFERED,
+                        help="most rows held in memory across all categories")
+    args = parser.parse_args(argv)
+
+    feedback_db.configure(args.db)
+    feedback_db.init_schema()
+    try:
+        entry = export(args.out, args.full, args.format, args.chunk, log=print,
+                       max_buffered=args.max_buffered)
+    except ValueError as e:
+        parser.error(str(e))
+    finally:
+        feedback_db.close_pool()
+    print(f"Run {entry['run']} ({entry['kind']}): {entry['rows']} rows, "
+          f"{entry['deleted']} deletes, {len(entry['files'])} files "
+          f"in {entry['seconds']:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
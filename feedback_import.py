@@ -0,0 +1,253 @@
+import argparse
+import csv
+import json
+import sys
+import time
+from datetime import datetime, timezone
+from itertools import islice
+
+import feedback_db
+import feedback_moderation as moderation
+import feedback_shards
+from feedback_db import get_conn, init_schema
+
+
+# Bulk feedback import. Records are streamed from CSV or JSONL, resolved to
+# customer/product ids through in-memory maps loaded once up front, and
+# written with executemany in large batches, one transaction per batch.
+# Duplicates are left to UNIQUE(customer_id, product_id) via ON CONFLICT.
+#
+# Each record needs a rating, an optional comment, a customer given as
+# username or customer_id, and a product given as product_name or product_id.
+# An optional created_at (ISO 8601, UTC unless it carries an offset) keeps
+# the original date for historical reviews; otherwise it is the import time.
+#
+# Each batch's new rows are screened for the moderation queue (see
+# feedback_moderation) before the batch commits, found through the change
+# feed. That is most of the cost of a large import; --no-screen skips it,
+# leaving feedback_moderation.py to screen everything afterwards.
+#
+# With shards configured (--shard or $FEEDBACK_SHARDS, see feedback_shards)
+# each batch is split by product and every part is inserted, screened and
+# committed on its own shard, where that shard's UNIQUE(customer_id,
+# product_id) catches the duplicates. Customers and products are still
+# resolved against the main database.
+#
+#   python feedback_import.py reviews.csv
+#   python feedback_import.py reviews.jsonl --batch 20000 --rejects bad.jsonl
+#   python feedback_import.py reviews.csv --db /data/feedback.db
+
+BATCH_SIZE = 10000
+
+INSERT_SQL = """
+    INSERT INTO Feedback(customer_id, product_id, rating, comment, created_at)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT(customer_id, product_id) DO NOTHING
+"""
+
+
+class ImportStats:
+    def __init__(self):
+        self.read = 0
+        self.inserted = 0
+        self.duplicates = 0
+        self.rejected = 0
+        self.flagged = 0
+        self.seconds = 0.0
+
+    def rate(self):
+        return self.read / self.seconds if self.seconds else 0.0
+
+    def summary(self):
+        return (
+            f"{self.read} rows read, {self.inserted} inserted, "
+            f"{self.duplicates} duplicates skipped, {self.rejected} rejected, "
+            f"{self.flagged} flagged for review in {self.seconds:.2f}s ({self.rate():.0f} rows/sec)"
+        )
+
+
+def read_records(path, fmt=None):
+    fmt = fmt or ("jsonl" if path.endswith((".jsonl", ".json")) else "csv")
+    with open(path, newline="", encoding="utf-8") as f:
+        if fmt == "csv":
+            yield from csv.DictReader(f)
+        else:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    yield {"_error": "Invalid JSON", "_line": line}
+                    continue
+                if isinstance(record, dict):
+                    yield record
+                else:
+                    yield {"_error": "Not a JSON object", "_line": line}
+
+
+def load_maps(conn):
+    customers = dict(conn.execute("""
+        SELECT U.username, C.customer_id
+        FROM Customers C
+        JOIN Users U ON C.user_id = U.id
+    """))
+    customer_ids = set(customers.values())
+    products = dict(conn.execute("SELECT product_name, product_id FROM Product"))
+    product_ids = set(products.values())
+    return customers, customer_ids, products, product_ids
+
+
+def _resolve(value, by_name, ids, name_key, id_key):
+    if value.get(id_key) not in (None, ""):
+        try:
+            key = int(value[id_key])
+        except (TypeError, ValueError):
+            return None
+        return key if key in ids else None
+    return by_name.get(value.get(name_key))
+
+
+def resolve(record, maps):
+    customers, customer_ids, products, product_ids = maps
+    if "_error" in record:
+        return None, record["_error"]
+
+    customer_id = _resolve(record, customers, customer_ids, "username", "customer_id")
+    if customer_id is None:
+        return None, "Unknown customer"
+
+    product_id = _resolve(record, products, product_ids, "product_name", "product_id")
+    if product_id is None:
+        return None, "Unknown product"
+
+    try:
+        rating = int(record.get("rating"))
+    except (TypeError, ValueError):
+        return None, "Rating must be a number"
+    if not 1 <= rating <= 5:
+        return None, "Rating must be between 1 and 5"
+
+    created_at = record.get("created_at") or None
+    if created_at is not None:
+        try:
+            created_at = datetime.fromisoformat(str(created_at))
+        except ValueError:
+            return None, "created_at must be an ISO 8601 date or time"
+        if created_at.tzinfo is not None:
+            created_at = created_at.astimezone(timezone.utc)
+        created_at = created_at.strftime("%Y-%m-%d %H:%M:%S")
+
+    return (customer_id, product_id, rating, record.get("comment") or "", created_at), None
+
+
+def _insert(conn, rows, screen):
+    # One batch (or one shard's part of it) in one transaction.
+    seq = moderation.last_change_seq(conn) if screen else None
+    cursor = conn.executemany(INSERT_SQL, rows)
+    flagged = moderation.screen_inserted(conn, seq) if screen else 0
+    conn.commit()
+    return cursor.rowcount, flagged
+
+
+def importFeedback(records, batch_size=BATCH_SIZE, on_reject=None, on_batch=None, screen=True):
+    stats = ImportStats()
+    start = time.perf_counter()
+    records = iter(records)
+    shards = feedback_shards.current()
+
+    with get_conn() as conn:
+        maps = load_maps(conn)
+        while True:
+            chunk = list(islice(records, batch_size))
+            if not chunk:
+                break
+            stats.read += len(chunk)
+
+            rows = []
+            for record in chunk:
+                row, error = resolve(record, maps)
+                if error:
+                    stats.rejected += 1
+                    if on_reject:
+                        on_reject(record, error)
+                else:
+                    rows.append(row)
+
+            if shards is None:
+                inserted, flagged = _insert(conn, rows, screen)
+            else:
+                by_shard = {}
+                for row in rows:
+                    by_shard.setdefault(shards.for_product(row[1]), []).append(row)
+                inserted = flagged = 0
+                for shard, shard_rows in by_shard.items():
+                    with shard.pool.connection() as shard_conn:
+                        shard_inserted, shard_flagged = _insert(shard_conn, shard_rows, screen)
+                    inserted += shard_inserted
+                    flagged += shard_flagged
+            stats.inserted += inserted
+            stats.duplicates += len(rows) - inserted
+            stats.flagged += flagged
+
+            stats.seconds = time.perf_counter() - start
+            if on_batch:
+                on_batch(stats)
+
+    stats.seconds = time.perf_counter() - start
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk import feedback from CSV or JSONL")
+    parser.add_argument("path")
+    parser.add_argument("--db", help=f"database file (default: {feedback_db.DB_PATH})")
+    parser.add_argument("--format", choices=["csv", "jsonl"])
+    parser.add_argument("--batch", type=int, default=BATCH_SIZE)
+    parser.add_argument("--rejects", help="write rejected records here as JSONL")
+    parser.add_argument("--no-screen", action="store_true",
+                        help="do not screen new comments for the moderation queue")
+    parser.add_argument("--shard", action="append",
+                        help="feedback shard file, in order (default: $FEEDBACK_SHARDS)")
+    args = parser.parse_args(argv)
+
+    # The CLI's import command has configured its database and shards already.
+    owns_db = args.db or feedback_db.current() is None
+    if owns_db:
+        feedback_db.configure(args.db or feedback_db.DB_PATH)
+    init_schema()
+    owned = args.shard or (feedback_shards.current() is None and feedback_shards.SHARD_PATHS)
+    if owned:
+        feedback_shards.configure(owned)
+    rejects = open(args.rejects, "w", encoding="utf-8") if args.rejects else None
+    reasons = {}
+
+    def on_reject(record, error):
+        reasons[error] = reasons.get(error, 0) + 1
+        if rejects:
+            rejects.write(json.dumps({"error": error, "record": record}) + "\n")
+
+    def on_batch(stats):
+        print(f"... {stats.read} rows, {stats.rate():.0f} rows/sec", file=sys.stderr)
+
+    try:
+        stats = importFeedback(
+            read_records(args.path, args.format), args.batch, on_reject, on_batch,
+            screen=not args.no_screen,
+        )
+    finally:
+        if rejects:
+            rejects.close()
+        if owned:
+            feedback_shards.configure(None)
+        if owns_db:
+            feedback_db.close_pool()
+
+    print(stats.summary())
+    for error, count in sorted(reasons.items()):
+        print(f"  rejected: {error}: {count}")
+
+
+if __name__ == "__main__":
+    main()
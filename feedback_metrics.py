@@ -0,0 +1,226 @@
+import json
+import logging
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+
+
+# Per-statement query metrics. Pooled connections are created as
+# InstrumentedConnection, whose cursors time every execute plus the fetches
+# that follow it, count rows returned, and report statements that run past
+# SLOW_QUERY_MS to the "feedback.slow_queries" logger together with their
+# EXPLAIN QUERY PLAN.
+#
+# Iterating a cursor reads ITER_BATCH rows per fetchmany(), so a streaming
+# listing or export is timed and counted once per batch rather than once
+# per row. next(cursor) called directly still goes row by row.
+
+SLOW_QUERY_MS = 100
+RECENT_SLOW = 50
+ITER_BATCH = 1000
+
+slow_log = logging.getLogger("feedback.slow_queries")
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize(sql):
+    return _WHITESPACE.sub(" ", sql).strip()
+
+
+class StatementStats:
+    def __init__(self, sql):
+        self.sql = sql
+        self.calls = 0
+        self.rows = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.slow = 0
+
+    def as_dict(self):
+        return {
+            "sql": self.sql,
+            "calls": self.calls,
+            "rows": self.rows,
+            "total_ms": round(self.total * 1000, 3),
+            "avg_ms": round(self.total / self.calls * 1000, 3) if self.calls else 0.0,
+            "max_ms": round(self.max * 1000, 3),
+            "slow": self.slow,
+        }
+
+
+class QueryMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+        self.recent_slow = deque(maxlen=RECENT_SLOW)
+        self.started = time.time()
+
+    def stats_for(self, sql):
+        key = normalize(sql)
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = StatementStats(key)
+            stats.calls += 1
+        return stats
+
+    def add(self, stats, seconds, rows, elapsed):
+        # elapsed is the running total for this one execution, used for max.
+        with self._lock:
+            stats.total += seconds
+            stats.rows += rows
+            if elapsed > stats.max:
+                stats.max = elapsed
+
+    def mark_slow(self, stats, elapsed, plan):
+        entry = {
+            "sql": stats.sql,
+            "ms": round(elapsed * 1000, 3),
+            "plan": plan,
+            "at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+        with self._lock:
+            stats.slow += 1
+            self.recent_slow.append(entry)
+        slow_log.info(
+            "slow query (%.1f ms): %s\n  plan: %s", entry["ms"], stats.sql, " | ".join(plan)
+        )
+
+    def summary(self, order_by="total_ms", limit=None):
+        with self._lock:
+            rows = [s.as_dict() for s in self._stats.values()]
+        rows.sort(key=lambda r: r[order_by], reverse=True)
+        return rows[:limit] if limit else rows
+
+    def snapshot(self):
+        with self._lock:
+            recent = list(self.recent_slow)
+        return {
+            "since": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started)),
+            "slow_query_ms": SLOW_QUERY_MS,
+            "statements": self.summary(),
+            "recent_slow": recent,
+        }
+
+    def dump(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.snapshot(), f, indent=2)
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+            self.recent_slow.clear()
+            self.started = time.time()
+
+
+metrics = QueryMetrics()
+
+
+def configure(slow_query_ms=None, log_path=None):
+    global SLOW_QUERY_MS
+    if slow_query_ms is not None:
+        SLOW_QUERY_MS = slow_query_ms
+    if log_path:
+        handler = logging.FileHandler(log_path, encoding="utf-8")
+        handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+        slow_log.addHandler(handler)
+        slow_log.setLevel(logging.INFO)
+
+
+#INSTRUMENTED CONNECTION
+class InstrumentedCursor(sqlite3.Cursor):
+    _stats = None
+    _params = ()
+    _elapsed = 0.0
+    _reported = False
+
+    def _timed(self, stats, params, call, *args):
+        self._stats = stats
+        self._params = params
+        self._elapsed = 0.0
+        self._reported = False
+        start = time.perf_counter()
+        try:
+            return call(*args)
+        finally:
+            self._account(time.perf_counter() - start, 0)
+
+    def _account(self, seconds, rows):
+        stats = self._stats
+        if stats is None:
+            return
+        self._elapsed += seconds
+        metrics.add(stats, seconds, rows, self._elapsed)
+        if not self._reported and self._elapsed * 1000 >= SLOW_QUERY_MS:
+            self._reported = True
+            metrics.mark_slow(stats, self._elapsed, self._plan(stats.sql))
+
+    def _plan(self, sql):
+        try:
+            cursor = sqlite3.Cursor(self.connection)
+            rows = cursor.execute("EXPLAIN QUERY PLAN " + sql, self._params).fetchall()
+            return [row[-1] for row in rows]
+        except sqlite3.Error as e:
+            return [f"(no plan: {e})"]
+
+    def execute(self, sql, parameters=()):
+        stats = metrics.stats_for(sql)
+        return self._timed(stats, parameters, super().execute, sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        stats = metrics.stats_for(sql)
+        cursor = self._timed(stats, (), super().executemany, sql, seq_of_parameters)
+        if self.rowcount > 0:
+            metrics.add(stats, 0.0, self.rowcount, self._elapsed)
+        return cursor
+
+    def fetchone(self):
+        start = time.perf_counter()
+        row = super().fetchone()
+        self._account(time.perf_counter() - start, row is not None)
+        return row
+
+    def fetchmany(self, size=None):
+        start = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._account(time.perf_counter() - start, len(rows))
+        return rows
+
+    def fetchall(self):
+        start = time.perf_counter()
+        rows = super().fetchall()
+        self._account(time.perf_counter() - start, len(rows))
+        return rows
+
+    def __iter__(self):
+        while True:
+            rows = self.fetchmany(ITER_BATCH)
+            if not rows:
+                return
+            yield from rows
+
+    def __next__(self):
+        start = time.perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self._account(time.perf_counter() - start, 0)
+            raise
+        self._account(time.perf_counter() - start, 1)
+        return row
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    # sqlite3.Connection.execute does not go through cursor(), so both are
+    # overridden to make every statement use an InstrumentedCursor.
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
@@ -0,0 +1,237 @@
+import argparse
+import hashlib
+import re
+import struct
+import time
+
+import feedback_db
+
+
+# Comment moderation: flags near-duplicate and link-spam feedback for review.
+#
+# A comment of at least MIN_WORDS words is cut into overlapping word pairs
+# (shingles) and summarised by a MinHash signature of BANDS x ROWS values,
+# each the smallest of one hash function over the shingles (32-bit slices
+# of salted BLAKE2b digests, one digest per 16 functions). Two comments
+# agree on a value with probability equal to the Jaccard similarity of
+# their shingle sets. Each band of ROWS values is hashed to one integer and
+# stored in CommentFingerprints, which has an index per band (LSH), so the
+# comments sharing a band with a new one are found with BANDS index lookups
+# however many are stored. Comments with similarity s share a band with
+# probability 1 - (1 - s^ROWS)^BANDS: 0.89 at 0.7, 0.98 at 0.8, 0.06 at
+# 0.3. Candidates written by other customers are checked against the exact
+# similarity of their text; SIMILARITY or more is a near-duplicate.
+#
+# screen() runs in the transaction that inserts or edits the feedback
+# (feedback_service, feedback_import), so the row, its fingerprint and its
+# queue entry commit together. Feedback lands in ModerationQueue as
+# 'pending' when its comment has a link or an email address, or is a
+# near-duplicate of another customer's comment; that earlier comment is
+# queued as well, so both copies come up for review. Approved feedback is
+# not flagged again unless its comment is edited. Feedback stored in shards
+# is compared with the comments in the same shard only.
+#
+#   python feedback_moderation.py --db feedback.db
+#
+# re-screens all stored feedback: needed once for feedback written before
+# the moderation tables existed, and after imports run with --no-screen.
+
+BANDS = feedback_db.FINGERPRINT_BANDS
+ROWS = 4
+MIN_WORDS = 8
+SIMILARITY = 0.7
+MAX_CANDIDATES = 100
+RESCREEN_BATCH = 5000
+
+# Fixed, so fingerprints stay comparable across processes and restarts.
+_SALTS = [f"minhash{i}".encode() for i in range(BANDS * ROWS // 16)]
+_UNPACK = struct.Struct("<16I").unpack
+_BAND = struct.Struct(f"<{ROWS}I").pack
+
+WORD = re.compile(r"\w+")
+LINK = re.compile(
+    r"https?://|www\.|[\w.+-]+@[\w-]+\.\w"
+    r"|\b[\w-]+\.(?:com|net|org|info|biz|ru|cn|xyz|top|shop|io|ly)\b",
+    re.IGNORECASE,
+)
+
+REASON_LINK = "link"
+REASON_DUPLICATE = "duplicate"
+
+CANDIDATES_SQL = f"""
+    SELECT F.feedback_id, F.comment
+    FROM CommentFingerprints P
+    JOIN Feedback F ON F.feedback_id = P.feedback_id
+    WHERE ({" OR ".join(f"P.band{i} = ?" for i in range(BANDS))})
+      AND F.customer_id != ? AND P.feedback_id != ?
+    LIMIT {MAX_CANDIDATES}
+"""
+
+FINGERPRINT_SQL = f"""
+    INSERT OR REPLACE INTO CommentFingerprints(feedback_id, {", ".join(f"band{i}" for i in range(BANDS))})
+    VALUES (?{", ?" * BANDS})
+"""
+
+
+def shingles(comment):
+    """Set of word-pair shingles, or None for comments too short to compare."""
+    words = WORD.findall((comment or "").lower())
+    if len(words) < MIN_WORDS:
+        return None
+    return {f"{a} {b}" for a, b in zip(words, words[1:])}
+
+
+def signature(shingle_set):
+    hashes = []
+    for shingle in shingle_set:
+        data = shingle.encode()
+        row = ()
+        for salt in _SALTS:
+            row += _UNPACK(hashlib.blake2b(data, salt=salt).digest())
+        hashes.append(row)
+    return list(map(min, zip(*hashes)))
+
+
+def bands(shingle_set):
+    """The BANDS LSH keys of a shingle set (signed 64-bit, as SQLite stores them)."""
+    values = signature(shingle_set)
+    return [
+        int.from_bytes(hashlib.blake2b(_BAND(*values[i:i + ROWS]), digest_size=8).digest(),
+                       "little", signed=True)
+        for i in range(0, BANDS * ROWS, ROWS)
+    ]
+
+
+def similarity(a, b):
+    return len(a & b) / len(a | b)
+
+
+def _near_duplicate(conn, feedback_id, customer_id, shingle_set, keys):
+    for other_id, other_comment in conn.execute(CANDIDATES_SQL, (*keys, customer_id, feedback_id)):
+        other = shingles(other_comment)
+        if other and similarity(shingle_set, other) >= SIMILARITY:
+            return other_id
+    return None
+
+
+def screen(conn, feedback_id, customer_id, comment, edited=False):
+    """Fingerprint one feedback row and queue it if it looks like spam.
+
+    Runs on the caller's connection and leaves the commit to it. Returns
+    the reason if this call queued it, else None (also when it was already
+    in the queue). edited=True (the comment changed) replaces the old
+    fingerprint, puts approved feedback back up for review if it is flagged
+    again and drops it from the queue if it no longer is.
+    """
+    reasons = []
+    if comment and LINK.search(comment):
+        reasons.append(REASON_LINK)
+
+    duplicate_of = None
+    shingle_set = shingles(comment)
+    if shingle_set:
+        keys = bands(shingle_set)
+        duplicate_of = _near_duplicate(conn, feedback_id, customer_id, shingle_set, keys)
+        if duplicate_of is not None:
+            reasons.append(REASON_DUPLICATE)
+        conn.execute(FINGERPRINT_SQL, (feedback_id, *keys))
+    elif edited:
+        conn.execute("DELETE FROM CommentFingerprints WHERE feedback_id = ?", (feedback_id,))
+
+    if not reasons:
+        if edited:
+            conn.execute("DELETE FROM ModerationQueue WHERE feedback_id = ? AND status = 'pending'",
+                         (feedback_id,))
+        return None
+
+    reason = ", ".join(reasons)
+    if edited:
+        cursor = conn.execute("""
+            INSERT INTO ModerationQueue(feedback_id, reason, duplicate_of) VALUES (?, ?, ?)
+            ON CONFLICT(feedback_id) DO UPDATE SET
+                status = 'pending', reason = excluded.reason, duplicate_of = excluded.duplicate_of,
+                flagged_at = datetime('now'), decided_at = NULL
+        """, (feedback_id, reason, duplicate_of))
+    else:
+        cursor = conn.execute("""
+            INSERT INTO ModerationQueue(feedback_id, reason, duplicate_of) VALUES (?, ?, ?)
+            ON CONFLICT(feedback_id) DO NOTHING
+        """, (feedback_id, reason, duplicate_of))
+    if duplicate_of is not None:
+        conn.execute("""
+            INSERT INTO ModerationQueue(feedback_id, reason, duplicate_of) VALUES (?, ?, ?)
+            ON CONFLICT(feedback_id) DO NOTHING
+        """, (duplicate_of, REASON_DUPLICATE, feedback_id))
+    return reason if cursor.rowcount else None
+
+
+def last_change_seq(conn):
+    # sqlite_sequence still has the last seq after the feed is pruned.
+    return conn.execute(
+        "SELECT COALESCE(MAX(seq), 0) FROM sqlite_sequence WHERE name = 'FeedbackChanges'"
+    ).fetchone()[0]
+
+
+def screen_inserted(conn, after_seq):
+    """Screen the feedback inserted since change seq after_seq (bulk import).
+
+    Call before committing the inserts. Returns how many were queued.
+    """
+    rows = conn.execute("""
+        SELECT feedback_id, customer_id, comment
+        FROM FeedbackChanges
+        WHERE seq > ? AND op = 'insert'
+        ORDER BY seq
+    """, (after_seq,)).fetchall()
+    return sum(screen(conn, fid, cid, comment) is not None for fid, cid, comment in rows)
+
+
+def rescreen(conn, batch=RESCREEN_BATCH, log=None):
+    """Re-fingerprint and re-screen every feedback row, oldest first.
+
+    Commits every `batch` rows so writers are not held up for the whole
+    run; feedback written meanwhile is compared only with the rows
+    re-screened so far. Decisions already made are kept. Returns
+    (rows screened, rows newly queued).
+    """
+    conn.execute("DELETE FROM CommentFingerprints")
+    conn.commit()
+    after_id = screened = queued = 0
+    while True:
+        rows = conn.execute("""
+            SELECT feedback_id, customer_id, comment
+            FROM Feedback
+            WHERE feedback_id > ?
+            ORDER BY feedback_id
+            LIMIT ?
+        """, (after_id, batch)).fetchall()
+        if not rows:
+            break
+        queued += sum(screen(conn, fid, cid, comment) is not None for fid, cid, comment in rows)
+        conn.commit()
+        screened += len(rows)
+        after_id = rows[-1][0]
+        if log:
+            log(f"... {screened} rows screened, {queued} queued")
+    return screened, queued
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Re-screen all feedback for the moderation queue")
+    parser.add_argument("--db", default=feedback_db.DB_PATH)
+    parser.add_argument("--batch", type=int, default=RESCREEN_BATCH, help="rows per transaction")
+    args = parser.parse_args(argv)
+
+    feedback_db.configure(args.db)
+    feedback_db.init_schema()
+    start = time.perf_counter()
+    try:
+        with feedback_db.get_conn() as conn:
+            screened, queued = rescreen(conn, args.batch, log=print)
+    finally:
+        feedback_db.close_pool()
+    print(f"Screened {screened} comments in {time.perf_counter() - start:.1f}s; {queued} queued for review")
+
+
+if __name__ == "__main__":
+    main()
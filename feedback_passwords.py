@@ -0,0 +1,104 @@
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+# Password hashing with hashlib.scrypt and a per-user random salt.
+#
+# Stored format: scrypt$<log2 N>$<r>$<p>$<salt b64>$<hash b64>
+#
+# SCRYPT_LOG_N is the cost knob: each +1 doubles CPU time and memory per
+# login. Hashes made with a different cost are re-hashed at the next
+# successful login, as are legacy plaintext rows, so changing the setting
+# migrates users gradually without a reset.
+
+SCRYPT_LOG_N = 14
+SCRYPT_R = 8
+SCRYPT_P = 1
+SALT_BYTES = 16
+HASH_BYTES = 32
+PREFIX = "scrypt"
+
+# hashlib.scrypt releases the GIL, so a small pool gives real parallelism
+# and keeps hashing off the asyncio loop and the database workers.
+HASH_WORKERS = os.cpu_count() or 2
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _b64(data):
+    return base64.b64encode(data).decode("ascii")
+
+
+def _scrypt(password, salt, log_n, r, p):
+    n = 1 << log_n
+    return hashlib.scrypt(
+        password.encode("utf-8"), salt=salt, n=n, r=r, p=p,
+        maxmem=256 * n * r, dklen=HASH_BYTES,
+    )
+
+
+def hash_password(password, log_n=None):
+    log_n = SCRYPT_LOG_N if log_n is None else log_n
+    salt = secrets.token_bytes(SALT_BYTES)
+    digest = _scrypt(password, salt, log_n, SCRYPT_R, SCRYPT_P)
+    return f"{PREFIX}${log_n}${SCRYPT_R}${SCRYPT_P}${_b64(salt)}${_b64(digest)}"
+
+
+def _parse(stored):
+    parts = stored.split("$")
+    if len(parts) != 6 or parts[0] != PREFIX:
+        return None
+    try:
+        return (
+            int(parts[1]), int(parts[2]), int(parts[3]),
+            base64.b64decode(parts[4]), base64.b64decode(parts[5]),
+        )
+    except ValueError:
+        return None
+
+
+def is_hashed(stored):
+    return _parse(stored) is not None
+
+
+def verify_password(password, stored):
+    """Return (matches, needs_rehash) for a stored hash or legacy plaintext."""
+    parsed = _parse(stored)
+    if parsed is None:
+        ok = hmac.compare_digest(password.encode("utf-8"), stored.encode("utf-8"))
+        return ok, ok
+
+    log_n, r, p, salt, digest = parsed
+    ok = hmac.compare_digest(_scrypt(password, salt, log_n, r, p), digest)
+    return ok, ok and (log_n, r, p) != (SCRYPT_LOG_N, SCRYPT_R, SCRYPT_P)
+
+
+# Verified against when the username does not exist, so a miss costs the
+# same as a wrong password and does not reveal which usernames are taken.
+_dummy_hash = None
+
+
+def dummy_hash():
+    global _dummy_hash
+    if _dummy_hash is None or _parse(_dummy_hash)[0] != SCRYPT_LOG_N:
+        _dummy_hash = hash_password(secrets.token_hex(8))
+    return _dummy_hash
+
+
+def configure(log_n):
+    global SCRYPT_LOG_N
+    SCRYPT_LOG_N = log_n
+
+
+def executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="hash")
+    return _executor
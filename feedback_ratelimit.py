@@ -0,0 +1,235 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import feedback_db
+
+
+# Login throttling: token buckets keyed by username and by client address.
+#
+# Every login attempt takes a token from its username's bucket and, when
+# the caller knows it (the HTTP server), from its client's bucket. A bucket
+# holds up to BURST tokens and regains RATE tokens a second, so a username
+# gets USER_BURST quick tries and then one every 1 / USER_RATE seconds, and
+# one client cannot spray guesses over many usernames either. Attempts
+# without a token are rejected before the Users table is read or a password
+# is hashed. A successful login refills its username's bucket and gives its
+# client's token back, so people who know their password are not slowed
+# down by their own logins.
+#
+# Buckets live in memory: an OrderedDict of key -> (tokens, updated), at
+# most MAX_KEYS of them, the least recently used dropped first. Dropping a
+# key only forgets it, and a forgotten key starts with a full bucket, as
+# does a bucket idle long enough to have refilled. Each attempt is one dict
+# lookup and one insert.
+#
+# Several processes (server workers, the batch CLI) can share their buckets
+# through a small SQLite file ($FEEDBACK_THROTTLE_DB or the server's
+# --login-throttle-db). Full buckets are deleted from it every PRUNE_EVERY
+# attempts, so it stays small.
+#
+# Anyone can spend a username's tokens, so a flood of bad guesses locks
+# that username out until it stops; USER_RATE bounds how long.
+
+USER_BURST = 10
+USER_RATE = 1 / 6
+CLIENT_BURST = 30
+CLIENT_RATE = 1.0
+MAX_KEYS = 100_000
+MAX_KEY_CHARS = 64
+PRUNE_EVERY = 1000
+
+THROTTLE_DB = os.environ.get("FEEDBACK_THROTTLE_DB")
+
+THROTTLE_TABLE = """
+    CREATE TABLE IF NOT EXISTS LoginThrottle(
+               key TEXT PRIMARY KEY,
+               tokens REAL NOT NULL,
+               updated REAL NOT NULL
+               ) WITHOUT ROWID
+"""
+
+
+class _Buckets:
+    def __init__(self, burst, rate):
+        self.burst = burst
+        self.rate = rate
+
+    def _take(self, entry, now):
+        """(tokens left, seconds to wait) for an attempt on a bucket in state entry."""
+        if entry is None:
+            tokens = self.burst
+        else:
+            tokens = min(self.burst, entry[0] + max(0.0, now - entry[1]) * self.rate)
+        if tokens >= 1:
+            return tokens - 1, 0.0
+        return tokens, (1 - tokens) / self.rate
+
+
+class TokenBuckets(_Buckets):
+    def __init__(self, burst, rate, max_keys=MAX_KEYS):
+        super().__init__(burst, rate)
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key):
+        """Take a token; returns 0 if there was one, else seconds until there is."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, wait = self._take(self._buckets.pop(key, None), now)
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return wait
+
+    def give_back(self, key):
+        with self._lock:
+            entry = self._buckets.get(key)
+            if entry is not None:
+                self._buckets[key] = (min(self.burst, entry[0] + 1), entry[1])
+
+    def reset(self, key):
+        with self._lock:
+            self._buckets.pop(key, None)
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class SQLiteBuckets(_Buckets):
+    # Same buckets, stored in the LoginThrottle table under prefix + key.
+    # Times are wall-clock seconds, which every process agrees on.
+
+    def __init__(self, pool, prefix, burst, rate):
+        super().__init__(burst, rate)
+        self.pool = pool
+        self.prefix = prefix
+        self._takes = 0
+
+    def _update(self, key, change):
+        now = time.time()
+        with self.pool.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                entry = conn.execute("SELECT tokens, updated FROM LoginThrottle WHERE key = ?",
+                                     (self.prefix + key,)).fetchone()
+                result = change(conn, entry, now)
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+        return result
+
+    def take(self, key):
+        def change(conn, entry, now):
+            tokens, wait = self._take(entry, now)
+            conn.execute("INSERT OR REPLACE INTO LoginThrottle(key, tokens, updated) VALUES (?, ?, ?)",
+                         (self.prefix + key, tokens, now))
+            self._takes += 1
+            if self._takes % PRUNE_EVERY == 0:
+                conn.execute("DELETE FROM LoginThrottle WHERE key >= ? AND key < ? AND updated < ?",
+                             (self.prefix, self.prefix + "\U0010ffff", now - self.burst / self.rate))
+            return wait
+        return self._update(key, change)
+
+    def give_back(self, key):
+        def change(conn, entry, now):
+            if entry is not None:
+                conn.execute("UPDATE LoginThrottle SET tokens = ? WHERE key = ?",
+                             (min(self.burst, entry[0] + 1), self.prefix + key))
+        self._update(key, change)
+
+    def reset(self, key):
+        with self.pool.connection() as conn:
+            conn.execute("DELETE FROM LoginThrottle WHERE key = ?", (self.prefix + key,))
+            conn.commit()
+
+    def __len__(self):
+        with self.pool.connection() as conn:
+            return conn.execute(
+                "SELECT COUNT(*) FROM LoginThrottle WHERE key >= ? AND key < ?",
+                (self.prefix, self.prefix + "\U0010ffff")
+            ).fetchone()[0]
+
+
+class LoginLimiter:
+    def __init__(self, path=None, user_burst=USER_BURST, user_rate=USER_RATE,
+                 client_burst=CLIENT_BURST, client_rate=CLIENT_RATE):
+        self.path = path
+        self.pool = None
+        if path:
+            self.pool = feedback_db.ConnectionPool(path)
+            with self.pool.connection() as conn:
+                conn.execute(THROTTLE_TABLE)
+                conn.commit()
+            self.users = SQLiteBuckets(self.pool, "user:", user_burst, user_rate)
+            self.clients = SQLiteBuckets(self.pool, "client:", client_burst, client_rate)
+        else:
+            self.users = TokenBuckets(user_burst, user_rate)
+            self.clients = TokenBuckets(client_burst, client_rate)
+        self.allowed = 0
+        self.rejected_user = 0
+        self.rejected_client = 0
+        self._lock = threading.Lock()
+
+    def attempt(self, username, client=None):
+        """Count a login attempt; returns 0 if it may go ahead, else seconds to wait."""
+        if client is not None:
+            wait = self.clients.take(client)
+            if wait:
+                self._count("rejected_client")
+                return wait
+        wait = self.users.take(str(username)[:MAX_KEY_CHARS])
+        self._count("rejected_user" if wait else "allowed")
+        return wait
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def succeeded(self, username, client=None):
+        self.users.reset(str(username)[:MAX_KEY_CHARS])
+        if client is not None:
+            self.clients.give_back(client)
+
+    def stats(self):
+        return {
+            "store": self.path or "memory",
+            "allowed": self.allowed,
+            "rejected_user": self.rejected_user,
+            "rejected_client": self.rejected_client,
+            "users": len(self.users),
+            "clients": len(self.clients),
+        }
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def configure(path=THROTTLE_DB, **limits):
+    """Use a new limiter (shared through this SQLite file when path is set)."""
+    global _limiter
+    limiter = LoginLimiter(path, **limits)
+    with _limiter_lock:
+        old, _limiter = _limiter, limiter
+    if old is not None:
+        old.close()
+    return limiter
+
+
+def current():
+    global _limiter
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                # Created on first use, so $FEEDBACK_THROTTLE_DB is only
+                # opened by processes that handle logins.
+                _limiter = LoginLimiter(THROTTLE_DB)
+    return _limiter
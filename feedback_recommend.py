@@ -0,0 +1,400 @@
+import argparse
+import threading
+import time
+
+import numpy as np
+
+import feedback_db
+
+
+# "Customers who rated X also liked": item-item similarity over the ratings
+# in Feedback.
+#
+# Feedback holds at most one rating per (customer, product), so the ratings
+# form a sparse product x customer matrix. RatingMatrix keeps it in CSR form:
+# int32 customer ids and int8 ratings, one row per product. Ratings are
+# centred on NEUTRAL (3) before scoring, so a 1 counts against a product and
+# a 3 not at all, and two products score the cosine of their centred rating
+# vectors. Only products with at least MIN_COMMON co-raters and a positive
+# score count as similar; each product keeps its TOP_K best.
+#
+# Scores are computed for a block of products at a time: every non-neutral
+# rating in the block is paired with the same customer's other ratings, and
+# the pair products are summed per (product, other product), with bincount
+# while block x products fits in BLOCK_CELLS and by sorting otherwise. The
+# work follows the co-ratings, not products squared, and a block expands
+# at most MAX_PAIRS pairs.
+#
+# refresh() follows the change feed (FeedbackChanges) instead of reloading
+# Feedback. The changed ratings are merged into the matrix and only the
+# products they touch are rescored. Those products' scores are then merged
+# into every other product's list. A list can miss a product that would
+# have moved up when a neighbour dropped out, so after changes to
+# REBUILD_FRACTION of the ratings (or a pruned change feed) it rebuilds
+# everything from Feedback.
+#
+#   python feedback_recommend.py --db feedback.db --product 42
+
+NEUTRAL = 3
+TOP_K = 20
+MIN_COMMON = 2
+BLOCK_CELLS = 1 << 22
+MAX_PAIRS = 1 << 22
+REBUILD_FRACTION = 0.1
+REFRESH_INTERVAL = 5.0
+FETCH_ROWS = 100_000
+
+RATINGS_SQL = "SELECT product_id, customer_id, rating FROM Feedback WHERE rating IS NOT NULL"
+
+# A delete, or an update to no rating, takes the rating out (0).
+CHANGES_SQL = """
+    SELECT product_id, customer_id, CASE op WHEN 'delete' THEN 0 ELSE COALESCE(rating, 0) END
+    FROM FeedbackChanges
+    WHERE seq > ? AND seq <= ?
+    ORDER BY seq
+"""
+
+
+def _fetch(cursor):
+    """(product ids, customer ids, ratings) arrays from (product, customer, rating) rows."""
+    parts = []
+    while True:
+        rows = cursor.fetchmany(FETCH_ROWS)
+        if not rows:
+            break
+        parts.append(np.array(rows, dtype=np.int64))
+    data = np.concatenate(parts) if parts else np.empty((0, 3), dtype=np.int64)
+    return data[:, 0].astype(np.int32), data[:, 1].astype(np.int32), data[:, 2].astype(np.int8)
+
+
+def _last_seq(conn):
+    # sqlite_sequence still has the last seq after the feed is pruned.
+    return conn.execute(
+        "SELECT COALESCE(MAX(seq), 0) FROM sqlite_sequence WHERE name = 'FeedbackChanges'"
+    ).fetchone()[0]
+
+
+def _ranges(starts, counts):
+    """np.arange(s, s + c) for every start s and count c, concatenated."""
+    ends = np.cumsum(counts)
+    return np.arange(ends[-1] if len(ends) else 0) - np.repeat(ends - counts - starts, counts)
+
+
+class RatingMatrix:
+    """Ratings in CSR form, one row per product.
+
+    Row i is product products[i]: customers[indptr[i]:indptr[i + 1]] rated
+    it ratings[indptr[i]:indptr[i + 1]], in customer order.
+    """
+
+    def __init__(self, products, indptr, customers, ratings):
+        self.products = products
+        self.indptr = indptr
+        self.customers = customers
+        self.ratings = ratings
+
+    @classmethod
+    def from_entries(cls, product_ids, customer_ids, ratings, products=None):
+        """Build from one entry per (product, customer); rows for `products` (default: those rated)."""
+        if products is None:
+            products = np.unique(product_ids)
+        rows = np.searchsorted(products, product_ids)
+        order = np.lexsort((customer_ids, rows))
+        indptr = np.zeros(len(products) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=len(products)), out=indptr[1:])
+        return cls(products.astype(np.int32), indptr, customer_ids[order], ratings[order])
+
+    @property
+    def nnz(self):
+        return len(self.ratings)
+
+    @property
+    def nbytes(self):
+        return self.products.nbytes + self.indptr.nbytes + self.customers.nbytes + self.ratings.nbytes
+
+    def entries(self):
+        return np.repeat(self.products, np.diff(self.indptr)), self.customers, self.ratings
+
+    def merged(self, product_ids, customer_ids, ratings):
+        """A new matrix with these ratings set, in order; a rating of 0 removes the entry."""
+        old = self.entries()
+        p = np.concatenate([old[0], product_ids])
+        c = np.concatenate([old[1], customer_ids])
+        r = np.concatenate([old[2], ratings])
+        # Sort by (product, customer, position) and keep the last of each pair.
+        order = np.lexsort((np.arange(len(p)), c, p))
+        p, c, r = p[order], c[order], r[order]
+        last = np.ones(len(p), dtype=bool)
+        last[:-1] = (p[1:] != p[:-1]) | (c[1:] != c[:-1])
+        keep = last & (r != 0)
+        products = np.union1d(self.products, product_ids)
+        return RatingMatrix.from_entries(p[keep], c[keep], r[keep], products)
+
+
+#SIMILARITY
+class _Pairs:
+    """The centred, non-neutral ratings indexed both by product row and by customer."""
+
+    def __init__(self, matrix):
+        n = len(matrix.products)
+        rows = np.repeat(np.arange(n, dtype=np.int32), np.diff(matrix.indptr))
+        values = matrix.ratings.astype(np.float32) - NEUTRAL
+        rated = values != 0
+        self.n = n
+        self.rows = rows[rated]
+        self.values = values[rated]
+        customers = matrix.customers[rated]
+        self.row_ptr = np.searchsorted(self.rows, np.arange(n + 1))
+
+        order = np.argsort(customers, kind="stable")
+        self.customer_rows = self.rows[order]
+        self.customer_values = self.values[order]
+        unique, self.start, self.count = np.unique(
+            customers[order], return_index=True, return_counts=True)
+        self.entry_customer = np.searchsorted(unique, customers)
+
+        self.norms = np.sqrt(np.bincount(self.rows, weights=self.values ** 2, minlength=n))
+        # Pairs each row expands to in scores().
+        self.work = np.bincount(self.rows, weights=self.count[self.entry_customer], minlength=n)
+
+    def blocks(self, rows):
+        # Dense blocks (see scores()) when a useful number of rows fits in
+        # BLOCK_CELLS; otherwise only the pair count limits a block.
+        dense_rows = BLOCK_CELLS // max(self.n, 1)
+        max_rows = dense_rows if dense_rows >= 64 else len(rows)
+        start = 0
+        while start < len(rows):
+            work = np.cumsum(self.work[rows[start:start + max_rows]])
+            size = max(1, int(np.searchsorted(work, MAX_PAIRS, side="right")))
+            yield rows[start:start + size]
+            start += size
+
+    def scores(self, block):
+        """(block position, row, cosine) for every row similar to a row in block."""
+        b, n = len(block), self.n
+        counts = self.row_ptr[block + 1] - self.row_ptr[block]
+        entries = _ranges(self.row_ptr[block], counts)
+        customer = self.entry_customer[entries]
+        pair_counts = self.count[customer]
+        pairs = _ranges(self.start[customer], pair_counts)
+
+        key = np.repeat(np.repeat(np.arange(b, dtype=np.int64), counts) * n, pair_counts)
+        key += self.customer_rows[pairs]
+        products = np.repeat(self.values[entries], pair_counts) * self.customer_values[pairs]
+
+        # Sum per (block row, other row): bincount over the whole block when
+        # it is small, else sort the keys.
+        if b * n <= BLOCK_CELLS:
+            common = np.bincount(key, minlength=b * n)
+            cells = np.flatnonzero(common >= MIN_COMMON)
+            dots = np.bincount(key, weights=products, minlength=b * n)[cells]
+        else:
+            order = np.argsort(key)
+            cells, first, common = np.unique(key[order], return_index=True, return_counts=True)
+            dots = np.add.reduceat(products[order], first) if len(first) else products[:0]
+            enough = common >= MIN_COMMON
+            cells, dots = cells[enough], dots[enough]
+
+        position, rows = np.divmod(cells, n)
+        sim = dots / (self.norms[block][position] * self.norms[rows])
+        keep = (sim > 0) & (rows != block[position])
+        return position[keep], rows[keep], sim[keep]
+
+
+def _best(rows, ids, scores, n_rows):
+    """The TOP_K highest-scoring ids per row (-1 past the last) and their scores."""
+    order = np.lexsort((-scores, rows))
+    rows, ids, scores = rows[order], ids[order], scores[order]
+    rank = np.arange(len(rows)) - np.searchsorted(rows, rows)
+    keep = rank < TOP_K
+    top_ids = np.full((n_rows, TOP_K), -1, dtype=np.int32)
+    top_scores = np.zeros((n_rows, TOP_K), dtype=np.float32)
+    top_ids[rows[keep], rank[keep]] = ids[keep]
+    top_scores[rows[keep], rank[keep]] = scores[keep]
+    return top_ids, top_scores
+
+
+def similarities(matrix):
+    """TOP_K similar product ids and scores for every row of the matrix."""
+    pairs = _Pairs(matrix)
+    n = len(matrix.products)
+    neighbors = np.full((n, TOP_K), -1, dtype=np.int32)
+    scores = np.zeros((n, TOP_K), dtype=np.float32)
+    for block in pairs.blocks(np.arange(n)):
+        position, rows, sim = pairs.scores(block)
+        neighbors[block], scores[block] = _best(position, matrix.products[rows], sim, len(block))
+    return neighbors, scores
+
+
+def patch_similarities(matrix, old_products, old_neighbors, old_scores, changed):
+    """Lists for `matrix` from the previous ones, rescoring only the `changed` products."""
+    n = len(matrix.products)
+    neighbors = np.full((n, TOP_K), -1, dtype=np.int32)
+    scores = np.zeros((n, TOP_K), dtype=np.float32)
+    at = np.searchsorted(matrix.products, old_products)
+    neighbors[at] = old_neighbors
+    scores[at] = old_scores
+    neighbors[np.isin(neighbors, changed)] = -1
+
+    rows = np.searchsorted(matrix.products, changed)
+    is_changed = np.zeros(n, dtype=bool)
+    is_changed[rows] = True
+    pairs = _Pairs(matrix)
+    for block in pairs.blocks(rows):
+        position, other, sim = pairs.scores(block)
+        neighbors[block], scores[block] = _best(position, matrix.products[other], sim, len(block))
+
+        # Similarity is symmetric: the block's products are candidates for
+        # the lists of the unchanged products they scored against.
+        merge = ~is_changed[other]
+        position, other, sim = position[merge], other[merge], sim[merge]
+        touched = np.unique(other)
+        if not len(touched):
+            continue
+        kept = neighbors[touched] >= 0
+        local = np.searchsorted(touched, other)
+        old_rows = np.nonzero(kept)[0]
+        top_ids, top_scores = _best(
+            np.concatenate([old_rows, local]),
+            np.concatenate([neighbors[touched][kept], matrix.products[block][position]]),
+            np.concatenate([scores[touched][kept], sim]),
+            len(touched),
+        )
+        neighbors[touched], scores[touched] = top_ids, top_scores
+    return neighbors, scores
+
+
+#RECOMMENDER
+class Recommender:
+    def __init__(self):
+        # (matrix, neighbors, scores), replaced as a whole so readers never
+        # see a half-refreshed state.
+        self._state = None
+        self.seq = 0
+        self.changed = 0
+        self.checked = 0.0
+        self.build_seconds = None
+        self.refresh_seconds = None
+
+    def build(self, conn):
+        start = time.perf_counter()
+        conn.execute("BEGIN")
+        try:
+            seq = _last_seq(conn)
+            matrix = RatingMatrix.from_entries(*_fetch(conn.execute(RATINGS_SQL)))
+        finally:
+            conn.rollback()
+        self._state = (matrix, *similarities(matrix))
+        self.seq = seq
+        self.changed = 0
+        self.checked = time.monotonic()
+        self.build_seconds = time.perf_counter() - start
+
+    def refresh(self, conn):
+        """Apply the change feed since the last build or refresh; returns changes applied."""
+        self.checked = time.monotonic()
+        last = _last_seq(conn)
+        if last == self.seq:
+            return 0
+        start = time.perf_counter()
+        first, count = conn.execute(
+            "SELECT MIN(seq), COUNT(*) FROM FeedbackChanges WHERE seq > ? AND seq <= ?",
+            (self.seq, last)
+        ).fetchone()
+        matrix, neighbors, scores = self._state
+        if (last < self.seq or first != self.seq + 1
+                or self.changed + count > REBUILD_FRACTION * max(matrix.nnz, 1)):
+            self.build(conn)
+            return count
+
+        product_ids, customer_ids, ratings = _fetch(conn.execute(CHANGES_SQL, (self.seq, last)))
+        updated = matrix.merged(product_ids, customer_ids, ratings)
+        changed = np.unique(product_ids)
+        self._state = (updated, *patch_similarities(updated, matrix.products, neighbors, scores, changed))
+        self.seq = last
+        self.changed += count
+        self.refresh_seconds = time.perf_counter() - start
+        return count
+
+    def also_liked(self, product_id, limit=TOP_K):
+        """[(product_id, score)] most similar first."""
+        matrix, neighbors, scores = self._state
+        row = np.searchsorted(matrix.products, product_id)
+        if row == len(matrix.products) or matrix.products[row] != product_id:
+            return []
+        found = neighbors[row] >= 0
+        return list(zip(neighbors[row][found][:limit].tolist(),
+                        scores[row][found][:limit].tolist()))
+
+    def stats(self):
+        matrix, neighbors, scores = self._state
+        return {
+            "products": len(matrix.products),
+            "ratings": matrix.nnz,
+            "matrix_bytes": matrix.nbytes,
+            "neighbor_bytes": neighbors.nbytes + scores.nbytes,
+            "seq": self.seq,
+            "changes_since_build": self.changed,
+            "build_seconds": round(self.build_seconds, 2) if self.build_seconds else None,
+            "refresh_seconds": round(self.refresh_seconds, 3) if self.refresh_seconds else None,
+        }
+
+
+_recommender = None
+_lock = threading.Lock()
+
+
+def current(conn):
+    """The shared recommender: built on first use, then refreshed from the
+    change feed at most every REFRESH_INTERVAL seconds."""
+    global _recommender
+    recommender = _recommender
+    if recommender is not None and time.monotonic() - recommender.checked < REFRESH_INTERVAL:
+        return recommender
+    # While one thread refreshes, the others keep using the current lists.
+    if not _lock.acquire(blocking=recommender is None):
+        return recommender
+    try:
+        if _recommender is None:
+            recommender = Recommender()
+            recommender.build(conn)
+            _recommender = recommender
+        elif time.monotonic() - _recommender.checked >= REFRESH_INTERVAL:
+            _recommender.refresh(conn)
+        return _recommender
+    finally:
+        _lock.release()
+
+
+def reset():
+    """Forget the shared recommender (the database changed underneath it)."""
+    global _recommender
+    with _lock:
+        _recommender = None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build product similarities and show them for a product")
+    parser.add_argument("--db", default=feedback_db.DB_PATH)
+    parser.add_argument("--product", type=int, action="append", default=[], help="product id to show")
+    parser.add_argument("--limit", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    feedback_db.configure(args.db)
+    feedback_db.init_schema()
+    try:
+        recommender = Recommender()
+        with feedback_db.get_conn() as conn:
+            recommender.build(conn)
+        for key, value in recommender.stats().items():
+            print(f"{key}: {value}")
+        for product_id in args.product:
+            print(f"\nCustomers who rated {product_id} also liked:")
+            for other, score in recommender.also_liked(product_id, args.limit):
+                print(f"  {other}  {score:.3f}")
+    finally:
+        feedback_db.close_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+import csv
+import json
+import sys
+from itertools import chain, islice
+
+
+# Streaming output for large listings. tabulate needs every row up front to
+# size its columns; these writers take rows as they arrive and keep nothing
+# but the current row, so an export runs at I/O speed in constant memory.
+#
+#   out = writer("csv", headers, sys.stdout)
+#   out.write_rows(rows)      # any iterable, called once per page or chunk
+#   out.close()
+#
+# The grid matches tabulate's "grid" look but fixes its column widths from
+# the first batch it sees (capped at MAX_WIDTH); longer values further down
+# are cut short with "..." rather than widening the table.
+
+FORMATS = ("grid", "csv", "tsv", "jsonl")
+MAX_WIDTH = 60
+GRID_SAMPLE = 500
+
+
+class CSVWriter:
+    dialect = "excel"
+
+    def __init__(self, headers, out):
+        self._writer = csv.writer(out, dialect=self.dialect)
+        self._writer.writerow(headers)
+
+    def write_rows(self, rows):
+        self._writer.writerows(rows)
+
+    def close(self):
+        pass
+
+
+class TSVWriter(CSVWriter):
+    dialect = "excel-tab"
+
+
+class JSONLWriter:
+    def __init__(self, headers, out):
+        self.headers = headers
+        self.out = out
+
+    def write_rows(self, rows):
+        headers = self.headers
+        self.out.writelines(
+            json.dumps(dict(zip(headers, row)), ensure_ascii=False) + "\n" for row in rows
+        )
+
+    def close(self):
+        pass
+
+
+def _text(value):
+    if value is None:
+        return ""
+    return str(value).replace("\r", " ").replace("\n", " ")
+
+
+class GridWriter:
+    def __init__(self, headers, out, max_width=MAX_WIDTH):
+        self.headers = [_text(h) for h in headers]
+        self.out = out
+        self.max_width = max_width
+        self.widths = None
+        self.numeric = None
+
+    def _layout(self, sample):
+        widths = [len(h) for h in self.headers]
+        numeric = [bool(sample)] * len(widths)
+        for row in sample:
+            for i, value in enumerate(row):
+                widths[i] = max(widths[i], len(_text(value)))
+                if value is not None and not isinstance(value, (int, float)):
+                    numeric[i] = False
+        self.widths = [min(w, self.max_width) for w in widths]
+        self.numeric = numeric
+        self.rule = "+" + "+".join("-" * (w + 2) for w in self.widths) + "+\n"
+        self.header_rule = self.rule.replace("-", "=")
+
+    def _line(self, values, numeric):
+        cells = []
+        for value, width, right in zip(values, self.widths, numeric):
+            text = _text(value)
+            if len(text) > width:
+                text = text[:max(width - 3, 0)] + "..."[:width]
+            cells.append(text.rjust(width) if right else text.ljust(width))
+        return "| " + " | ".join(cells) + " |\n"
+
+    def write_rows(self, rows):
+        if self.widths is None:
+            rows = iter(rows)
+            sample = list(islice(rows, GRID_SAMPLE))
+            self._layout(sample)
+            self.out.write(self.rule)
+            self.out.write(self._line(self.headers, [False] * len(self.headers)))
+            self.out.write(self.header_rule if sample else self.rule)
+            rows = chain(sample, rows)
+        rule, numeric = self.rule, self.numeric
+        self.out.writelines(self._line(row, numeric) + rule for row in rows)
+
+    def close(self):
+        if self.widths is None:
+            self.write_rows([])
+
+
+WRITERS = {
+    "grid": GridWriter,
+    "csv": CSVWriter,
+    "tsv": TSVWriter,
+    "jsonl": JSONLWriter,
+}
+
+
+def writer(fmt, headers, out=None):
+    if fmt not in WRITERS:
+        raise ValueError(f"Unknown format {fmt!r}; choose from {', '.join(FORMATS)}")
+    return WRITERS[fmt](headers, out or sys.stdout)
+
+
+def render(rows, headers, fmt="grid", out=None):
+    out_writer = writer(fmt, headers, out)
+    out_writer.write_rows(rows)
+    out_writer.close()
@@ -0,0 +1,226 @@
+import argparse
+import itertools
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from urllib.parse import quote
+
+import feedback_db
+
+
+# Read replicas: consistent point-in-time copies of the primary database
+# that read-only views can use instead of the primary.
+#
+# A snapshotter (this module's main(), or a thread in the server) copies the
+# primary with the sqlite3 backup API every SNAPSHOT_INTERVAL seconds. The
+# copy is written to a temporary file and renamed over the replica, so a
+# replica file is never modified in place: readers open it immutable and
+# keep whatever snapshot they opened until they reopen. The replica's
+# mtime is set to the moment the snapshot was taken.
+#
+# Readers (configure()) stat their replica files at most every
+# CHECK_INTERVAL seconds, reopen a replica when a newer snapshot has been
+# renamed into place, and skip any replica older than max_staleness, so a
+# stalled snapshotter sends reads back to the primary instead of serving
+# old data. Reads are spread round-robin over the fresh replicas.
+#
+#   python feedback_replica.py --db feedback.db --replica /srv/replicas/feedback.db --interval 30
+#   python feedback_server.py --replica /srv/replicas/feedback.db --max-staleness 60
+
+SNAPSHOT_INTERVAL = 30
+MAX_STALENESS = 120
+CHECK_INTERVAL = 1.0
+REPLICA_POOL_SIZE = feedback_db.POOL_SIZE
+
+
+def snapshot(primary_path, replica_paths):
+    """Copy the primary to every replica path; returns the snapshot time."""
+    taken_at = time.time()
+    first = replica_paths[0]
+    tmp = first + ".tmp"
+    if os.path.exists(tmp):
+        os.remove(tmp)
+
+    source = sqlite3.connect(f"file:{quote(primary_path)}?mode=ro", uri=True)
+    target = sqlite3.connect(tmp)
+    try:
+        # One step (pages=-1) copies the whole file inside a single read
+        # transaction, so the copy is consistent; in WAL mode it does not
+        # block writers on the primary.
+        source.backup(target)
+        target.execute("PRAGMA journal_mode = DELETE")
+    finally:
+        target.close()
+        source.close()
+    os.utime(tmp, (taken_at, taken_at))
+
+    # Further replicas are plain file copies of the finished snapshot.
+    for path in replica_paths[1:]:
+        other = path + ".tmp"
+        shutil.copyfile(tmp, other)
+        os.utime(other, (taken_at, taken_at))
+        os.replace(other, path)
+    os.replace(tmp, first)
+    return taken_at
+
+
+class Snapshotter:
+    def __init__(self, primary_path, replica_paths, interval=SNAPSHOT_INTERVAL, log=None):
+        self.primary_path = primary_path
+        self.replica_paths = list(replica_paths)
+        self.interval = interval
+        self.log = log
+        self.last_snapshot = None
+        self.last_error = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def run_once(self):
+        start = time.perf_counter()
+        self.last_snapshot = snapshot(self.primary_path, self.replica_paths)
+        if self.log:
+            self.log(f"snapshot of {self.primary_path} to {len(self.replica_paths)} "
+                     f"replica(s) in {time.perf_counter() - start:.2f}s")
+
+    def run(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+                self.last_error = None
+            except (sqlite3.Error, OSError) as e:
+                # Readers notice through staleness; keep trying.
+                self.last_error = str(e)
+                if self.log:
+                    self.log(f"snapshot failed: {e}")
+            self._stop.wait(self.interval)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, name="snapshotter", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+#READERS
+class Replica:
+    def __init__(self, path, size):
+        self.path = path
+        self.size = size
+        self.pool = None
+        self.identity = None
+        self.taken_at = None
+        self.checked = 0.0
+
+    def refresh(self, now):
+        # Runs under ReplicaSet's lock.
+        self.checked = now
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            self._swap(None, None, None)
+            return
+        identity = (st.st_ino, st.st_mtime_ns)
+        if identity != self.identity:
+            pool = feedback_db.ConnectionPool(self.path, self.size, readonly=True)
+            self._swap(pool, identity, st.st_mtime)
+
+    def _swap(self, pool, identity, taken_at):
+        old = self.pool
+        self.pool, self.identity, self.taken_at = pool, identity, taken_at
+        if old is not None:
+            # Connections in use finish on the old snapshot and are closed
+            # when they are released.
+            old.close()
+
+    def close(self):
+        self._swap(None, None, None)
+
+
+class ReplicaSet:
+    def __init__(self, paths, max_staleness=MAX_STALENESS, size=REPLICA_POOL_SIZE):
+        self.max_staleness = max_staleness
+        self.replicas = [Replica(path, size) for path in paths]
+        self._next = itertools.cycle(range(len(self.replicas)))
+        self._lock = threading.Lock()
+        self.replica_reads = 0
+        self.primary_reads = 0
+
+    def pick(self):
+        """A pool for a fresh replica, or None to read from the primary."""
+        now = time.time()
+        with self._lock:
+            for _ in range(len(self.replicas)):
+                replica = self.replicas[next(self._next)]
+                if now - replica.checked >= CHECK_INTERVAL:
+                    replica.refresh(now)
+                if replica.pool is not None and now - replica.taken_at <= self.max_staleness:
+                    self.replica_reads += 1
+                    return replica.pool
+            self.primary_reads += 1
+            return None
+
+    def stats(self):
+        now = time.time()
+        with self._lock:
+            return {
+                "max_staleness": self.max_staleness,
+                "replica_reads": self.replica_reads,
+                "primary_reads": self.primary_reads,
+                "replicas": [
+                    {
+                        "path": r.path,
+                        "age_seconds": round(now - r.taken_at, 1) if r.taken_at else None,
+                    }
+                    for r in self.replicas
+                ],
+            }
+
+    def close(self):
+        with self._lock:
+            for replica in self.replicas:
+                replica.close()
+
+
+_replicas = None
+
+
+def configure(paths, max_staleness=MAX_STALENESS, size=REPLICA_POOL_SIZE):
+    """Route get_read_conn() reads to these replica files (None: primary only)."""
+    global _replicas
+    _replicas = ReplicaSet(paths, max_staleness, size) if paths else None
+    feedback_db.use_replicas(_replicas)
+    return _replicas
+
+
+def current():
+    return _replicas
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Keep read-replica snapshots of the feedback database")
+    parser.add_argument("--db", default=feedback_db.DB_PATH, help="primary database")
+    parser.add_argument("--replica", action="append", required=True,
+                        help="replica file to maintain (repeat for several)")
+    parser.add_argument("--interval", type=float, default=SNAPSHOT_INTERVAL,
+                        help="seconds between snapshots")
+    parser.add_argument("--once", action="store_true", help="take one snapshot and exit")
+    args = parser.parse_args(argv)
+
+    snapshotter = Snapshotter(args.db, args.replica, args.interval, log=print)
+    if args.once:
+        snapshotter.run_once()
+        return
+    try:
+        snapshotter.run()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,690 @@
+import argparse
+import asyncio
+import json
+import math
+import secrets
+import sqlite3
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from urllib.parse import parse_qs, urlsplit
+
+import feedback_cache
+import feedback_db
+import feedback_metrics
+import feedback_passwords as passwords
+import feedback_ratelimit
+import feedback_replica
+import feedback_service as service
+import feedback_shards
+import feedback_writer
+
+
+# JSON-over-HTTP front end for feedback_service. One asyncio loop handles
+# every client connection; the blocking SQLite calls run on a thread pool
+# sized to the connection pool so workers never wait on each other for a
+# connection.
+#
+#   python feedback_server.py --port 8080
+#
+# POST /login returns a token; send it back as "Authorization: Bearer <token>".
+# A token expires after SESSION_TTL seconds unused or on POST /logout; past
+# MAX_SESSIONS live tokens, the least recently used is dropped.
+# GET /feedback and /admin/feedback are paged with ?after=<feedback_id>&limit=N.
+
+MAX_BODY = 64 * 1024
+MAX_LINE = 8 * 1024
+MAX_HEADERS = 100
+SESSION_TTL = 8 * 3600
+MAX_SESSIONS = 100_000
+WORKERS = 8
+
+CATEGORY_COLUMNS = ["category_id", "category_name"]
+PRODUCT_COLUMNS = ["product_id", "product_name", "category_id", "price", "description"]
+CATEGORY_PRODUCT_COLUMNS = ["product_id", "product_name", "price", "description"]
+ADMIN_FEEDBACK_COLUMNS = ["feedback_id", "product", "customer", "rating", "comment"]
+ADMIN_PRODUCT_FEEDBACK_COLUMNS = ["customer", "rating", "comment"]
+FEEDBACK_COLUMNS = ["feedback_id", "product", "rating", "comment"]
+PRODUCT_FEEDBACK_COLUMNS = ["rating", "comment"]
+OWN_FEEDBACK_COLUMNS = ["feedback_id", "product_id", "rating", "comment"]
+OWN_SEARCH_COLUMNS = ["feedback_id", "rating", "comment"]
+COMMENT_MATCH_COLUMNS = ["feedback_id", "product", "customer", "rating", "snippet"]
+PRODUCT_MATCH_COLUMNS = ["product_id", "product_name", "price", "snippet"]
+PRODUCT_NAME_COLUMNS = ["product_id", "product_name", "match"]
+ALSO_LIKED_COLUMNS = ["product_id", "product_name", "price", "similarity"]
+CACHE_COLUMNS = ["cache", "entries", "hits", "misses", "hit_rate"]
+REPORT_COLUMNS = ["ratings", "average", "r1", "r2", "r3", "r4", "r5"]
+MODERATION_COLUMNS = ["feedback_id", "product", "customer", "rating", "comment", "reason",
+                      "duplicate_of", "flagged_at"]
+CHANGE_COLUMNS = ["seq", "op", "feedback_id", "customer_id", "product_id", "rating", "comment", "changed_at"]
+SENTIMENT_COLUMNS = ["comments", "positive", "neutral", "negative", "avg_score"]
+KEYWORD_COLUMNS = ["keyword", "count"]
+RATING_COLUMNS = ["product_id", "product_name", "ratings", "average", "r1", "r2", "r3", "r4", "r5"]
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class Request:
+    def __init__(self, method, path, query, headers, body, client=None):
+        self.method = method
+        self.path = path
+        self.query = query
+        self.headers = headers
+        self.body = body
+        self.client = client
+
+    def json(self):
+        if not self.body:
+            return {}
+        try:
+            data = json.loads(self.body)
+        except ValueError:
+            raise HTTPError(400, "Body must be JSON") from None
+        if not isinstance(data, dict):
+            raise HTTPError(400, "Body must be a JSON object")
+        return data
+
+    def param(self, name):
+        values = self.query.get(name)
+        return values[0] if values else None
+
+
+def records(columns, rows):
+    return [dict(zip(columns, row)) for row in rows]
+
+
+def require(data, *names):
+    missing = [n for n in names if data.get(n) in (None, "")]
+    if missing:
+        raise HTTPError(400, "Missing field(s): " + ", ".join(missing))
+    return [data[n] for n in names]
+
+
+def int_id(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise HTTPError(400, "Expected a numeric id") from None
+
+
+def page_args(request):
+    after = request.param("after")
+    limit = request.param("limit")
+    return (
+        int_id(after) if after is not None else 0,
+        int_id(limit) if limit is not None else service.PAGE_SIZE,
+    )
+
+
+def page(columns, rows, limit):
+    # Pass next_after back as ?after= to fetch the following page.
+    next_after = rows[-1][0] if len(rows) == limit else None
+    return {"feedback": records(columns, rows), "next_after": next_after}
+
+
+class FeedbackServer:
+    def __init__(self, workers=WORKERS):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="sqlite")
+        self.sessions = OrderedDict()  # token -> (Session, last used), oldest first
+        self.routes = [
+            ("POST", ("register",), self.register),
+            ("POST", ("login",), self.login),
+            ("POST", ("logout",), self.logout),
+            ("GET", ("categories",), self.categories),
+            ("POST", ("categories",), self.add_category),
+            ("GET", ("products",), self.products),
+            ("POST", ("products",), self.add_product),
+            ("GET", ("products", "top"), self.top_rated),
+            ("GET", ("products", "rating"), self.rating_summary),
+            ("GET", ("products", "search"), self.search_products),
+            ("GET", ("products", "match"), self.match_products),
+            ("GET", ("products", "also-liked"), self.also_liked),
+            ("GET", ("feedback",), self.feedback),
+            ("GET", ("me", "feedback"), self.own_feedback),
+            ("POST", ("me", "feedback"), self.add_feedback),
+            ("PUT", ("me", "feedback", None), self.update_feedback),
+            ("DELETE", ("me", "feedback", None), self.delete_feedback),
+            ("GET", ("admin", "feedback"), self.admin_feedback),
+            ("DELETE", ("admin", "feedback", None), self.admin_delete_feedback),
+            ("GET", ("admin", "feedback", "search"), self.search_comments),
+            ("GET", ("admin", "moderation"), self.moderation_queue),
+            ("POST", ("admin", "moderation", "approve"), self.approve_feedback),
+            ("POST", ("admin", "moderation", "reject"), self.reject_feedback),
+            ("POST", ("admin", "moderation", "rescreen"), self.rescreen_feedback),
+            ("GET", ("admin", "cache"), self.cache_stats),
+            ("GET", ("admin", "metrics"), self.query_metrics),
+            ("GET", ("admin", "writer"), self.writer_stats),
+            ("GET", ("admin", "logins"), self.login_stats),
+            ("GET", ("admin", "replicas"), self.replica_stats),
+            ("GET", ("admin", "shards"), self.shard_stats),
+            ("GET", ("admin", "changes"), self.changes),
+            ("GET", ("admin", "reports", "categories"), self.category_report),
+            ("GET", ("admin", "reports", "products"), self.product_report),
+            ("GET", ("admin", "reports", "daily"), self.daily_report),
+            ("POST", ("admin", "analytics"), self.refresh_analytics),
+            ("GET", ("admin", "analytics", "products"), self.product_sentiment),
+            ("GET", ("admin", "analytics", "categories"), self.category_sentiment),
+            ("GET", ("admin", "analytics", "keywords"), self.keywords),
+        ]
+
+    async def call(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, func, *args)
+
+    async def write(self, func, *args):
+        # Feedback writes go to the group-commit queue when it is running;
+        # awaiting the Future keeps the worker threads free for reads.
+        if feedback_writer.current() is None:
+            return await self.call(func, *args)
+        return await asyncio.wrap_future(func(*args, wait=False))
+
+    def token(self, request):
+        auth = request.headers.get("authorization", "")
+        return auth[7:] if auth.lower().startswith("bearer ") else None
+
+    def session(self, request, role=None):
+        token = self.token(request)
+        entry = self.sessions.get(token)
+        now = time.monotonic()
+        if entry is not None and now - entry[1] > SESSION_TTL:
+            del self.sessions[token]
+            entry = None
+        if entry is None:
+            raise HTTPError(401, "Login required")
+        session = entry[0]
+        self.sessions[token] = (session, now)
+        self.sessions.move_to_end(token)
+        if role and session.role != role:
+            raise HTTPError(403, f"{role} only")
+        return session
+
+    def start_session(self, token, session):
+        self.sessions[token] = (session, time.monotonic())
+        # Expired tokens are dropped here as well as on lookup, so tokens
+        # that are never sent again do not pile up.
+        cutoff = time.monotonic() - SESSION_TTL
+        while self.sessions:
+            oldest = next(iter(self.sessions))
+            if len(self.sessions) <= MAX_SESSIONS and self.sessions[oldest][1] >= cutoff:
+                break
+            del self.sessions[oldest]
+
+    #ROUTES
+    async def register(self, request):
+        data = request.json()
+        username, password, role = require(data, "username", "password", "role")
+        user_id = await self.call(
+            service.register, username, password, role,
+            data.get("fullname"), data.get("phone"),
+        )
+        return 201, {"user_id": user_id}
+
+    async def login(self, request):
+        username, password, role = require(request.json(), "username", "password", "role")
+        service.checkPassword(password)
+        await self.call(service.throttleLogin, username, request.client)
+        user = await self.call(service.findLogin, username, role)
+
+        # Hashing runs on its own pool so a burst of logins cannot starve
+        # the database workers or block the event loop.
+        loop = asyncio.get_running_loop()
+        hasher = passwords.executor()
+        stored = user[3] if user else passwords.dummy_hash()
+        ok, rehash = await loop.run_in_executor(hasher, passwords.verify_password, password, stored)
+        if not user or not ok:
+            raise service.AuthError("Invalid login credentials")
+        await self.call(service.loginSucceeded, username, request.client)
+        if rehash:
+            new_hash = await loop.run_in_executor(hasher, passwords.hash_password, password)
+            await self.call(service.upgradePassword, user[0], stored, new_hash)
+
+        session = service.Session(user[0], username, user[1], user[2])
+        token = secrets.token_urlsafe(24)
+        self.start_session(token, session)
+        return 200, {"token": token, "user_id": session.user_id, "role": session.role}
+
+    async def logout(self, request):
+        self.session(request)
+        del self.sessions[self.token(request)]
+        return 200, {"logged_out": True}
+
+    async def categories(self, request):
+        self.session(request)
+        rows = await self.call(service.viewCategory)
+        return 200, records(CATEGORY_COLUMNS, rows)
+
+    async def add_category(self, request):
+        session = self.session(request, "admin")
+        (name,) = require(request.json(), "name")
+        category_id = await self.call(service.addCategory, session, name)
+        return 201, {"category_id": category_id}
+
+    async def products(self, request):
+        self.session(request)
+        category = request.param("category")
+        if category is None:
+            rows = await self.call(service.viewProducts)
+            return 200, records(PRODUCT_COLUMNS, rows)
+        rows = await self.call(service.viewAllProducts, category)
+        return 200, records(CATEGORY_PRODUCT_COLUMNS, rows)
+
+    async def add_product(self, request):
+        session = self.session(request, "admin")
+        name, category_id, price, desc = require(
+            request.json(), "name", "category_id", "price", "description"
+        )
+        product_id = await self.call(service.addProduct, session, name, category_id, price, desc)
+        return 201, {"product_id": product_id}
+
+    async def top_rated(self, request):
+        self.session(request)
+        limit = request.param("limit")
+        min_ratings = request.param("min_ratings")
+        rows = await self.call(
+            service.topRatedProducts,
+            int_id(limit) if limit is not None else 10,
+            int_id(min_ratings) if min_ratings is not None else 1,
+        )
+        return 200, records(RATING_COLUMNS, rows)
+
+    async def rating_summary(self, request):
+        self.session(request)
+        (product,) = require({"product": request.param("product")}, "product")
+        row = await self.call(service.productRatingSummary, product)
+        return 200, dict(zip(RATING_COLUMNS, row))
+
+    async def search_products(self, request):
+        self.session(request)
+        (q,) = require({"q": request.param("q")}, "q")
+        _, limit = page_args(request)
+        rows = await self.call(service.searchProducts, q, limit)
+        return 200, records(PRODUCT_MATCH_COLUMNS, rows)
+
+    async def match_products(self, request):
+        self.session(request)
+        (name,) = require({"name": request.param("name")}, "name")
+        rows = await self.call(service.matchProducts, name)
+        return 200, records(PRODUCT_NAME_COLUMNS, rows)
+
+    async def also_liked(self, request):
+        self.session(request)
+        (name,) = require({"name": request.param("name")}, "name")
+        limit = request.param("limit")
+        rows = await self.call(service.alsoLiked, name,
+                               int_id(limit) if limit is not None else service.RECOMMEND_LIMIT)
+        return 200, records(ALSO_LIKED_COLUMNS, rows)
+
+    async def feedback(self, request):
+        self.session(request)
+        product = request.param("product")
+        if product is None:
+            after, limit = page_args(request)
+            rows = await self.call(service.viewAllFeedback, after, limit)
+            return 200, page(FEEDBACK_COLUMNS, rows, limit)
+        rows = await self.call(service.viewFeedbackByProduct, product)
+        return 200, records(PRODUCT_FEEDBACK_COLUMNS, rows)
+
+    async def own_feedback(self, request):
+        session = self.session(request, "customer")
+        product_id = request.param("product_id")
+        if product_id is None:
+            rows = await self.call(service.viewFeedback, session)
+            return 200, records(OWN_FEEDBACK_COLUMNS, rows)
+        rows = await self.call(service.searchFeedback, session, int_id(product_id))
+        return 200, records(OWN_SEARCH_COLUMNS, rows)
+
+    async def add_feedback(self, request):
+        session = self.session(request, "customer")
+        data = request.json()
+        product_id, rating = require(data, "product_id", "rating")
+        feedback_id = await self.write(
+            service.addFeedback, session, int_id(product_id), rating,
+            data.get("comment", ""),
+        )
+        return 201, {"feedback_id": feedback_id}
+
+    async def update_feedback(self, request, fid):
+        session = self.session(request, "customer")
+        data = request.json()
+        (rating,) = require(data, "rating")
+        await self.write(
+            service.updateFeedback, session, int_id(fid), rating,
+            data.get("comment", ""),
+        )
+        return 200, {"feedback_id": int_id(fid)}
+
+    async def delete_feedback(self, request, fid):
+        session = self.session(request, "customer")
+        await self.write(service.deleteFeedback, session, int_id(fid))
+        return 200, {"feedback_id": int_id(fid)}
+
+    async def admin_feedback(self, request):
+        session = self.session(request, "admin")
+        product = request.param("product")
+        if product is None:
+            after, limit = page_args(request)
+            rows = await self.call(service.adminViewFeedback, session, after, limit)
+            return 200, page(ADMIN_FEEDBACK_COLUMNS, rows, limit)
+        rows = await self.call(service.adminViewFeedbackByProduct, session, product)
+        return 200, records(ADMIN_PRODUCT_FEEDBACK_COLUMNS, rows)
+
+    async def search_comments(self, request):
+        session = self.session(request, "admin")
+        (q,) = require({"q": request.param("q")}, "q")
+        _, limit = page_args(request)
+        rows = await self.call(service.searchComments, session, q, limit)
+        return 200, records(COMMENT_MATCH_COLUMNS, rows)
+
+    async def admin_delete_feedback(self, request, fid):
+        session = self.session(request, "admin")
+        await self.call(service.adminDeleteFeedback, session, int_id(fid))
+        return 200, {"feedback_id": int_id(fid)}
+
+    async def moderation_queue(self, request):
+        session = self.session(request, "admin")
+        after, limit = page_args(request)
+        rows = await self.call(service.moderationQueue, session, after, limit)
+        return 200, page(MODERATION_COLUMNS, rows, limit)
+
+    # Body: {"feedback_ids": [...]}; all of them are decided in one transaction.
+    async def approve_feedback(self, request):
+        session = self.session(request, "admin")
+        (fids,) = require(request.json(), "feedback_ids")
+        return 200, {"approved": await self.call(service.approveFeedback, session, fids)}
+
+    async def reject_feedback(self, request):
+        session = self.session(request, "admin")
+        (fids,) = require(request.json(), "feedback_ids")
+        return 200, {"rejected": await self.call(service.rejectFeedback, session, fids)}
+
+    async def rescreen_feedback(self, request):
+        session = self.session(request, "admin")
+        screened, queued = await self.call(service.rescreenFeedback, session)
+        return 200, {"screened": screened, "queued": queued}
+
+    async def cache_stats(self, request):
+        self.session(request, "admin")
+        return 200, records(CACHE_COLUMNS, feedback_cache.stats())
+
+    async def query_metrics(self, request):
+        self.session(request, "admin")
+        return 200, feedback_metrics.metrics.snapshot()
+
+    async def writer_stats(self, request):
+        self.session(request, "admin")
+        writer = feedback_writer.current()
+        if writer is None:
+            raise HTTPError(404, "Group commit is disabled")
+        return 200, writer.stats()
+
+    async def changes(self, request):
+        # ?after=<seq>&limit=N; pass next_after back to keep following.
+        session = self.session(request, "admin")
+        after = request.param("after")
+        limit = request.param("limit")
+        after = int_id(after) if after is not None else 0
+        limit = int_id(limit) if limit is not None else service.STREAM_BATCH
+        rows = await self.call(service.changesSince, session, after, limit)
+        return 200, {
+            "changes": records(CHANGE_COLUMNS, rows),
+            "next_after": rows[-1][0] if rows else after,
+        }
+
+    # Reports take ?from=YYYY-MM-DD&to=YYYY-MM-DD (default: the last 7 days).
+    async def category_report(self, request):
+        session = self.session(request, "admin")
+        rows = await self.call(
+            service.categoryReport, session, request.param("from"), request.param("to")
+        )
+        return 200, records(["category_id", "category_name"] + REPORT_COLUMNS, rows)
+
+    async def product_report(self, request):
+        session = self.session(request, "admin")
+        _, limit = page_args(request)
+        rows = await self.call(
+            service.productReport, session, request.param("from"), request.param("to"),
+            request.param("category"), limit,
+        )
+        return 200, records(["product_id", "product_name"] + REPORT_COLUMNS, rows)
+
+    async def daily_report(self, request):
+        session = self.session(request, "admin")
+        rows = await self.call(
+            service.dailyReport, session, request.param("from"), request.param("to"),
+            request.param("category"),
+        )
+        return 200, records(["day"] + REPORT_COLUMNS, rows)
+
+    async def refresh_analytics(self, request):
+        session = self.session(request, "admin")
+        workers = request.json().get("workers")
+        comments = await self.call(
+            service.refreshAnalytics, session, int_id(workers) if workers is not None else None
+        )
+        return 200, {"comments": comments}
+
+    async def product_sentiment(self, request):
+        session = self.session(request, "admin")
+        _, limit = page_args(request)
+        min_comments = request.param("min_comments")
+        rows = await self.call(
+            service.productSentiment, session, request.param("order") != "positive", limit,
+            int_id(min_comments) if min_comments is not None else 1,
+        )
+        return 200, records(["product_id", "product_name"] + SENTIMENT_COLUMNS, rows)
+
+    async def category_sentiment(self, request):
+        session = self.session(request, "admin")
+        rows = await self.call(service.categorySentiment, session)
+        return 200, records(["category_id", "category_name"] + SENTIMENT_COLUMNS, rows)
+
+    async def keywords(self, request):
+        session = self.session(request, "admin")
+        product = request.param("product")
+        category = request.param("category")
+        if (product is None) == (category is None):
+            raise HTTPError(400, "Pass exactly one of product or category")
+        if product is not None:
+            rows = await self.call(service.productKeywords, session, product)
+        else:
+            rows = await self.call(service.categoryKeywords, session, category)
+        return 200, records(KEYWORD_COLUMNS, rows)
+
+    async def login_stats(self, request):
+        session = self.session(request, "admin")
+        return 200, await self.call(service.loginLimitStats, session)
+
+    async def replica_stats(self, request):
+        self.session(request, "admin")
+        replicas = feedback_replica.current()
+        if replicas is None:
+            raise HTTPError(404, "No read replicas configured")
+        return 200, replicas.stats()
+
+    async def shard_stats(self, request):
+        self.session(request, "admin")
+        shards = feedback_shards.current()
+        if shards is None:
+            raise HTTPError(404, "Feedback is not sharded")
+        return 200, shards.stats()
+
+    #HTTP
+    def route(self, method, path):
+        parts = tuple(p for p in path.split("/") if p)
+        allowed = False
+        for r_method, pattern, handler in self.routes:
+            if len(pattern) != len(parts):
+                continue
+            if any(p is not None and p != part for p, part in zip(pattern, parts)):
+                continue
+            allowed = True
+            if r_method == method:
+                args = [part for p, part in zip(pattern, parts) if p is None]
+                return handler, args
+        if allowed:
+            raise HTTPError(405, "Method not allowed")
+        raise HTTPError(404, "Not found")
+
+    async def dispatch(self, request):
+        try:
+            handler, args = self.route(request.method, request.path)
+            return await handler(request, *args)
+        except HTTPError as e:
+            return e.status, {"error": str(e)}
+        except service.RateLimited as e:
+            return e.status, {"error": str(e), "retry_after": math.ceil(e.retry_after)}
+        except service.AmbiguousProduct as e:
+            return e.status, {"error": str(e), "candidates": records(PRODUCT_NAME_COLUMNS, e.candidates)}
+        except service.ServiceError as e:
+            return e.status, {"error": str(e)}
+        except sqlite3.Error as e:
+            return 503, {"error": f"Database error: {e}"}
+
+    async def read_line(self, reader):
+        # StreamReader raises ValueError once a line outgrows its limit.
+        try:
+            return await reader.readline()
+        except (asyncio.LimitOverrunError, ValueError):
+            raise HTTPError(413, "Request line or header too long") from None
+
+    async def read_request(self, reader):
+        line = await self.read_line(reader)
+        if not line:
+            return None
+        try:
+            method, target, _ = line.decode("latin-1").split(" ", 2)
+        except ValueError:
+            raise HTTPError(400, "Malformed request line") from None
+
+        headers = {}
+        while True:
+            line = await self.read_line(reader)
+            if line in (b"\r\n", b"\n", b""):
+                break
+            if len(headers) >= MAX_HEADERS:
+                raise HTTPError(400, "Too many headers")
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        try:
+            length = int(headers.get("content-length") or 0)
+        except ValueError:
+            raise HTTPError(400, "Bad Content-Length") from None
+        if length < 0 or length > MAX_BODY:
+            raise HTTPError(413, "Request body too large")
+        body = await reader.readexactly(length) if length else b""
+
+        url = urlsplit(target)
+        return Request(method.upper(), url.path, parse_qs(url.query), headers, body)
+
+    async def handle(self, reader, writer):
+        peer = writer.get_extra_info("peername")
+        client = peer[0] if peer else None
+        try:
+            while True:
+                try:
+                    request = await self.read_request(reader)
+                except HTTPError as e:
+                    await self.respond(writer, e.status, {"error": str(e)}, False)
+                    break
+                if request is None:
+                    break
+                request.client = client
+
+                keep_alive = request.headers.get("connection", "").lower() != "close"
+                status, payload = await self.dispatch(request)
+                await self.respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, writer, status, payload, keep_alive):
+        body = json.dumps(payload).encode()
+        head = (
+            f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\n"
+            "Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        )
+        writer.write(head.encode() + body)
+        await writer.drain()
+
+    async def serve(self, host, port):
+        server = await asyncio.start_server(self.handle, host, port, backlog=4096, limit=MAX_LINE)
+        print(f"Serving feedback API on http://{host}:{port}")
+        async with server:
+            await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Customer feedback HTTP/JSON API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--db", default=feedback_db.DB_PATH)
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--password-cost", type=int, default=passwords.SCRYPT_LOG_N,
+                        help="scrypt cost as log2(N); existing hashes are upgraded at login")
+    parser.add_argument("--slow-query-ms", type=float, default=feedback_metrics.SLOW_QUERY_MS)
+    parser.add_argument("--slow-query-log", help="append slow queries and their plans to this file")
+    parser.add_argument("--no-group-commit", action="store_true",
+                        help="commit each feedback write on its own instead of batching")
+    parser.add_argument("--batch-size", type=int, default=feedback_writer.BATCH_SIZE,
+                        help="most feedback writes per group commit")
+    parser.add_argument("--batch-wait-ms", type=float, default=feedback_writer.BATCH_WAIT_MS,
+                        help="how long a group commit waits for more writes")
+    parser.add_argument("--replica", action="append",
+                        help="serve public reads from this snapshot file (repeat for several)")
+    parser.add_argument("--max-staleness", type=float, default=feedback_replica.MAX_STALENESS,
+                        help="seconds before a replica is too old and reads go to the primary")
+    parser.add_argument("--snapshot-interval", type=float, default=0,
+                        help="also refresh the replicas from this process every N seconds")
+    parser.add_argument("--shard", action="append",
+                        help="store feedback in these shard files, in order (see feedback_shards.py)")
+    parser.add_argument("--login-throttle-db", default=feedback_ratelimit.THROTTLE_DB,
+                        help="share login rate limits with other processes through this SQLite file")
+    args = parser.parse_args()
+
+    feedback_metrics.configure(args.slow_query_ms, args.slow_query_log)
+    passwords.configure(args.password_cost)
+    passwords.dummy_hash()
+    feedback_ratelimit.configure(args.login_throttle_db)
+
+    feedback_db.configure(args.db, size=args.workers)
+    feedback_db.init_schema()
+    shards = feedback_shards.configure(args.shard or feedback_shards.SHARD_PATHS, args.workers)
+    if not args.no_group_commit:
+        feedback_writer.start(args.batch_size, args.batch_wait_ms)
+        if shards:
+            shards.start_writers(args.batch_size, args.batch_wait_ms)
+    snapshotter = None
+    if args.replica:
+        if args.snapshot_interval > 0:
+            snapshotter = feedback_replica.Snapshotter(args.db, args.replica, args.snapshot_interval)
+            snapshotter.run_once()
+            snapshotter.start()
+        feedback_replica.configure(args.replica, args.max_staleness, args.workers)
+    server = FeedbackServer(args.workers)
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.executor.shutdown()
+        feedback_writer.stop()
+        feedback_shards.configure(None)
+        if snapshotter:
+            snapshotter.stop()
+        feedback_replica.configure(None)
+        feedback_db.close_pool()
+
+
+if __name__ == "__main__":
+    main()
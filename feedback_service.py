@@ -0,0 +1,1301 @@
+import heapq
+import math
+import re
+import sqlite3
+from concurrent.futures import Future
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta, timezone
+from functools import partial
+from itertools import islice
+
+import feedback_cache as cache
+import feedback_moderation as moderation
+import feedback_passwords as passwords
+import feedback_ratelimit
+import feedback_shards
+import feedback_writer
+from feedback_db import get_conn, get_pool, get_read_conn
+
+
+# Non-interactive versions of the menu operations. They take plain
+# arguments, return rows as tuples and raise ServiceError subclasses with
+# the same messages the menus print, so the CLI and the HTTP server share
+# one implementation. Admin and own-feedback operations take the Session
+# returned by login(); public catalog and feedback reads need none.
+#
+# The public reads use get_read_conn(), which serves them from a read
+# replica when feedback_replica is configured, so they may lag the primary
+# by up to its max_staleness (plus the catalog cache TTL for cached views).
+# Everything that writes, and every read behind a Session, uses the primary.
+#
+# With feedback_shards configured, Feedback rows live in the shards instead:
+# the _shard helpers below route by product or feedback id, or gather from
+# every shard, and names still come from the main database.
+
+# Feedback listings are paged by keyset on feedback_id: each page asks for
+# rows after the last id seen, so page N costs the same as page 1 and no
+# page ever materializes the whole table.
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 1000
+STREAM_BATCH = 500
+
+# Feedback waiting in the moderation queue (see feedback_moderation) is left
+# out of the public listings until an admin approves it.
+NOT_PENDING = """NOT EXISTS (
+            SELECT 1 FROM ModerationQueue M
+            WHERE M.feedback_id = F.feedback_id AND M.status = 'pending')"""
+
+
+class ServiceError(Exception):
+    status = 400
+
+
+class InvalidInput(ServiceError):
+    status = 400
+
+
+class AuthError(ServiceError):
+    status = 401
+
+
+class Forbidden(ServiceError):
+    status = 403
+
+
+class NotFound(ServiceError):
+    status = 404
+
+
+class Conflict(ServiceError):
+    status = 409
+
+
+class RateLimited(ServiceError):
+    status = 429
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class AmbiguousProduct(ServiceError):
+    status = 409
+
+    def __init__(self, message, candidates):
+        super().__init__(message)
+        self.candidates = candidates
+
+
+class NotSupported(ServiceError):
+    status = 501
+
+
+def _check_page(limit):
+    if isinstance(limit, bool) or not isinstance(limit, int) or not 1 <= limit <= MAX_PAGE_SIZE:
+        raise InvalidInput(f"Page size must be between 1 and {MAX_PAGE_SIZE}")
+
+
+def _stream(fetch_page, after_id, batch):
+    # Each batch borrows a connection only while it is fetched, so a slow
+    # consumer never pins a pooled connection or an open read transaction.
+    while True:
+        rows = fetch_page(after_id, batch)
+        yield from rows
+        if len(rows) < batch:
+            return
+        after_id = rows[-1][0]
+
+
+def _check_rating(rating):
+    if isinstance(rating, bool) or not isinstance(rating, int) or not 1 <= rating <= 5:
+        raise InvalidInput("Rating must be between 1 and 5")
+
+
+def _check_comment(comment):
+    if comment is not None and not isinstance(comment, str):
+        raise InvalidInput("Comment must be text")
+
+
+#REGISTER / LOGIN
+def checkPassword(password):
+    # Hashing needs text; JSON clients can send anything.
+    if not isinstance(password, str):
+        raise InvalidInput("Password must be a string")
+
+
+def register(username, password, role, fullname=None, phone=None):
+    checkPassword(password)
+    if role not in ("admin", "customer"):
+        raise InvalidInput("Invalid role")
+    if role == "customer" and not fullname:
+        raise InvalidInput("Full name is required for customers")
+
+    password_hash = passwords.hash_password(password)
+    try:
+        with get_conn() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                INSERT INTO Users(username, password, role)
+                VALUES (?, ?, ?)
+            """, (username, password_hash, role))
+            user_id = cursor.lastrowid
+
+            if role == "customer":
+                cursor.execute("""
+                    INSERT INTO Customers(user_id, fullname, phone)
+                    VALUES (?, ?, ?)
+                """, (user_id, fullname, phone))
+
+            conn.commit()
+    except sqlite3.IntegrityError:
+        raise Conflict("Username already exists") from None
+
+    cache.customers.invalidate(user_id)
+    return user_id
+
+
+#SESSION
+class Session:
+    """The logged-in user, resolved once at login.
+
+    Carries user_id, role and (for customers) customer_id so operations never
+    look them up again. With ``hold_connection`` the session also keeps one
+    pooled connection for its whole lifetime; call close() when done.
+    """
+
+    def __init__(self, user_id, username, role, customer_id=None, hold_connection=False):
+        self.user_id = user_id
+        self.username = username
+        self.role = role
+        self.customer_id = customer_id
+        self._pool = get_pool() if hold_connection else None
+        self._conn = self._pool.acquire() if hold_connection else None
+
+    @contextmanager
+    def connection(self):
+        if self._conn is None:
+            with get_conn() as conn:
+                yield conn
+            return
+
+        try:
+            yield self._conn
+        except BaseException:
+            if self._conn.in_transaction:
+                self._conn.rollback()
+            raise
+
+    def require_admin(self):
+        if self.role != "admin":
+            raise Forbidden("Admins only")
+
+    def require_customer(self):
+        if self.role != "customer":
+            raise Forbidden("Customers only")
+        if self.customer_id is None:
+            raise NotFound("Customer profile not found")
+        return self.customer_id
+
+    def close(self):
+        if self._conn is not None:
+            self._pool.release(self._conn)
+            self._conn = None
+
+
+def findLogin(username, role):
+    with get_conn() as conn:
+        return conn.execute("""
+            SELECT U.id, U.role, C.customer_id, U.password
+            FROM Users U
+            LEFT JOIN Customers C ON C.user_id = U.id
+            WHERE U.username = ? AND U.role = ?
+        """, (username, role)).fetchone()
+
+
+def upgradePassword(user_id, old_stored, new_hash):
+    # Only replaces the exact value that was verified, so a password change
+    # racing with a login is never overwritten.
+    with get_conn() as conn:
+        conn.execute(
+            "UPDATE Users SET password = ? WHERE id = ? AND password = ?",
+            (new_hash, user_id, old_stored)
+        )
+        conn.commit()
+
+
+def throttleLogin(username, client=None):
+    # Called before findLogin: attempts over the limit never reach the
+    # database or the password hash (see feedback_ratelimit).
+    wait = feedback_ratelimit.current().attempt(username, client)
+    if wait:
+        raise RateLimited(f"Too many login attempts; try again in {math.ceil(wait)}s", wait)
+
+
+def loginSucceeded(username, client=None):
+    feedback_ratelimit.current().succeeded(username, client)
+
+
+def loginLimitStats(session):
+    session.require_admin()
+    return feedback_ratelimit.current().stats()
+
+
+def login(username, password, role, hold_connection=False, client=None):
+    checkPassword(password)
+    throttleLogin(username, client)
+    user = findLogin(username, role)
+    stored = user[3] if user else passwords.dummy_hash()
+    ok, rehash = passwords.verify_password(password, stored)
+    if not user or not ok:
+        raise AuthError("Invalid login credentials")
+
+    loginSucceeded(username, client)
+    if rehash:
+        upgradePassword(user[0], stored, passwords.hash_password(password))
+    return Session(user[0], username, user[1], user[2], hold_connection)
+
+
+def sessionForUser(user_id, hold_connection=False):
+    # For trusted non-interactive callers (jobs, scripts) that already know
+    # which user they act as.
+    with get_conn() as conn:
+        row = conn.execute(
+            "SELECT username, role FROM Users WHERE id = ?", (user_id,)
+        ).fetchone()
+    if not row:
+        raise NotFound("User not found")
+
+    customer_id = None
+    if row[1] == "customer":
+        try:
+            customer_id = getCustomerId(user_id)
+        except NotFound:
+            pass
+    return Session(user_id, row[0], row[1], customer_id, hold_connection)
+
+
+def _load_customer_id(user_id):
+    with get_conn() as conn:
+        row = conn.execute(
+            "SELECT customer_id FROM Customers WHERE user_id = ?", (user_id,)
+        ).fetchone()
+    if not row:
+        raise NotFound("Customer profile not found")
+    return row[0]
+
+
+def getCustomerId(user_id):
+    return cache.customers.get_or_load(user_id, lambda: _load_customer_id(user_id))
+
+
+#SHARDS
+def _shard_for_feedback(fid, missing):
+    # None when unsharded; NotFound for an id no shard hands out.
+    shards = feedback_shards.current()
+    if shards is None:
+        return None
+    shard = shards.for_feedback(fid)
+    if shard is None:
+        raise NotFound(missing)
+    return shard
+
+
+def _require_unsharded(feature):
+    # For features that read the main database's Feedback table or the
+    # rollups its triggers keep; both stay empty once feedback is sharded.
+    if feedback_shards.current() is not None:
+        raise NotSupported(f"{feature}: not supported with sharded feedback storage")
+
+
+def _feedback_page(conn, after_id, limit):
+    return conn.execute("""
+        SELECT feedback_id, product_id, customer_id, rating, comment
+        FROM Feedback
+        WHERE feedback_id > ?
+        ORDER BY feedback_id
+        LIMIT ?
+    """, (after_id, limit)).fetchall()
+
+
+def _public_feedback_page(conn, after_id, limit):
+    return conn.execute(f"""
+        SELECT feedback_id, product_id, customer_id, rating, comment
+        FROM Feedback F
+        WHERE feedback_id > ? AND {NOT_PENDING}
+        ORDER BY feedback_id
+        LIMIT ?
+    """, (after_id, limit)).fetchall()
+
+
+def _gather_page(shards, after_id, limit, page=_feedback_page):
+    # Each shard returns its first `limit` rows after after_id; the page is
+    # the first `limit` of those in feedback_id order.
+    return list(islice(heapq.merge(*shards.gather(page, after_id, limit)), limit))
+
+
+def _names(conn, sql, ids):
+    ids = list(set(ids))
+    if not ids:
+        return {}
+    return dict(conn.execute(f"{sql} IN ({','.join('?' * len(ids))})", ids).fetchall())
+
+
+def _product_names(conn, product_ids):
+    return _names(conn, "SELECT product_id, product_name FROM Product WHERE product_id", product_ids)
+
+
+def _customer_names(conn, customer_ids):
+    return _names(conn, "SELECT customer_id, fullname FROM Customers WHERE customer_id", customer_ids)
+
+
+################################################ ADMIN #####################################################
+
+def addCategory(session, name):
+    session.require_admin()
+    try:
+        with session.connection() as conn:
+            cursor = conn.execute(
+                "INSERT INTO Category(category_name) VALUES (?)", (name,)
+            )
+            conn.commit()
+    except sqlite3.IntegrityError:
+        raise Conflict("Category already exists") from None
+    cache.catalog.clear()
+    return cursor.lastrowid
+
+
+def addProduct(session, name, category_id, price, desc):
+    session.require_admin()
+    if not isinstance(category_id, int) or not isinstance(price, int):
+        raise InvalidInput("Category ID & price must be numbers")
+
+    try:
+        with session.connection() as conn:
+            cursor = conn.execute("""
+                INSERT INTO Product(product_name, category_id, price, description)
+                VALUES (?, ?, ?, ?)
+            """, (name, category_id, price, desc))
+            conn.commit()
+    except sqlite3.IntegrityError:
+        raise Conflict("Product already exists OR invalid category ID") from None
+    cache.catalog.clear()
+    return cursor.lastrowid
+
+
+def _fetch_all(sql, params=()):
+    with get_read_conn() as conn:
+        return tuple(conn.execute(sql, params).fetchall())
+
+
+# Catalog reads go through cache.catalog and come back as tuples, since the
+# same rows are handed to every caller until addCategory/addProduct.
+def viewCategory():
+    return cache.catalog.get_or_load(
+        ("categories",), lambda: _fetch_all("SELECT * FROM Category")
+    )
+
+
+def viewProducts():
+    return cache.catalog.get_or_load(
+        ("products",), lambda: _fetch_all("SELECT * FROM Product")
+    )
+
+
+def adminViewFeedback(session, after_id=0, limit=PAGE_SIZE):
+    session.require_admin()
+    _check_page(limit)
+    shards = feedback_shards.current()
+    if shards is not None:
+        rows = _gather_page(shards, after_id, limit)
+        with session.connection() as conn:
+            products = _product_names(conn, [r[1] for r in rows])
+            customers = _customer_names(conn, [r[2] for r in rows])
+        return [(fid, products.get(pid), customers.get(cid), rating, comment)
+                for fid, pid, cid, rating, comment in rows]
+
+    with session.connection() as conn:
+        return conn.execute("""
+        SELECT F.feedback_id, P.product_name, C.fullname, F.rating, F.comment
+        FROM Feedback F
+        JOIN Product P ON F.product_id = P.product_id
+        JOIN Customers C ON F.customer_id = C.customer_id
+        WHERE F.feedback_id > ?
+        ORDER BY F.feedback_id
+        LIMIT ?
+        """, (after_id, limit)).fetchall()
+
+
+def streamAdminFeedback(session, after_id=0, batch=STREAM_BATCH):
+    return _stream(partial(adminViewFeedback, session), after_id, batch)
+
+
+#PRODUCT LOOKUP
+# Names are matched best first: exactly (ignoring case), then names that
+# start with the text, then (without an exact match) names that contain it
+# (the ProductNames trigram index; needs 3+ characters), each an index
+# lookup that stops after `limit` rows. Only when none of those exist are similar names (typos)
+# offered. The text is cut into up to four pieces; one typo (a swap of
+# two letters included) spoils one piece or two neighbouring ones, so the
+# names containing all the other pieces (up to SIMILAR_SCAN per query) are
+# candidates, shortlisted by the share of trigrams they have in common
+# with the text and ordered by edit distance.
+# findProduct() takes an exact or an only match and otherwise raises with
+# the candidates rather than picking one.
+MATCH_LIMIT = 10
+SIMILAR_SCAN = 2000
+SIMILAR_RERANK = 20
+SIMILAR_MIN = 0.3
+
+
+def _trigrams(text):
+    text = text.lower()
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _fts_string(text):
+    return '"' + text.replace('"', '""') + '"'
+
+
+def _exact_products(conn, text):
+    # A name differing only in case comes after the exact one.
+    return conn.execute("""
+        SELECT product_id, product_name
+        FROM Product
+        WHERE product_name = ? COLLATE NOCASE
+        ORDER BY product_name = ? DESC
+    """, (text, text)).fetchall()
+
+
+def _edit_distance(a, b):
+    # Optimal string alignment: insertions, deletions, substitutions and
+    # swaps of neighbouring characters each count as one edit.
+    before, previous = None, list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i] + [0] * len(b)
+        for j, cb in enumerate(b, 1):
+            best = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb))
+            if i > 1 and j > 1 and ca == b[j - 2] and a[i - 2] == cb:
+                best = min(best, before[j - 2] + 1)
+            current[j] = best
+        before, previous = previous, current
+    return previous[-1]
+
+
+def _similar_products(conn, text, grams):
+    count = min(len(text) // 3, 4)
+    cuts = [len(text) * i // count for i in range(count + 1)]
+    pieces = [_fts_string(text[a:b]) for a, b in zip(cuts, cuts[1:])]
+    # A typo inside one piece first; one across two pieces only if that
+    # finds nothing.
+    rounds = [[(i,) for i in range(count)]]
+    if count > 2:
+        rounds.append([(i, i + 1) for i in range(count - 1)])
+
+    scores = {}
+    for skips in rounds:
+        for skip in skips:
+            query = " AND ".join(p for i, p in enumerate(pieces) if i not in skip)
+            for product_id, name in conn.execute("""
+                SELECT rowid, product_name
+                FROM ProductNames
+                WHERE ProductNames MATCH ?
+                LIMIT ?
+            """, (query, SIMILAR_SCAN)):
+                if product_id not in scores:
+                    other = _trigrams(name)
+                    scores[product_id] = (len(grams & other) / len(grams | other), name)
+        if scores:
+            break
+
+    # Trigram overlap shortlists; edit distance orders the shortlist.
+    ranked = sorted(scores.items(), key=lambda item: -item[1][0])[:SIMILAR_RERANK]
+    text = text.lower()
+    ranked.sort(key=lambda item: _edit_distance(text, item[1][1].lower()))
+    return [(product_id, name) for product_id, (score, name) in ranked if score >= SIMILAR_MIN]
+
+
+def _match_products(conn, text, limit):
+    """[(product_id, product_name, match)] with match one of exact, prefix,
+    contains or similar."""
+    found = {}
+
+    def add(rows, match):
+        for product_id, name in rows:
+            if product_id not in found and len(found) < limit:
+                found[product_id] = (product_id, name, match)
+
+    exact = _exact_products(conn, text)
+    add(exact, "exact")
+    add(conn.execute("""
+        SELECT product_id, product_name
+        FROM Product
+        WHERE product_name COLLATE NOCASE >= ? AND product_name COLLATE NOCASE < ?
+        ORDER BY product_name COLLATE NOCASE
+        LIMIT ?
+    """, (text, text + "\U0010ffff", limit + 1)), "prefix")
+
+    grams = _trigrams(text)
+    if grams and not exact and len(found) < limit:
+        rows = conn.execute("""
+            SELECT rowid, product_name
+            FROM ProductNames
+            WHERE ProductNames MATCH ?
+            LIMIT ?
+        """, (_fts_string(text), limit + len(found))).fetchall()
+        add(sorted(rows, key=lambda r: len(r[1])), "contains")
+
+    if len(text) >= 6 and not found:
+        add(_similar_products(conn, text, grams), "similar")
+    return list(found.values())
+
+
+def matchProducts(text, limit=MATCH_LIMIT):
+    _check_page(limit)
+    text = text.strip()
+    if not text:
+        raise InvalidInput("Enter a product name")
+    with get_read_conn() as conn:
+        return _match_products(conn, text, limit)
+
+
+def _load_product_id(pname):
+    text = pname.strip()
+    if not text:
+        raise InvalidInput("Enter a product name")
+    with get_conn() as conn:
+        exact = _exact_products(conn, text)
+        if exact:
+            return exact[0][0]
+        candidates = _match_products(conn, text, MATCH_LIMIT)
+
+    matches = [c for c in candidates if c[2] != "similar"]
+    if len(matches) == 1:
+        return matches[0][0]
+    if matches:
+        names = ", ".join(c[1] for c in matches)
+        more = ", ..." if len(matches) == MATCH_LIMIT else ""
+        raise AmbiguousProduct(f"Several products match {text!r}: {names}{more}", matches)
+    if candidates:
+        names = ", ".join(c[1] for c in candidates[:3])
+        raise NotFound(f"Product not found. Did you mean: {names}?")
+    raise NotFound("Product not found")
+
+
+def findProduct(pname):
+    return cache.catalog.get_or_load(("find", pname), lambda: _load_product_id(pname))
+
+
+def adminViewFeedbackByProduct(session, pname):
+    session.require_admin()
+    product_id = findProduct(pname)
+    shards = feedback_shards.current()
+    if shards is not None:
+        with shards.for_product(product_id).pool.connection() as conn:
+            rows = conn.execute("""
+                SELECT customer_id, rating, comment
+                FROM Feedback
+                WHERE product_id = ?
+            """, (product_id,)).fetchall()
+        with session.connection() as conn:
+            customers = _customer_names(conn, [r[0] for r in rows])
+        return [(customers.get(cid), rating, comment) for cid, rating, comment in rows]
+
+    with session.connection() as conn:
+        return conn.execute("""
+        SELECT C.fullname, F.rating, F.comment
+        FROM Feedback F
+        JOIN Customers C ON F.customer_id = C.customer_id
+        WHERE F.product_id = ?
+        """, (product_id,)).fetchall()
+
+
+def adminDeleteFeedback(session, fid):
+    session.require_admin()
+    shard = _shard_for_feedback(fid, "Feedback ID not found")
+    with (shard.pool.connection() if shard else session.connection()) as conn:
+        cursor = conn.execute(
+            "DELETE FROM Feedback WHERE feedback_id = ?", (fid,)
+        )
+        if cursor.rowcount == 0:
+            raise NotFound("Feedback ID not found")
+        conn.commit()
+
+
+#MODERATION
+# Feedback that feedback_moderation flags waits in ModerationQueue until an
+# admin approves it (it shows in the public listings again) or rejects it
+# (it is deleted). Decisions take a list of feedback ids and apply in one
+# transaction per database file: one in all, or one per shard involved.
+APPROVE_SQL = """
+    UPDATE ModerationQueue SET status = 'approved', decided_at = datetime('now')
+    WHERE status = 'pending' AND feedback_id IN ({ids})
+"""
+REJECT_SQL = """
+    DELETE FROM Feedback
+    WHERE feedback_id IN (
+        SELECT feedback_id FROM ModerationQueue
+        WHERE status = 'pending' AND feedback_id IN ({ids}))
+"""
+
+
+def _queue_page(conn, after_id, limit):
+    return conn.execute("""
+        SELECT M.feedback_id, F.product_id, F.customer_id, F.rating, F.comment,
+               M.reason, M.duplicate_of, M.flagged_at
+        FROM ModerationQueue M
+        JOIN Feedback F ON F.feedback_id = M.feedback_id
+        WHERE M.status = 'pending' AND M.feedback_id > ?
+        ORDER BY M.feedback_id
+        LIMIT ?
+    """, (after_id, limit)).fetchall()
+
+
+def moderationQueue(session, after_id=0, limit=PAGE_SIZE):
+    session.require_admin()
+    _check_page(limit)
+    shards = feedback_shards.current()
+    if shards is not None:
+        rows = _gather_page(shards, after_id, limit, _queue_page)
+    else:
+        with session.connection() as conn:
+            rows = _queue_page(conn, after_id, limit)
+    with session.connection() as conn:
+        products = _product_names(conn, [r[1] for r in rows])
+        customers = _customer_names(conn, [r[2] for r in rows])
+    return [(fid, products.get(pid), customers.get(cid), rating, comment, reason, duplicate_of, flagged_at)
+            for fid, pid, cid, rating, comment, reason, duplicate_of, flagged_at in rows]
+
+
+def streamModerationQueue(session, after_id=0, batch=STREAM_BATCH):
+    return _stream(partial(moderationQueue, session), after_id, batch)
+
+
+def _decide(session, fids, sql):
+    session.require_admin()
+    if (not isinstance(fids, (list, tuple)) or not fids or len(fids) > MAX_PAGE_SIZE
+            or any(isinstance(f, bool) or not isinstance(f, int) for f in fids)):
+        raise InvalidInput(f"Give between 1 and {MAX_PAGE_SIZE} feedback IDs")
+
+    shards = feedback_shards.current()
+    by_shard = {}
+    for fid in set(fids):
+        by_shard.setdefault(shards.for_feedback(fid) if shards is not None else None, []).append(fid)
+
+    decided = 0
+    for shard, ids in by_shard.items():
+        with (shard.pool.connection() if shard else session.connection()) as conn:
+            cursor = conn.execute(sql.format(ids=",".join("?" * len(ids))), ids)
+            conn.commit()
+        decided += cursor.rowcount
+    if decided == 0:
+        raise NotFound("No pending feedback with those IDs")
+    return decided
+
+
+def approveFeedback(session, fids):
+    return _decide(session, fids, APPROVE_SQL)
+
+
+def rejectFeedback(session, fids):
+    return _decide(session, fids, REJECT_SQL)
+
+
+def rescreenFeedback(session):
+    # Slow on big tables: fingerprints every comment again (see
+    # feedback_moderation.rescreen). Returns (screened, queued).
+    session.require_admin()
+    shards = feedback_shards.current()
+    pools = [shard.pool for shard in shards.shards] if shards is not None else [get_pool()]
+    screened = queued = 0
+    for pool in pools:
+        with pool.connection() as conn:
+            counts = moderation.rescreen(conn)
+        screened += counts[0]
+        queued += counts[1]
+    return screened, queued
+
+
+########################################## END ADMIN ###########################################
+
+def _write(session, func, args, wait, shard=None):
+    # Runs func(conn, *args) and commits, on the shard if one is given. With
+    # the write queue running the write is group-committed by its thread
+    # instead; wait=False then returns the Future rather than blocking on it.
+    writer = feedback_writer.current() if shard is None else shard.writer
+    if writer is not None:
+        future = writer.submit(func, args, block=wait)
+        return future.result() if wait else future
+
+    with (session.connection() if shard is None else shard.pool.connection()) as conn:
+        result = func(conn, *args)
+        conn.commit()
+    if wait:
+        return result
+    future = Future()
+    future.set_result(result)
+    return future
+
+
+def _insert_feedback(conn, customer_id, product_id, rating, comment):
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT feedback_id
+        FROM Feedback
+        WHERE customer_id = ? AND product_id = ?
+    """, (customer_id, product_id))
+    if cursor.fetchone():
+        raise Conflict("You have already given feedback for this product")
+
+    cursor.execute("""
+        INSERT INTO Feedback(customer_id, product_id, rating, comment)
+        VALUES (?, ?, ?, ?)
+    """, (customer_id, product_id, rating, comment))
+    fid = cursor.lastrowid
+    moderation.screen(conn, fid, customer_id, comment)
+    return fid
+
+
+def addFeedback(session, product_id, rating, comment, wait=True):
+    customer_id = session.require_customer()
+    _check_rating(rating)
+    _check_comment(comment)
+    shards = feedback_shards.current()
+    shard = shards.for_product(product_id) if shards is not None else None
+    return _write(session, _insert_feedback, (customer_id, product_id, rating, comment), wait, shard)
+
+
+def _own_feedback(conn, customer_id):
+    return conn.execute("""
+        SELECT feedback_id, product_id, rating, comment
+        FROM Feedback
+        WHERE customer_id = ?
+        ORDER BY feedback_id
+    """, (customer_id,)).fetchall()
+
+
+def viewFeedback(session):
+    customer_id = session.require_customer()
+    shards = feedback_shards.current()
+    if shards is not None:
+        return list(heapq.merge(*shards.gather(_own_feedback, customer_id)))
+
+    with session.connection() as conn:
+        return conn.execute("""
+            SELECT feedback_id, product_id, rating, comment
+            FROM Feedback
+            WHERE customer_id = ?
+        """, (customer_id,)).fetchall()
+
+
+def searchFeedback(session, product_id):
+    customer_id = session.require_customer()
+    shards = feedback_shards.current()
+    with (shards.for_product(product_id).pool.connection() if shards is not None
+          else session.connection()) as conn:
+        return conn.execute("""
+            SELECT feedback_id, rating, comment
+            FROM Feedback
+            WHERE product_id = ? AND customer_id = ?
+        """, (product_id, customer_id)).fetchall()
+
+
+def _update_feedback(conn, customer_id, fid, rating, comment):
+    old = conn.execute(
+        "SELECT comment FROM Feedback WHERE feedback_id = ? AND customer_id = ?", (fid, customer_id)
+    ).fetchone()
+    if old is None:
+        raise NotFound("Feedback not found or not yours")
+    conn.execute(
+        "UPDATE Feedback SET rating = ?, comment = ? WHERE feedback_id = ?", (rating, comment, fid)
+    )
+    if comment != old[0]:
+        moderation.screen(conn, fid, customer_id, comment, edited=True)
+
+
+def updateFeedback(session, fid, rating, comment, wait=True):
+    customer_id = session.require_customer()
+    _check_rating(rating)
+    _check_comment(comment)
+    shard = _shard_for_feedback(fid, "Feedback not found or not yours")
+    return _write(session, _update_feedback, (customer_id, fid, rating, comment), wait, shard)
+
+
+def _delete_feedback(conn, customer_id, fid):
+    cursor = conn.execute("""
+        DELETE FROM Feedback
+        WHERE feedback_id = ? AND customer_id = ?
+    """, (fid, customer_id))
+    if cursor.rowcount == 0:
+        raise NotFound("Feedback not found or not yours")
+
+
+def deleteFeedback(session, fid, wait=True):
+    customer_id = session.require_customer()
+    shard = _shard_for_feedback(fid, "Feedback not found or not yours")
+    return _write(session, _delete_feedback, (customer_id, fid), wait, shard)
+
+
+def viewAllFeedback(after_id=0, limit=PAGE_SIZE):
+    _check_page(limit)
+    shards = feedback_shards.current()
+    if shards is not None:
+        rows = _gather_page(shards, after_id, limit, _public_feedback_page)
+        with get_read_conn() as conn:
+            products = _product_names(conn, [r[1] for r in rows])
+        return [(fid, products.get(pid), rating, comment) for fid, pid, _, rating, comment in rows]
+
+    with get_read_conn() as conn:
+        return conn.execute(f"""
+            SELECT F.feedback_id, P.product_name, F.rating, F.comment
+            FROM Feedback F
+            JOIN Product P ON F.product_id = P.product_id
+            WHERE F.feedback_id > ? AND {NOT_PENDING}
+            ORDER BY F.feedback_id
+            LIMIT ?
+            """, (after_id, limit)).fetchall()
+
+
+def streamAllFeedback(after_id=0, batch=STREAM_BATCH):
+    return _stream(viewAllFeedback, after_id, batch)
+
+
+def viewFeedbackByProduct(pname):
+    product_id = findProduct(pname)
+    shards = feedback_shards.current()
+    with (shards.for_product(product_id).pool.connection() if shards is not None
+          else get_read_conn()) as conn:
+        return conn.execute(f"""
+        SELECT rating, comment
+        FROM Feedback F
+        WHERE product_id = ? AND {NOT_PENDING}
+        """, (product_id,)).fetchall()
+
+
+def viewAllCategory():
+    return cache.catalog.get_or_load(
+        ("category names",), lambda: _fetch_all("SELECT category_name FROM Category")
+    )
+
+
+def _load_category_products(cname):
+    with get_read_conn() as conn:
+        category = conn.execute(
+            "SELECT category_id FROM Category WHERE category_name = ?", (cname,)
+        ).fetchone()
+        if not category:
+            raise NotFound("Category not found")
+
+        return tuple(conn.execute("""
+            SELECT product_id, product_name, price, description
+            FROM Product
+            WHERE category_id = ?
+        """, (category[0],)).fetchall())
+
+
+def viewAllProducts(cname):
+    return cache.catalog.get_or_load(
+        ("category products", cname), lambda: _load_category_products(cname)
+    )
+
+
+#RATING SUMMARIES
+# Read from ProductRatingStats, which triggers keep in step with Feedback.
+RATING_SUMMARY_SQL = """
+    SELECT P.product_id, P.product_name,
+           COALESCE(S.rating_count, 0),
+           ROUND(CAST(S.rating_sum AS REAL) / NULLIF(S.rating_count, 0), 2),
+           COALESCE(S.r1, 0), COALESCE(S.r2, 0), COALESCE(S.r3, 0),
+           COALESCE(S.r4, 0), COALESCE(S.r5, 0)
+    FROM Product P
+    LEFT JOIN ProductRatingStats S ON S.product_id = P.product_id
+"""
+
+
+SHARD_RATING_SQL = """
+    SELECT product_id, rating_count,
+           ROUND(CAST(rating_sum AS REAL) / NULLIF(rating_count, 0), 2) AS average,
+           r1, r2, r3, r4, r5
+    FROM ProductRatingStats
+"""
+
+
+def productRatingSummary(pname):
+    product_id = findProduct(pname)
+    shards = feedback_shards.current()
+    if shards is not None:
+        with shards.for_product(product_id).pool.connection() as conn:
+            stats = conn.execute(
+                SHARD_RATING_SQL + " WHERE product_id = ?", (product_id,)
+            ).fetchone()
+        with get_read_conn() as conn:
+            name = _product_names(conn, [product_id]).get(product_id)
+        if stats is None:
+            return (product_id, name, 0, None, 0, 0, 0, 0, 0)
+        return (product_id, name, *stats[1:])
+
+    with get_read_conn() as conn:
+        return conn.execute(
+            RATING_SUMMARY_SQL + " WHERE P.product_id = ?", (product_id,)
+        ).fetchone()
+
+
+def _top_rated(conn, limit, min_ratings):
+    return conn.execute(SHARD_RATING_SQL + """
+        WHERE rating_count >= ?
+        ORDER BY average DESC, rating_count DESC
+        LIMIT ?
+    """, (min_ratings, limit)).fetchall()
+
+
+def topRatedProducts(limit=10, min_ratings=1):
+    _check_page(limit)
+    shards = feedback_shards.current()
+    if shards is not None:
+        ranked = heapq.merge(*shards.gather(_top_rated, limit, max(min_ratings, 1)),
+                             key=lambda r: (-r[2], -r[1]))
+        rows = list(islice(ranked, limit))
+        with get_read_conn() as conn:
+            names = _product_names(conn, [r[0] for r in rows])
+        return [(pid, names.get(pid), *rest) for pid, *rest in rows]
+
+    with get_read_conn() as conn:
+        return conn.execute("""
+            SELECT P.product_id, P.product_name, S.rating_count,
+                   ROUND(CAST(S.rating_sum AS REAL) / S.rating_count, 2) AS average,
+                   S.r1, S.r2, S.r3, S.r4, S.r5
+            FROM ProductRatingStats S
+            JOIN Product P ON P.product_id = S.product_id
+            WHERE S.rating_count >= ?
+            ORDER BY average DESC, S.rating_count DESC
+            LIMIT ?
+        """, (max(min_ratings, 1), limit)).fetchall()
+
+
+#RECOMMENDATIONS
+# "Customers who rated X also liked", from item-item similarity over the
+# ratings (feedback_recommend; needs NumPy, so it is imported on use). The
+# similarities are built on first use and then follow the change feed.
+RECOMMEND_LIMIT = 10
+
+
+def alsoLiked(pname, limit=RECOMMEND_LIMIT):
+    """(product_id, product_name, price, similarity) rows, most similar first."""
+    try:
+        import feedback_recommend
+    except ImportError:
+        raise InvalidInput("Recommendations need NumPy (pip install numpy)") from None
+    _require_unsharded("Recommendations")
+    product_id = findProduct(pname)
+    with get_conn() as conn:
+        similar = feedback_recommend.current(conn).also_liked(product_id, limit)
+        if not similar:
+            return []
+        ids = [pid for pid, _ in similar]
+        products = {
+            row[0]: row[1:]
+            for row in conn.execute(
+                f"SELECT product_id, product_name, price FROM Product"
+                f" WHERE product_id IN ({','.join('?' * len(ids))})", ids
+            )
+        }
+    return [(pid, *products[pid], round(score, 3)) for pid, score in similar if pid in products]
+
+
+#DATE-RANGE REPORTS
+# Summed from the daily rollups (FeedbackDailyProduct/Category), so the cost
+# grows with days x products in the range, not with the feedback count.
+# Days are UTC dates, both ends inclusive.
+ROLLUP_SUMS = """
+    SUM(D.rating_count) AS ratings,
+    ROUND(CAST(SUM(D.rating_sum) AS REAL) / SUM(D.rating_count), 2) AS average,
+    SUM(D.r1), SUM(D.r2), SUM(D.r3), SUM(D.r4), SUM(D.r5)
+"""
+
+
+def _date_range(start, end):
+    today = datetime.now(timezone.utc).date()
+    try:
+        start = date.fromisoformat(start) if start else today - timedelta(days=6)
+        end = date.fromisoformat(end) if end else today
+    except (TypeError, ValueError):
+        raise InvalidInput("Dates must look like YYYY-MM-DD") from None
+    if start > end:
+        raise InvalidInput("Start date is after end date")
+    return start.isoformat(), end.isoformat()
+
+
+def _category_id(conn, cname):
+    category = conn.execute(
+        "SELECT category_id FROM Category WHERE category_name = ?", (cname,)
+    ).fetchone()
+    if not category:
+        raise NotFound("Category not found")
+    return category[0]
+
+
+def categoryReport(session, start=None, end=None):
+    """Per-category ratings for start..end (default: the last 7 days)."""
+    session.require_admin()
+    _require_unsharded("Date-range reports")
+    start, end = _date_range(start, end)
+    with session.connection() as conn:
+        return conn.execute(f"""
+            SELECT C.category_id, C.category_name, {ROLLUP_SUMS}
+            FROM FeedbackDailyCategory D
+            JOIN Category C ON C.category_id = D.category_id
+            WHERE D.day BETWEEN ? AND ?
+            GROUP BY D.category_id
+            HAVING ratings > 0
+            ORDER BY average DESC, ratings DESC
+        """, (start, end)).fetchall()
+
+
+def productReport(session, start=None, end=None, cname=None, limit=PAGE_SIZE):
+    session.require_admin()
+    _require_unsharded("Date-range reports")
+    _check_page(limit)
+    start, end = _date_range(start, end)
+    with session.connection() as conn:
+        category_filter = ""
+        params = [start, end]
+        if cname:
+            category_filter = "AND P.category_id = ?"
+            params.append(_category_id(conn, cname))
+        return conn.execute(f"""
+            SELECT P.product_id, P.product_name, {ROLLUP_SUMS}
+            FROM FeedbackDailyProduct D
+            JOIN Product P ON P.product_id = D.product_id
+            WHERE D.day BETWEEN ? AND ? {category_filter}
+            GROUP BY D.product_id
+            HAVING ratings > 0
+            ORDER BY average DESC, ratings DESC
+            LIMIT ?
+        """, (*params, limit)).fetchall()
+
+
+def dailyReport(session, start=None, end=None, cname=None):
+    """One row per day in start..end, for one category or all of them."""
+    session.require_admin()
+    _require_unsharded("Date-range reports")
+    start, end = _date_range(start, end)
+    with session.connection() as conn:
+        category_filter = ""
+        params = [start, end]
+        if cname:
+            category_filter = "AND D.category_id = ?"
+            params.append(_category_id(conn, cname))
+        return conn.execute(f"""
+            SELECT D.day, {ROLLUP_SUMS}
+            FROM FeedbackDailyCategory D
+            WHERE D.day BETWEEN ? AND ? {category_filter}
+            GROUP BY D.day
+            HAVING ratings > 0
+            ORDER BY D.day
+        """, params).fetchall()
+
+
+#COMMENT ANALYTICS
+# Read from the summary tables feedback_analytics rebuilds; refreshAnalytics
+# runs that stage (it reads every comment, so it is slow on big tables).
+# feedback_analytics is imported on use because it may load NumPy.
+def refreshAnalytics(session, workers=None):
+    session.require_admin()
+    _require_unsharded("Comment analytics")
+    import feedback_analytics
+    return feedback_analytics.run(workers or feedback_analytics.WORKERS)
+
+
+def exportFeedback(session, out, full=False, fmt=None):
+    """Columnar export of feedback (see feedback_export); returns the run's manifest entry."""
+    session.require_admin()
+    _require_unsharded("Export")
+    import feedback_export
+    try:
+        return feedback_export.export(out, full, fmt or feedback_export.DEFAULT_FORMAT)
+    except ValueError as e:
+        raise InvalidInput(str(e)) from None
+
+
+def lastAnalyticsRun(session):
+    session.require_admin()
+    _require_unsharded("Comment analytics")
+    with session.connection() as conn:
+        return conn.execute("""
+            SELECT finished_at, comments, seconds
+            FROM AnalyticsRun
+            ORDER BY run_id DESC
+            LIMIT 1
+        """).fetchone()
+
+
+def productSentiment(session, most_negative=True, limit=PAGE_SIZE, min_comments=1):
+    session.require_admin()
+    _require_unsharded("Comment analytics")
+    _check_page(limit)
+    order = "ASC" if most_negative else "DESC"
+    with session.connection() as conn:
+        return conn.execute(f"""
+            SELECT P.product_id, P.product_name, S.comments,
+                   S.positive, S.neutral, S.negative, ROUND(S.avg_score, 3)
+            FROM ProductSentiment S
+            JOIN Product P ON P.product_id = S.product_id
+            WHERE S.comments >= ?
+            ORDER BY S.avg_score {order}, S.comments DESC
+            LIMIT ?
+        """, (max(min_comments, 1), limit)).fetchall()
+
+
+def categorySentiment(session):
+    session.require_admin()
+    _require_unsharded("Comment analytics")
+    with session.connection() as conn:
+        return conn.execute("""
+            SELECT C.category_id, C.category_name, SUM(S.comments),
+                   SUM(S.positive), SUM(S.neutral), SUM(S.negative),
+                   ROUND(SUM(S.avg_score * S.comments) / SUM(S.comments), 3) AS average
+            FROM ProductSentiment S
+            JOIN Product P ON P.product_id = S.product_id
+            JOIN Category C ON C.category_id = P.category_id
+            GROUP BY C.category_id
+            ORDER BY average
+        """).fetchall()
+
+
+def productKeywords(session, pname, limit=20):
+    session.require_admin()
+    _require_unsharded("Comment analytics")
+    product_id = findProduct(pname)
+    with session.connection() as conn:
+        return conn.execute("""
+            SELECT ngram, count
+            FROM ProductKeywords
+            WHERE product_id = ?
+            ORDER BY count DESC
+            LIMIT ?
+        """, (product_id, limit)).fetchall()
+
+
+def categoryKeywords(session, cname, limit=20):
+    session.require_admin()
+    _require_unsharded("Comment analytics")
+    with session.connection() as conn:
+        return conn.execute("""
+            SELECT ngram, count
+            FROM CategoryKeywords
+            WHERE category_id = ?
+            ORDER BY count DESC
+            LIMIT ?
+        """, (_category_id(conn, cname), limit)).fetchall()
+
+
+#CHANGE FEED
+# FeedbackChanges rows: (seq, op, feedback_id, customer_id, product_id,
+# rating, comment, changed_at). A consumer remembers the last seq it
+# applied and asks for the changes after it. To start from scratch, note
+# latestChangeSeq(), copy the table, then follow from that seq; changes
+# made during the copy are replayed, so apply them idempotently.
+def changesSince(session, after_seq=0, limit=STREAM_BATCH):
+    session.require_admin()
+    _require_unsharded("Change feed")
+    _check_page(limit)
+    with session.connection() as conn:
+        return conn.execute("""
+            SELECT seq, op, feedback_id, customer_id, product_id, rating, comment, changed_at
+            FROM FeedbackChanges
+            WHERE seq > ?
+            ORDER BY seq
+            LIMIT ?
+        """, (after_seq, limit)).fetchall()
+
+
+def streamChanges(session, after_seq=0, batch=STREAM_BATCH):
+    return _stream(partial(changesSince, session), after_seq, batch)
+
+
+def latestChangeSeq(session):
+    session.require_admin()
+    _require_unsharded("Change feed")
+    with session.connection() as conn:
+        return conn.execute("SELECT COALESCE(MAX(seq), 0) FROM FeedbackChanges").fetchone()[0]
+
+
+def pruneChanges(session, through_seq):
+    """Drop changes every consumer has applied; returns how many went."""
+    session.require_admin()
+    _require_unsharded("Change feed")
+    with session.connection() as conn:
+        cursor = conn.execute("DELETE FROM FeedbackChanges WHERE seq <= ?", (through_seq,))
+        conn.commit()
+    return cursor.rowcount
+
+
+#FULL-TEXT SEARCH
+SEARCH_TERM = re.compile(r'"([^"]+)"|(\S+)')
+HIGHLIGHT = ("[", "]")
+
+
+def _match_query(text):
+    # Every word or "quoted phrase" becomes a quoted FTS5 string, so user
+    # input is always matched literally and never parsed as query syntax.
+    terms = [phrase or word for phrase, word in SEARCH_TERM.findall(text)]
+    terms = ['"' + t.replace('"', '""') + '"' for t in terms if t.strip()]
+    if not terms:
+        raise InvalidInput("Enter something to search for")
+    return " ".join(terms)
+
+
+def _search_shard(conn, query, limit):
+    return conn.execute("""
+        SELECT bm25(FeedbackSearch) AS rank, F.feedback_id, F.product_id, F.customer_id,
+               F.rating, snippet(FeedbackSearch, 0, ?, ?, '...', 16)
+        FROM FeedbackSearch S
+        JOIN Feedback F ON F.feedback_id = S.rowid
+        WHERE FeedbackSearch MATCH ?
+        ORDER BY rank
+        LIMIT ?
+    """, (*HIGHLIGHT, query, limit)).fetchall()
+
+
+def searchComments(session, text, limit=PAGE_SIZE):
+    session.require_admin()
+    _check_page(limit)
+    query = _match_query(text)
+    shards = feedback_shards.current()
+    if shards is not None:
+        # bm25 is scored within each shard, so the merged order is close to,
+        # not exactly, the single-database one.
+        rows = list(islice(heapq.merge(*shards.gather(_search_shard, query, limit)), limit))
+        with session.connection() as conn:
+            products = _product_names(conn, [r[2] for r in rows])
+            customers = _customer_names(conn, [r[3] for r in rows])
+        return [(fid, products.get(pid), customers.get(cid), rating, snippet)
+                for _, fid, pid, cid, rating, snippet in rows]
+
+    with session.connection() as conn:
+        return conn.execute("""
+            SELECT F.feedback_id, P.product_name, C.fullname, F.rating,
+                   snippet(FeedbackSearch, 0, ?, ?, '...', 16)
+            FROM FeedbackSearch S
+            JOIN Feedback F ON F.feedback_id = S.rowid
+            JOIN Product P ON P.product_id = F.product_id
+            JOIN Customers C ON C.customer_id = F.customer_id
+            WHERE FeedbackSearch MATCH ?
+            ORDER BY bm25(FeedbackSearch)
+            LIMIT ?
+        """, (*HIGHLIGHT, query, limit)).fetchall()
+
+
+def searchProducts(text, limit=PAGE_SIZE):
+    _check_page(limit)
+    with get_read_conn() as conn:
+        return conn.execute("""
+            SELECT P.product_id,
+                   highlight(ProductSearch, 0, ?, ?),
+                   P.price,
+                   snippet(ProductSearch, 1, ?, ?, '...', 16)
+            FROM ProductSearch S
+            JOIN Product P ON P.product_id = S.rowid
+            WHERE ProductSearch MATCH ?
+            ORDER BY bm25(ProductSearch, 10.0, 1.0)
+            LIMIT ?
+        """, (*HIGHLIGHT, *HIGHLIGHT, _match_query(text), limit)).fetchall()
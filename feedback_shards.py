@@ -0,0 +1,233 @@
+import argparse
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+
+import feedback_db
+import feedback_moderation as moderation
+import feedback_writer
+
+
+# Optional horizontal partitioning of Feedback across several database files.
+#
+# The main database keeps users, customers and the catalog. Each shard is a
+# database file with the same schema whose Feedback table holds the rows
+# for the products with product_id % N == its index. A (customer, product)
+# pair therefore always lands in one shard, and that shard's
+# UNIQUE(customer_id, product_id) keeps a customer to one feedback per
+# product. Each shard has its own write lock and, with group commit, its own
+# writer thread.
+#
+# Shard i hands out feedback ids above (i + 1) * ID_SPAN, so an id alone
+# (updateFeedback, deleteFeedback) says which shard holds the row; an id in
+# no shard's range, such as one below ID_SPAN from before --move, is not
+# found. feedback_service routes single-product operations to one shard and
+# runs listings on every shard at once (gather()), merging by feedback_id
+# and looking names up in the main database.
+#
+# Bulk import (feedback_import) splits each batch by shard, and comment
+# search merges every shard's best matches. Date-range reports, comment
+# analytics, recommendations, the change feed and exports read the main
+# database's Feedback table and its rollups, so with shards configured the
+# service refuses them (NotSupported, HTTP 501) rather than return nothing.
+# Moderation screens comments within their shard; --move re-screens the
+# moved rows there, since they get new ids (earlier approvals are not
+# carried over).
+#
+#   python feedback_shards.py --db feedback.db --shard f0.db --shard f1.db --move
+#   python feedback_server.py --shard f0.db --shard f1.db
+#
+# The shard list must not change once feedback is stored: every shard
+# records its index and the shard count, and configure() refuses a
+# different layout.
+
+ID_SPAN = 1 << 40
+
+# FEEDBACK_SHARDS="f0.db:f1.db" (os.pathsep-separated) for the menus.
+SHARD_PATHS = [p for p in os.environ.get("FEEDBACK_SHARDS", "").split(os.pathsep) if p]
+
+SHARD_INFO = """
+    CREATE TABLE IF NOT EXISTS ShardInfo(
+               shard INTEGER NOT NULL,
+               shards INTEGER NOT NULL
+               )
+"""
+
+
+class Shard:
+    def __init__(self, index, path, size):
+        self.index = index
+        self.path = path
+        self.pool = feedback_db.ConnectionPool(path, size)
+        self.writer = None
+
+    @property
+    def first_id(self):
+        return (self.index + 1) * ID_SPAN + 1
+
+    def init_schema(self, shards):
+        with self.pool.connection() as conn:
+            feedback_db.migrate(conn)
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute(SHARD_INFO)
+                row = conn.execute("SELECT shard, shards FROM ShardInfo").fetchone()
+                if row is None:
+                    conn.execute("INSERT INTO ShardInfo(shard, shards) VALUES (?, ?)",
+                                 (self.index, shards))
+                elif row != (self.index, shards):
+                    raise ValueError(f"{self.path} is shard {row[0]} of {row[1]}, "
+                                     f"not {self.index} of {shards}")
+                # AUTOINCREMENT continues from sqlite_sequence.
+                conn.execute("DELETE FROM sqlite_sequence WHERE name = 'Feedback' AND seq < ?",
+                             (self.first_id - 1,))
+                conn.execute("""
+                    INSERT INTO sqlite_sequence(name, seq)
+                    SELECT 'Feedback', ?
+                    WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = 'Feedback')
+                """, (self.first_id - 1,))
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.stop()
+            self.writer = None
+        self.pool.close()
+
+
+class ShardSet:
+    def __init__(self, paths, size=feedback_db.POOL_SIZE):
+        self.shards = [Shard(i, path, size) for i, path in enumerate(paths)]
+        self._executor = ThreadPoolExecutor(len(self.shards), thread_name_prefix="shard")
+
+    def init_schema(self):
+        for shard in self.shards:
+            shard.init_schema(len(self.shards))
+
+    def start_writers(self, batch_size=feedback_writer.BATCH_SIZE,
+                      wait_ms=feedback_writer.BATCH_WAIT_MS):
+        for shard in self.shards:
+            if shard.writer is None:
+                shard.writer = feedback_writer.WriteQueue(batch_size, wait_ms, pool=shard.pool)
+                shard.writer.start()
+
+    def for_product(self, product_id):
+        return self.shards[product_id % len(self.shards)]
+
+    def for_feedback(self, feedback_id):
+        """The shard that owns this feedback id, or None if none does."""
+        index = feedback_id // ID_SPAN - 1
+        return self.shards[index] if 0 <= index < len(self.shards) else None
+
+    def gather(self, func, *args):
+        """func(conn, *args) on every shard in parallel; results in shard order."""
+        def run(shard):
+            with shard.pool.connection() as conn:
+                return func(conn, *args)
+        return list(self._executor.map(run, self.shards))
+
+    def stats(self):
+        return [
+            {
+                "shard": shard.index,
+                "path": shard.path,
+                "first_id": shard.first_id,
+                "writer": shard.writer.stats() if shard.writer else None,
+            }
+            for shard in self.shards
+        ]
+
+    def close(self):
+        self._executor.shutdown()
+        for shard in self.shards:
+            shard.close()
+
+
+_shards = None
+
+
+def configure(paths, size=feedback_db.POOL_SIZE):
+    """Store feedback in these shard files (None or []: the main database)."""
+    global _shards
+    old, _shards = _shards, None
+    if old is not None:
+        old.close()
+    if paths:
+        shards = ShardSet(paths, size)
+        try:
+            shards.init_schema()
+        except BaseException:
+            shards.close()
+            raise
+        _shards = shards
+    return _shards
+
+
+def current():
+    return _shards
+
+
+def move_feedback(primary_path, shards, log=None):
+    """Move the main database's Feedback rows into their shards.
+
+    Rows get new ids in their shard's range; created_at and updated_at are
+    kept. Each shard's rows are copied and committed before they are
+    deleted from the main database, and copies skip pairs the shard already
+    has, so an interrupted move can simply be run again.
+    """
+    count = len(shards.shards)
+    moved = 0
+    for shard in shards.shards:
+        with closing(sqlite3.connect(shard.path)) as conn:
+            conn.execute("ATTACH DATABASE ? AS source", (primary_path,))
+            with conn:
+                cursor = conn.execute("""
+                    INSERT OR IGNORE INTO main.Feedback(customer_id, product_id, rating, comment,
+                                                        created_at, updated_at)
+                    SELECT customer_id, product_id, rating, comment, created_at, updated_at
+                    FROM source.Feedback
+                    WHERE product_id % ? = ?
+                    ORDER BY feedback_id
+                """, (count, shard.index))
+            with conn:
+                conn.execute("DELETE FROM source.Feedback WHERE product_id % ? = ?",
+                             (count, shard.index))
+        moved += cursor.rowcount
+        if log:
+            log(f"shard {shard.index} ({shard.path}): {cursor.rowcount} rows")
+    return moved
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Set up feedback shards")
+    parser.add_argument("--db", default=feedback_db.DB_PATH, help="main database")
+    parser.add_argument("--shard", action="append", required=True,
+                        help="shard database file, in order (repeat for each shard)")
+    parser.add_argument("--move", action="store_true",
+                        help="move feedback stored in the main database into the shards")
+    args = parser.parse_args(argv)
+
+    feedback_db.configure(args.db)
+    feedback_db.init_schema()
+    shards = configure(args.shard)
+    try:
+        for shard in shards.shards:
+            print(f"shard {shard.index}: {shard.path} (ids from {shard.first_id})")
+        if args.move:
+            moved = move_feedback(args.db, shards, log=print)
+            print(f"Moved {moved} feedback rows")
+            for shard in shards.shards:
+                with shard.pool.connection() as conn:
+                    screened, queued = moderation.rescreen(conn)
+                print(f"shard {shard.index}: screened {screened} comments, {queued} queued for review")
+    finally:
+        configure(None)
+        feedback_db.close_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future, InvalidStateError
+
+from feedback_db import get_pool
+
+
+# Group commit for feedback writes. Producers submit a write as a function
+# of a connection; one writer thread drains the queue and runs up to
+# BATCH_SIZE writes (or whatever arrives within BATCH_WAIT_MS of the first)
+# in a single transaction, so concurrent submissions share one fsync instead
+# of queueing on SQLite's write lock.
+#
+# Each write runs under its own SAVEPOINT: one that raises (a duplicate, a
+# missing row) is rolled back on its own and the rest of the batch still
+# commits. Every submit returns a Future that resolves once the batch has
+# committed, with the write's return value or its exception. A write whose
+# Future was cancelled before its batch started (an HTTP client that went
+# away) is skipped.
+
+BATCH_SIZE = 256
+BATCH_WAIT_MS = 5
+QUEUE_SIZE = 10_000
+SUBMIT_TIMEOUT = 30
+
+_STOP = object()
+
+
+class QueueFull(sqlite3.OperationalError):
+    pass
+
+
+class WriteQueue:
+    def __init__(self, batch_size=BATCH_SIZE, wait_ms=BATCH_WAIT_MS, maxsize=QUEUE_SIZE, pool=None):
+        # pool defaults to the main database's (feedback_shards passes its own).
+        self.pool = pool
+        self.batch_size = batch_size
+        self.wait = wait_ms / 1000
+        self._queue = queue.Queue(maxsize)
+        self._lock = threading.Lock()
+        self._thread = None
+
+        self.submitted = 0
+        self.succeeded = 0
+        self.duplicates = 0
+        self.failed = 0
+        self.cancelled = 0
+        self.batches = 0
+        self.max_batch = 0
+        self.commit_time = 0.0
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="feedback-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        # Writes already queued are committed before the thread exits.
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join()
+            self._thread = None
+
+    def submit(self, func, args, block=True):
+        # block=False fails fast when full, for callers on an event loop.
+        future = Future()
+        try:
+            self._queue.put((func, args, future), block, SUBMIT_TIMEOUT)
+        except queue.Full:
+            raise QueueFull("Write queue is full") from None
+        with self._lock:
+            self.submitted += 1
+        return future
+
+    #WRITER THREAD
+    def _next_batch(self):
+        item = self._queue.get()
+        if item is _STOP:
+            return None, True
+        batch = [item]
+        deadline = time.monotonic() + self.wait
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _run(self):
+        pool = self.pool or get_pool()
+        conn = pool.acquire()
+        try:
+            stopping = False
+            while not stopping:
+                batch, stopping = self._next_batch()
+                if batch:
+                    self._commit(conn, batch)
+        finally:
+            pool.release(conn)
+
+    @staticmethod
+    def _deliver(future, result=None, error=None):
+        # Never let a Future resolved elsewhere take the writer thread down.
+        try:
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+        except InvalidStateError:
+            pass
+
+    def _commit(self, conn, batch):
+        queued = len(batch)
+        batch = [item for item in batch if item[2].set_running_or_notify_cancel()]
+        if len(batch) < queued:
+            with self._lock:
+                self.cancelled += queued - len(batch)
+        if not batch:
+            return
+
+        start = time.perf_counter()
+        results = []
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for func, args, future in batch:
+                conn.execute("SAVEPOINT write")
+                try:
+                    results.append((future, func(conn, *args), None))
+                    conn.execute("RELEASE write")
+                except Exception as e:
+                    conn.execute("ROLLBACK TO write")
+                    conn.execute("RELEASE write")
+                    results.append((future, None, e))
+            conn.commit()
+        except sqlite3.Error as e:
+            # The batch as a whole could not commit: every write in it fails.
+            if conn.in_transaction:
+                conn.rollback()
+            for _, _, future in batch:
+                self._deliver(future, error=e)
+            with self._lock:
+                self.batches += 1
+                self.failed += len(batch)
+            return
+
+        elapsed = time.perf_counter() - start
+        succeeded = duplicates = failed = 0
+        for future, result, error in results:
+            if error is None:
+                succeeded += 1
+                self._deliver(future, result)
+            else:
+                # Conflict (409) from feedback_service, which imports this module.
+                if getattr(error, "status", None) == 409:
+                    duplicates += 1
+                else:
+                    failed += 1
+                self._deliver(future, error=error)
+
+        with self._lock:
+            self.batches += 1
+            self.max_batch = max(self.max_batch, len(batch))
+            self.commit_time += elapsed
+            self.succeeded += succeeded
+            self.duplicates += duplicates
+            self.failed += failed
+
+    def stats(self):
+        with self._lock:
+            written = self.succeeded + self.duplicates + self.failed
+            return {
+                "queue_depth": self._queue.qsize(),
+                "submitted": self.submitted,
+                "succeeded": self.succeeded,
+                "duplicates": self.duplicates,
+                "failed": self.failed,
+                "cancelled": self.cancelled,
+                "batches": self.batches,
+                "avg_batch": round(written / self.batches, 1) if self.batches else 0.0,
+                "max_batch": self.max_batch,
+                "avg_commit_ms": round(self.commit_time / self.batches * 1000, 3) if self.batches else 0.0,
+            }
+
+
+_writer = None
+
+
+def start(batch_size=BATCH_SIZE, wait_ms=BATCH_WAIT_MS, maxsize=QUEUE_SIZE):
+    global _writer
+    if _writer is None:
+        _writer = WriteQueue(batch_size, wait_ms, maxsize)
+        _writer.start()
+    return _writer
+
+
+def stop():
+    global _writer
+    if _writer is not None:
+        _writer.stop()
+        _writer = None
+
+
+def current():
+    return _writer